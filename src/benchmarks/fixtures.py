@@ -0,0 +1,134 @@
+import os
+
+import scrape_buda
+from http_cache import ResponseCache
+
+
+"""
+
+BUDA pages for the benchmarks.
+
+write_pages() renders the html of the listing, schedule, team and roster
+pages of a synthetic history from synthetic.generate into a ResponseCache,
+so the scraper can run against them offline.
+
+"""
+
+
+def cells(values):
+    return ''.join('<td class="infobody">{}</td>'.format(value)
+                   for value in values)
+
+
+def link(href, text):
+    return '<a href="{}">{}</a>'.format(href.replace('&', '&amp;'), text)
+
+
+def past_leagues_html(src):
+    return '<html><body><iframe src="{}"></iframe></body></html>'.format(src)
+
+
+def league_list_html(league_meta):
+    rows = ['<tr>{}</tr>'.format(cells([link(
+        'http://{}/hatleagues/scores.php?league={}'.format(
+            scrape_buda.BUDA_NETLOC, leagueid), name)]))
+        for leagueid, name in zip(league_meta.index, league_meta['name'])]
+    return '<html><body><table>{}</table></body></html>'.format(''.join(rows))
+
+
+def schedule_html(league_games, teams):
+
+    """
+
+    :param league_games: games of the league from synthetic.generate, with
+        every game listed once
+    :param teams: list of (division, team name) in schedule order
+    :return: html of the league schedule page, with every game listed under
+        both teams
+
+    """
+
+    listed = {}
+    for team_a, team_b, score_a, score_b in zip(
+            league_games['Team A'], league_games['Team B'],
+            league_games['Score A'], league_games['Score B']):
+        listed.setdefault(team_a, []).append((team_b, score_a, score_b))
+        listed.setdefault(team_b, []).append((team_a, score_b, score_a))
+
+    rows = ['<tr><th>Team</th><th>Record</th><th>Plus/Minus</th></tr>']
+    current = None
+    for divname, teamname in teams:
+        if divname != current:
+            rows.append('<tr><td>{}</td></tr>'.format(divname))
+            current = divname
+        team_games = listed.get(teamname, [])
+        wins = sum(1 for _, score_a, score_b in team_games
+                   if score_a > score_b)
+        plusminus = sum(score_a - score_b
+                        for _, score_a, score_b in team_games)
+        rows.append('<tr><td>{}</td><td>{}-{}</td><td>{}</td></tr>'.format(
+            teamname, wins, len(team_games) - wins, plusminus))
+        for opponent, score_a, score_b in team_games:
+            rows.append('<tr><td></td><td>{}</td><td>{}-{}</td></tr>'.format(
+                opponent, score_a, score_b))
+    return ('<html><body><table class="info"><tr><td>League</td></tr>'
+            '</table><table class="info">{}</table></body></html>').format(
+                ''.join(rows))
+
+
+def teams_html(teams):
+    rows = ['<tr>{}</tr>'.format(cells([link(
+        'rosters.php?section=showTeamRoster&team={}&which=1'.format(teamid),
+        teamname)])) for teamid, teamname in teams]
+    return '<html><body><table>{}</table></body></html>'.format(''.join(rows))
+
+
+def roster_html(players):
+    rows = ['<tr>{}</tr>'.format(cells([player])) for player in players]
+    return '<html><body><table>{}</table></body></html>'.format(''.join(rows))
+
+
+def write_pages(data, cache_dir, leagueids):
+
+    """
+
+    :param data: output of synthetic.generate
+    :param cache_dir: ResponseCache directory to write the pages to
+    :param leagueids: leagues whose schedule, team and roster pages are
+        written; the league listing always covers every league
+    :return: ResponseCache holding the pages
+
+    """
+
+    cache = ResponseCache(cache_dir)
+
+    def store(url, html):
+        cache.store(url, html.encode('utf-8'))
+
+    listing_url = 'http://{}/leagues/past-leagues-list'.format(
+        scrape_buda.BUDA_NETLOC)
+    store(scrape_buda.buda_url('/leagues/past-leagues', []),
+          past_leagues_html(listing_url))
+    store(listing_url, league_list_html(data['league_meta']))
+
+    allteams = data['allteams'].set_index('teamid')
+    games = data['games'][data['games']['league'].isin(leagueids)]
+    league_games = dict(list(games.groupby('league')))
+    for leagueid in leagueids:
+        team_ids = [int(teamid) for teamid in data['league_teams'][leagueid]]
+        teams = list(zip(allteams.loc[team_ids, 'divname'],
+                         allteams.loc[team_ids, 'teamname']))
+        store(scrape_buda.league_schedule_url(leagueid),
+              schedule_html(league_games[leagueid], teams))
+        store(scrape_buda.league_teams_url(leagueid),
+              teams_html(zip(team_ids, allteams.loc[team_ids, 'teamname'])))
+        for teamid in team_ids:
+            store(scrape_buda.team_roster_url(teamid),
+                  roster_html(data['team_players'][str(teamid)]))
+
+    cache.save()
+    return cache
+
+
+def offline_cache(cache_dir):
+    return ResponseCache(os.path.abspath(cache_dir), offline=True)
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'models'))
+
+import fixtures
+import parse_buda
+import scrape_buda
+import synthetic
+from fetch import Fetcher
+from win_probability import simulate_comebacks, win_probability
+
+
+"""
+
+Benchmarks of the rating pipeline on synthetic data, without the network.
+
+For every scale, a synthetic league history is generated with synthetic.py
+and saved as a snapshot, and the pages of the newest leagues are rendered
+into an offline ResponseCache.  Each stage is then run on that data and
+timed; with memory tracing on, it is run a second time under tracemalloc to
+record the peak traced memory and the net number of memory blocks it left
+allocated, i.e. blocks allocated minus blocks freed.  tracemalloc needs
+python 3, so run the benchmarks there; on python 2 only times are recorded.
+The results are printed, or written with --output, as JSON so
+that runs on different commits can be compared.
+
+    python run_benchmarks.py --scales 1 10 --output bench.json
+
+"""
+
+
+class quiet(object):
+
+    """
+
+    Silence the progress prints of the scraper while a stage runs.
+
+    """
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def measure(setup, run, trace_memory):
+
+    """
+
+    :param setup: function returning the state that run needs, not timed
+    :param run: function of that state to benchmark
+    :param trace_memory: if True, also measure memory in a second run
+    :return: dictionary of measurements
+
+    """
+
+    state = setup()
+    with quiet():
+        start = default_timer()
+        run(state)
+        stats = {'seconds': default_timer() - start}
+
+    if trace_memory and tracemalloc is not None:
+        state = setup()
+        with quiet():
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            run(state)
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        stats['peak_bytes'] = peak
+        stats['net_blocks'] = sum(
+            stat.count_diff for stat in after.compare_to(before, 'filename'))
+    return stats
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=src_dir).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_scale(scale, workdir, trace_memory, nsample=200, seed=0):
+
+    """
+
+    :param scale: multiplier of the size of the synthetic history
+    :param workdir: directory for the snapshot, pages and scraped scores
+    :param trace_memory: if True, measure memory as well as time
+    :param nsample: number of teams for the per-team stages
+    :return: dictionary of stage name to measurements
+
+    """
+
+    results = {}
+
+    start = default_timer()
+    data = synthetic.generate(nplayers=8000 * scale,
+                              leagues_per_season=scale, seed=seed)
+    prefix = os.path.join(workdir, 'synthetic')
+    synthetic.write_snapshot(data, prefix)
+    scrape_ids = list(data['league_meta'].index[-2 * scale:])
+    cache_dir = os.path.join(workdir, 'http_cache')
+    fixtures.write_pages(data, cache_dir, scrape_ids)
+    results['generate'] = {'seconds': default_timer() - start,
+                           'teams': len(data['allteams']),
+                           'players': len(data['player_teams']),
+                           'leagues': len(data['league_meta']),
+                           'scraped_leagues': len(scrape_ids)}
+    del data
+
+    def new_buda():
+        fetcher = Fetcher(cache=fixtures.offline_cache(cache_dir))
+        with quiet():
+            buda = scrape_buda.BudaRating(fetcher=fetcher)
+        buda.base_dir = workdir
+        return buda
+
+    def loaded_buda():
+        buda = new_buda()
+        buda.load_buda(prefix)
+        return buda
+
+    # parsing and normalizing the saved pages of the scraped leagues
+    def parse_setup():
+        cache = fixtures.offline_cache(cache_dir)
+        pages = []
+        for leagueid in scrape_ids:
+            pages.append((cache.get(scrape_buda.league_schedule_url(leagueid)),
+                          cache.get(scrape_buda.league_teams_url(leagueid))))
+        return pages
+
+    def parse_run(pages):
+        for schedule_page, teams_page in pages:
+            rows = parse_buda.info_table_rows(schedule_page, which=1)
+            dfdata, divnames = scrape_buda.schedule_table(rows)
+            scrape_buda.normalize_schedule(
+                dfdata, divnames, dict((divname, 0) for divname in divnames),
+                'Club')
+            parse_buda.infobody_cells(teams_page)
+
+    results['parse'] = measure(parse_setup, parse_run, trace_memory)
+
+    # the whole scrape of those leagues from the offline cache
+    def scrape_setup():
+        scores_dir = os.path.join(workdir, 'data', 'raw', 'game_scores')
+        if os.path.exists(scores_dir):
+            shutil.rmtree(scores_dir)
+        os.makedirs(scores_dir)
+        return new_buda()
+
+    results['scrape_buda'] = measure(
+        scrape_setup, lambda buda: buda.scrape_buda(leagueids=scrape_ids),
+        trace_memory)
+
+    results['load_buda'] = measure(
+        new_buda, lambda buda: buda.load_buda(prefix), trace_memory)
+
+    results['predicted_rating'] = measure(
+        loaded_buda, lambda buda: buda.predicted_rating(), trace_memory)
+
+    # per-team stages on a fixed sample of recent teams
+    def sample_setup():
+        buda = loaded_buda()
+        recent = buda.allteams[buda.allteams['year'] >= 2010]
+        random_state = np.random.RandomState(seed)
+        team_ids = random_state.choice(recent['teamid'].values,
+                                       min(nsample, len(recent)),
+                                       replace=False)
+        return buda, team_ids
+
+    def predict_team_run(state):
+        buda, team_ids = state
+        for team_id in team_ids:
+            buda.predict_team(str(team_id))
+
+    def team_detail_run(state):
+        buda, team_ids = state
+        for team_id in team_ids:
+            buda.team_detail(str(team_id))
+
+    for name, run in [('predict_team', predict_team_run),
+                      ('team_detail', team_detail_run)]:
+        results[name] = measure(sample_setup, run, trace_memory)
+        results[name]['teams'] = nsample
+
+    # the simulations behind the current_performance figure
+    total_time = 70
+    gpm = 18. / 2 / total_time
+    elapsed_times = np.arange(total_time)
+    results['simulate_comebacks'] = measure(
+        lambda: np.random.RandomState(seed),
+        lambda random_state: simulate_comebacks(
+            gpm, gpm, 5, total_time, elapsed_times,
+            random_state=random_state),
+        trace_memory)
+    results['win_probability'] = measure(
+        lambda: None,
+        lambda state: win_probability(gpm, gpm, elapsed_times,
+                                      5 * elapsed_times / float(total_time),
+                                      total_time),
+        trace_memory)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1],
+                        help='sizes of the synthetic history, as multiples '
+                             'of the real one')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--workdir', help='directory for the generated data, '
+                                          'a temporary one by default')
+    parser.add_argument('--no-memory', action='store_true',
+                        help="don't measure memory, which doubles the run "
+                             "time of every stage")
+    parser.add_argument('--sample', type=int, default=200,
+                        help='number of teams for the per-team stages')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    report = {'commit': git_commit(),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'pandas': pd.__version__,
+              'scales': {}}
+    for scale in args.scales:
+        workdir = args.workdir
+        if workdir is None:
+            workdir = tempfile.mkdtemp(prefix='buda-bench-')
+        workdir = os.path.join(workdir, 'scale{}'.format(scale))
+        if os.path.exists(workdir):
+            shutil.rmtree(workdir)
+        os.makedirs(workdir)
+        try:
+            report['scales'][str(scale)] = benchmark_scale(
+                scale, workdir, not args.no_memory, args.sample, args.seed)
+        finally:
+            if args.workdir is None:
+                shutil.rmtree(os.path.dirname(workdir))
+
+    text = json.dumps(report, indent=1, sort_keys=True)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
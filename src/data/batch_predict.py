@@ -0,0 +1,234 @@
+import numpy as np
+import pandas as pd
+
+
+"""
+
+Predict the ratings of many teams at once.
+
+BudaRating.predict_team works one team and one player at a time.  This
+module computes the same numbers for a whole list of teams from one long
+roster table with a row for every (team, player) pair:
+
+ - draft and captain ratings are joined onto the roster in bulk from the
+   self rating index,
+ - every player's club history is turned into running counts and sums over
+   the history store, so the average rating of the club teams a player was
+   on before a given team is a difference of two cumulative sums,
+ - the per-team averages are weighted bincounts over the roster table.
+
+"""
+
+
+COLUMNS = ['self_rating', 'captain_rating', 'draft_rating',
+           'experience_rating', 'ensemble_rating', 'n_exp_rating',
+           'n_cap_rating', 'n_capexp_rating']
+
+
+def roster_table(buda, team_ids):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param team_ids: array of team ids
+    :return: dataframe with one row per player on each team, with the
+        position of the team in team_ids, the position of the player in the
+        history store, the player name, the team id and the league id and
+        league type of the team
+
+    """
+
+    history = buda.history
+    team_ids = np.asarray(team_ids).astype('int64')
+    rows, players = history.rosters(team_ids)
+
+    league_ids = np.array([buda.index.league(team_id) for team_id in team_ids],
+                          dtype='object')
+    league_types = buda.league_meta['type'].reindex(league_ids).values
+
+    roster = pd.DataFrame({'team': rows,
+                           'player': players,
+                           'name': history.player_names[players],
+                           'teamid': team_ids[rows],
+                           'league_id': league_ids[rows],
+                           'league_type': league_types[rows]})
+
+    # empty roster spots aren't players
+    return roster[roster['name'] != ''].reset_index(drop=True)
+
+
+def history_entries(buda):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :return: whether each entry of the history store's player_teams is a
+        club team, and the rating of that team
+
+    """
+
+    history = buda.history
+    index = buda.index
+
+    # look up each history team in the team index; teams missing from the
+    # index are treated as hat teams
+    positions = np.searchsorted(index.team_ids, history.team_ids)
+    found = positions < len(index.team_ids)
+    found[found] = index.team_ids[positions[found]] == \
+        history.team_ids[found]
+    club = np.zeros(len(history.team_ids), dtype='bool')
+    club[found] = index.club[positions[found]]
+    ratings = np.full(len(history.team_ids), np.nan)
+    ratings[found] = index.ratings[positions[found]]
+
+    return club[history.player_teams], ratings[history.player_teams]
+
+
+def club_history(buda):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :return: sort key of every entry of the history store's player_teams,
+        and cumulative number of club teams, of club team ratings and of
+        club teams without a rating over those entries, each with a leading
+        zero
+
+    """
+
+    history = buda.history
+    entry_club, entry_ratings = history_entries(buda)
+    entry_unrated = entry_club & np.isnan(entry_ratings)
+    entry_sum = np.where(entry_club & ~entry_unrated, entry_ratings, 0.)
+
+    # entries are sorted by player and then by team, so this key is sorted
+    key = history.player_rows().astype('int64') * len(history.team_ids) + \
+        history.player_teams
+
+    def cumulative(values):
+        return np.concatenate([[0], np.cumsum(values)])
+
+    return key, cumulative(entry_club), cumulative(entry_sum), \
+        cumulative(entry_unrated)
+
+
+def club_totals(buda, roster, club=None):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param roster: roster table from roster_table
+    :param club: output of club_history, computed here if not given
+    :return: number of club teams, sum of their ratings and number of them
+        without a rating, over the club teams each player was on before the
+        team of each roster row
+
+    """
+
+    history = buda.history
+    if club is None:
+        club = club_history(buda)
+    key, cum_club, cum_sum, cum_unrated = club
+    player = roster['player'].values
+    team_position = history.team_positions(roster['teamid'].values)
+    start = history.player_offsets[player]
+    end = np.searchsorted(key, player.astype('int64') * len(history.team_ids) +
+                          team_position)
+    return cum_club[end] - cum_club[start], cum_sum[end] - cum_sum[start], \
+        cum_unrated[end] - cum_unrated[start]
+
+
+def predict_teams(buda, team_ids, self_to_experience, experience_to_self,
+                  totals=club_totals):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param team_ids: array of team ids
+    :param self_to_experience: function converting self ratings to the
+        experience rating scale
+    :param experience_to_self: function converting experience ratings to the
+        self rating scale
+    :param totals: function giving the club history totals of each roster
+        row, with the same signature as club_totals
+    :return: (dataframe of team ratings with the COLUMNS of
+        BudaRating.predicted_rating, one row per team in team_ids, and the
+        roster table with the rating of every player)
+    :raises ValueError: if a player has no club history and neither a draft
+        nor a captain rating, like BudaRating.predict_team
+
+    """
+
+    roster = roster_table(buda, team_ids)
+    hat = (roster['league_type'] == 'Hat').values
+
+    # draft and captain ratings, only known for hat leagues
+    rank, found, captain_rank = buda.self_index.lookup_many(
+        roster.loc[hat, 'league_id'].values, roster.loc[hat, 'name'].values)
+    rank = rank.astype('float')
+    captain_rank = captain_rank.astype('float')
+    draft = np.full(len(roster), -1.)
+    captain = np.full(len(roster), -1.)
+    has_captain = np.zeros(len(roster), dtype='bool')
+    draft[hat] = np.where(found, rank, 50)
+    has_captain[hat] = np.isfinite(captain_rank)
+    captain[hat] = np.where(has_captain[hat], captain_rank, draft[hat])
+
+    # club teams each player was on before this team
+    n_club, club_sum, n_unrated = totals(buda, roster)
+    has_club = n_club > 0
+
+    experience = np.empty(len(roster))
+    experience[has_club] = club_sum[has_club] / n_club[has_club]
+    experience[has_club & (n_unrated > 0)] = np.nan
+
+    # if someone has no club team record in the database, they probably
+    # aren't very good, but we have to trust their self-rating
+    base = np.where(np.isfinite(captain), captain, draft)[~has_club]
+    if len(base) > 0:
+        converted = np.asarray(self_to_experience(base), dtype='float')
+        # a self rating row without a rank has a NaN draft rating, which the
+        # cast to int would silently turn into INT_MIN; the per-team path
+        # fails on it, so this does too
+        missing = ~np.isfinite(converted)
+        if missing.any():
+            names = roster['name'].values[~has_club][missing]
+            raise ValueError("No draft, captain or club rating for "
+                             "{}".format(', '.join(names)))
+        experience[~has_club] = converted.astype('int')
+
+    roster['draft_rating'] = draft
+    roster['captain_rating'] = captain
+    roster['self_rating'] = 2 * draft - captain
+    roster['experience_rating'] = experience
+    roster['ensemble_rating'] = np.asarray(experience_to_self(experience))
+    roster['has_captain'] = has_captain
+    roster['has_club'] = has_club
+
+    nteams = len(team_ids)
+
+    def team_mean(column, skipna=True):
+        values = roster[column].values
+        ok = ~np.isnan(values) if skipna else np.ones(len(values), 'bool')
+        total = np.bincount(roster['team'].values[ok], weights=values[ok],
+                            minlength=nteams)
+        count = np.bincount(roster['team'].values[ok], minlength=nteams)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return total / count
+
+    def team_count(mask):
+        return np.bincount(roster['team'].values[mask], minlength=nteams)
+
+    teams = pd.DataFrame({
+        'self_rating': team_mean('self_rating'),
+        'captain_rating': team_mean('captain_rating'),
+        'draft_rating': team_mean('draft_rating'),
+        'experience_rating': team_mean('experience_rating'),
+        # the per-team path averages the converted ratings with numpy, so a
+        # single missing rating makes the team's ensemble rating missing
+        'ensemble_rating': team_mean('ensemble_rating', skipna=False),
+        'n_exp_rating': team_count(has_club) / 16.,
+        'n_cap_rating': team_count(has_captain) / 16.,
+        'n_capexp_rating': team_count(has_captain | has_club) / 16.},
+        columns=COLUMNS)
+    return teams, roster
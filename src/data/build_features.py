@@ -1,3 +1,11 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+import batch_predict
+
+
 """
 Idea: Compute team rating as average of block group averages. Suppose a team
 has 16 players.  Then, if two groups are created (let's say four highest
@@ -12,4 +20,264 @@ that team.  Weight vector could take any form.  Possibilities include
 
  - ReLU: Rectified linear unit.  x < x_thresh: f(x) = 0 else f(x) = x
  - Logistic: f(x) = 1/(1+exp(k_0-kx)); k_0 sets transition point from <0.5 to
-"""
\ No newline at end of file
+
+All of these schemes only depend on the ratings of a team's players in
+sorted order, so they are computed from one matrix with a row per team and
+the players' ratings sorted from highest to lowest, padded with NaN.  Block
+group averages are differences of the row-wise cumulative sums of that
+matrix, and weighted means are broadcast over a whole grid of parameters at
+once, so a sweep over thousands of parameter combinations is a handful of
+array operations per scheme.
+"""
+
+
+def rating_matrix(team, ratings, nteams, width=None):
+
+    """
+
+    :param team: position of the team of each roster row, e.g. the team
+        column of batch_predict.predict_teams' roster table
+    :param ratings: rating of each roster row
+    :param nteams: number of teams
+    :param width: number of columns, defaults to the largest roster
+    :return: (nteams, width) matrix of each team's ratings sorted from
+        highest to lowest and padded with NaN, and the number of rated
+        players of each team
+
+    """
+
+    team = np.asarray(team)
+    ratings = np.asarray(ratings, dtype='float')
+    rated = np.isfinite(ratings)
+    team = team[rated]
+    ratings = ratings[rated]
+
+    # sort by team, then by rating from highest to lowest
+    order = np.lexsort((-ratings, team))
+    team = team[order]
+    ratings = ratings[order]
+    counts = np.bincount(team, minlength=nteams)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(len(team)) - starts[team]
+
+    if width is None:
+        width = counts.max() if len(counts) > 0 else 0
+    keep = rank < width
+    matrix = np.full((nteams, width), np.nan)
+    matrix[team[keep], rank[keep]] = ratings[keep]
+    return matrix, np.minimum(counts, width)
+
+
+def team_rating_matrix(buda, team_ids, column='experience_rating',
+                       width=16):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param team_ids: array of team ids
+    :param column: player rating column of batch_predict's roster table
+    :param width: number of columns; players beyond it are dropped
+    :return: output of rating_matrix for the players of each team
+
+    """
+
+    teams, roster = batch_predict.predict_teams(
+        buda, team_ids, buda.scale.to_experience, buda.scale.to_self)
+    return rating_matrix(roster['team'].values, roster[column].values,
+                         len(team_ids), width)
+
+
+def cumulative_ratings(matrix):
+
+    """
+
+    :return: matrix with the sum of the top k ratings of each team in column
+        k, starting from k = 0
+
+    """
+
+    return np.concatenate([np.zeros((len(matrix), 1)),
+                           np.nancumsum(matrix, axis=1)], axis=1)
+
+
+def block_partitions(width, ngroups):
+
+    """
+
+    :param width: number of players
+    :param ngroups: number of groups
+    :return: array with one row per way of splitting width sorted players
+        into ngroups consecutive groups, holding the group boundaries from 0
+        to width
+
+    """
+
+    cuts = itertools.combinations(range(1, width), ngroups - 1)
+    return np.array([(0,) + cut + (width,) for cut in cuts],
+                    dtype='int').reshape(-1, ngroups + 1)
+
+
+def block_group_mean(cumulative, counts, boundaries):
+
+    """
+
+    :param cumulative: output of cumulative_ratings
+    :param counts: number of rated players of each team
+    :param boundaries: (npartitions, ngroups + 1) array of group boundaries
+        from block_partitions
+    :return: (nteams, npartitions) average of the group averages of each
+        team; groups that are empty because a team has fewer players are
+        left out of the average
+
+    """
+
+    bounds = np.minimum(boundaries[np.newaxis],
+                        counts[:, np.newaxis, np.newaxis])
+    rows = np.arange(len(cumulative))[:, np.newaxis, np.newaxis]
+    sums = np.diff(cumulative[rows, bounds], axis=2)
+    sizes = np.diff(bounds, axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(sizes > 0, sums / sizes, 0.)
+        return means.sum(axis=2) / (sizes > 0).sum(axis=2)
+
+
+def relu_weights(matrix, thresholds):
+
+    """
+
+    :return: (nthresholds, nteams, width) weights, equal to the rating for
+        ratings at or above the threshold and 0 below it
+
+    """
+
+    thresholds = np.asarray(thresholds, dtype='float')
+    matrix = matrix[np.newaxis]
+    with np.errstate(invalid='ignore'):
+        return np.where(matrix >= thresholds[:, np.newaxis, np.newaxis],
+                        matrix, 0.)
+
+
+def logistic_weights(matrix, k0, k):
+
+    """
+
+    :param k0: array of transition offsets
+    :param k: array of steepnesses, same length as k0
+    :return: (nparams, nteams, width) weights 1 / (1 + exp(k0 - k * rating))
+
+    """
+
+    k0 = np.asarray(k0, dtype='float')[:, np.newaxis, np.newaxis]
+    k = np.asarray(k, dtype='float')[:, np.newaxis, np.newaxis]
+    with np.errstate(over='ignore'):
+        return 1 / (1 + np.exp(k0 - k * matrix[np.newaxis]))
+
+
+def weighted_mean(matrix, weights):
+
+    """
+
+    :param matrix: output of rating_matrix
+    :param weights: (nparams, nteams, width) weights
+    :return: (nteams, nparams) weighted mean rating of each team, or the
+        plain mean where all of a team's weights are zero
+
+    """
+
+    rated = np.isfinite(matrix)[np.newaxis]
+    values = np.where(rated, matrix[np.newaxis], 0.)
+    weights = np.where(rated, weights, 0.)
+    total = (weights * values).sum(axis=2)
+    norm = weights.sum(axis=2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        plain = values[0].sum(axis=1) / rated[0].sum(axis=1)
+        means = np.where(norm > 0, total / norm, plain[np.newaxis])
+    return means.T
+
+
+def correlations(features, target):
+
+    """
+
+    :param features: (nteams, nfeatures) team ratings from one scheme
+    :param target: observed value of each team, e.g. plusminus
+    :return: Pearson correlation of each feature with the target over the
+        teams where both are finite
+
+    """
+
+    target = np.asarray(target, dtype='float')
+    ok = np.isfinite(features) & np.isfinite(target)[:, np.newaxis]
+    n = ok.sum(axis=0).astype('float')
+    x = np.where(ok, features, 0.)
+    y = np.where(ok, target[:, np.newaxis], 0.)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = x.sum(axis=0) / n
+        mean_y = y.sum(axis=0) / n
+        cov = (x * y).sum(axis=0) / n - mean_x * mean_y
+        var_x = (x ** 2).sum(axis=0) / n - mean_x ** 2
+        var_y = (y ** 2).sum(axis=0) / n - mean_y ** 2
+        return cov / np.sqrt(var_x * var_y)
+
+
+def grid_search(matrix, counts, target, max_groups=3, relu_thresholds=(),
+                logistic_k0=(), logistic_k=(), chunk=256):
+
+    """
+
+    Score every aggregation scheme against an observed team statistic.
+
+    :param matrix: output of rating_matrix
+    :param counts: number of rated players of each team
+    :param target: observed value of each team, e.g. plusminus
+    :param max_groups: largest number of block groups to try; every split
+        of the roster into up to this many groups is scored
+    :param relu_thresholds: thresholds of the ReLU weights to try
+    :param logistic_k0: transition offsets of the logistic weights to try
+    :param logistic_k: steepnesses of the logistic weights to try; every
+        combination with logistic_k0 is scored
+    :param chunk: number of weight parameters to evaluate at once, to bound
+        memory
+    :return: dataframe with the scheme, its parameters and its correlation
+        with the target, best first
+
+    """
+
+    results = []
+
+    rated = np.isfinite(matrix)
+    plain = np.where(rated, matrix, 0.).sum(axis=1) / rated.sum(axis=1)
+    results.append(pd.DataFrame({
+        'scheme': ['mean'], 'params': [()],
+        'r': correlations(plain[:, np.newaxis], target)}))
+
+    cumulative = cumulative_ratings(matrix)
+    width = matrix.shape[1]
+    for ngroups in range(2, max_groups + 1):
+        boundaries = block_partitions(width, ngroups)
+        features = block_group_mean(cumulative, counts, boundaries)
+        results.append(pd.DataFrame({
+            'scheme': 'block',
+            'params': [tuple(bounds[1:-1]) for bounds in boundaries],
+            'r': correlations(features, target)}))
+
+    def sweep(scheme, params, weights):
+        for start in range(0, len(params), chunk):
+            batch = params[start:start + chunk]
+            features = weighted_mean(matrix, weights(batch))
+            results.append(pd.DataFrame({
+                'scheme': scheme,
+                'params': [tuple(param) for param in batch],
+                'r': correlations(features, target)}))
+
+    thresholds = np.asarray(relu_thresholds, dtype='float').reshape(-1, 1)
+    sweep('relu', thresholds,
+          lambda batch: relu_weights(matrix, batch[:, 0]))
+
+    logistic = np.array(list(itertools.product(logistic_k0, logistic_k)),
+                        dtype='float').reshape(-1, 2)
+    sweep('logistic', logistic,
+          lambda batch: logistic_weights(matrix, batch[:, 0], batch[:, 1]))
+
+    results = pd.concat(results, ignore_index=True)
+    return results.sort_values('r', ascending=False).reset_index(drop=True)
@@ -0,0 +1,201 @@
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import urlparse
+
+
+"""
+
+Concurrent HTTP fetch layer for the BUDA scraper.
+
+All requests go through a single requests.Session so that connections to
+old.buda.org are kept alive and reused instead of opening a new socket for
+every schedule and roster page.  A bounded pool of worker threads issues the
+requests, a per-host rate limiter keeps us from hammering the site, and
+transient failures (connection errors, timeouts, 5xx and 429 responses) are
+retried with exponential backoff.
+
+Pages are returned as raw bytes so that BeautifulSoup does the same encoding
+detection it did when it was handed the urllib2 response directly.
+
+If the fetcher is given a ResponseCache, pages are served from disk whenever
+possible and stale pages are revalidated with a conditional request.
+
+
+"""
+
+
+# status codes that are worth retrying
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class RateLimiter(object):
+
+    """
+
+    Hand out request slots so that requests to the same host are spaced at
+    least min_interval seconds apart, regardless of which thread makes them.
+
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, host):
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Fetcher(object):
+
+    """
+
+    :param nworkers: number of concurrent requests
+    :param min_interval: minimum number of seconds between requests to the
+        same host
+    :param retries: number of times to retry a failed request
+    :param backoff: base delay in seconds, doubled after every failed attempt
+    :param timeout: per-request timeout in seconds
+    :param cache: optional ResponseCache to serve and store pages
+    :param metrics: optional instrument.Metrics to record the time spent on
+        requests, the number of retries and of pages that weren't modified
+
+    """
+
+    def __init__(self, nworkers=8, min_interval=0.1, retries=3, backoff=0.5,
+                 timeout=30, cache=None, metrics=None):
+        self.nworkers = nworkers
+        self.cache = cache
+        self.metrics = metrics
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(min_interval)
+
+        # one keep-alive connection per worker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=nworkers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ThreadPool(self.nworkers)
+        return self._pool
+
+    def fetch(self, url, revalidate=False):
+
+        """
+
+        :param url: url of the page to fetch
+        :param revalidate: if True, check a cached copy with the server even
+            if the cache considers it fresh
+        :return: body of the response as bytes
+
+        """
+
+        headers = {}
+        entry = None
+        if self.cache is not None:
+            if self.cache.offline:
+                return self.cache.get(url)
+            entry = self.cache.lookup(url)
+            if entry is not None:
+                if not revalidate and self.cache.is_fresh(entry):
+                    self.cache.hit()
+                    return self.cache.read(entry)
+                headers = self.cache.conditional_headers(entry)
+
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(host)
+            start = time.time()
+            try:
+                response = self.session.get(url, headers=headers,
+                                            timeout=self.timeout)
+                self.record('http_request', time.time() - start)
+                if response.status_code == 304 and entry is not None:
+                    self.record('http_not_modified')
+                    self.cache.touch(url)
+                    return self.cache.read(entry)
+                if response.status_code not in RETRY_STATUS:
+                    # anything else that isn't a 2xx is a permanent failure
+                    response.raise_for_status()
+                    if self.cache is not None:
+                        self.cache.store(url, response.content,
+                                         response.headers)
+                    return response.content
+                error = requests.HTTPError(
+                    "{} returned {}".format(url, response.status_code),
+                    response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.record('http_request', time.time() - start)
+                error = e
+
+            if attempt >= self.retries:
+                self.record('http_failures')
+                raise error
+            self.record('http_retries')
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def record(self, name, seconds=None):
+
+        """
+
+        :param name: timer to add seconds to, or counter to increment if
+            seconds is None
+
+        """
+
+        if self.metrics is None:
+            return
+        if seconds is None:
+            self.metrics.count(name)
+        else:
+            self.metrics.add_time(name, seconds)
+
+    def fetch_all(self, urls):
+
+        """
+
+        :param urls: list of urls to fetch concurrently
+        :return: list of response bodies in the same order as urls
+
+        """
+
+        return self.pool.map(self.fetch, urls)
+
+    def checkpoint(self):
+
+        """
+
+        Flush the cache index to disk so that a crash doesn't lose the pages
+        fetched so far.
+
+        """
+
+        if self.cache is not None and not self.cache.offline:
+            self.cache.save()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self.session.close()
+        self.checkpoint()
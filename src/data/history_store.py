@@ -0,0 +1,371 @@
+import os
+
+import numpy as np
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+"""
+
+Array-backed store of the player/team/league graph.
+
+The scraper builds player_teams, team_players, team_rating and league_teams
+as dictionaries of lists keyed by string ids.  That is convenient while
+scraping but wasteful to keep around: every list is a separate Python object
+and predict_team turned each player's list into a new integer array on every
+call.
+
+The store interns team ids to positions in a sorted integer array and player
+names and league ids to positions in sorted string arrays, and keeps each
+one-to-many relation in compressed sparse row form: an offsets array with
+one entry per row plus one, and an indices array with the members of row i in
+indices[offsets[i]:offsets[i + 1]].  Each player's teams are sorted by team
+id, so the teams a player was on before a given team are a prefix of their
+row and can be sliced out without allocating anything.
+
+All arrays are saved as .npy files in one directory and can be memory-mapped
+on load.  The dictionaries are still available as read-only views that
+build each value on demand.
+
+"""
+
+
+ARRAYS = ['team_ids', 'team_ratings', 'team_rated',
+          'player_names', 'player_offsets', 'player_teams',
+          'roster_offsets', 'roster_players', 'team_has_roster',
+          'league_ids', 'league_offsets', 'league_teams']
+
+
+def csr(rows, nrows):
+
+    """
+
+    :param rows: list of (row, list of member positions) pairs
+    :param nrows: total number of rows
+    :return: offsets and indices arrays
+
+    """
+
+    counts = np.zeros(nrows + 1, dtype='int64')
+    for row, members in rows:
+        counts[row + 1] = len(members)
+    offsets = counts.cumsum()
+    indices = np.zeros(offsets[-1], dtype='int32')
+    for row, members in rows:
+        indices[offsets[row]:offsets[row + 1]] = members
+    return offsets, indices
+
+
+class HistoryStore(object):
+
+    def __init__(self, arrays):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self.player_teams_view = PlayerTeamsView(self)
+        self.team_players_view = TeamPlayersView(self)
+        self.team_rating_view = TeamRatingView(self)
+        self.league_teams_view = LeagueTeamsView(self)
+
+    @classmethod
+    def from_dicts(cls, player_teams, team_players, team_rating,
+                   league_teams):
+
+        """
+
+        :param player_teams: dictionary of player name to list of team ids
+        :param team_players: dictionary of team id to list of player names
+        :param team_rating: dictionary of team id to team rating
+        :param league_teams: dictionary of league id to list of team ids
+        :return: HistoryStore holding the same data
+
+        """
+
+        team_ids = set(int(team_id) for team_id in team_rating)
+        team_ids.update(int(team_id) for team_id in team_players)
+        for teams in league_teams.values():
+            team_ids.update(int(team_id) for team_id in teams)
+        for teams in player_teams.values():
+            team_ids.update(int(team_id) for team_id in teams)
+        team_ids = np.array(sorted(team_ids), dtype='int64')
+
+        player_names = set(player_teams)
+        for players in team_players.values():
+            player_names.update(players)
+        player_names = np.array(sorted(player_names), dtype='U')
+
+        league_ids = np.array(sorted(league_teams), dtype='U')
+
+        def team_positions(teams):
+            return np.searchsorted(team_ids,
+                                   np.array(teams, dtype='int64'))
+
+        team_ratings = np.full(len(team_ids), np.nan)
+        team_rated = np.zeros(len(team_ids), dtype='bool')
+        for team_id in team_rating:
+            position = team_positions([team_id])[0]
+            team_rated[position] = True
+            if team_rating[team_id] is not None:
+                team_ratings[position] = team_rating[team_id]
+
+        rows = [(np.searchsorted(player_names, player),
+                 np.sort(team_positions(player_teams[player])))
+                for player in player_teams]
+        player_offsets, player_teams_csr = csr(rows, len(player_names))
+
+        team_has_roster = np.zeros(len(team_ids), dtype='bool')
+        rows = []
+        for team_id in team_players:
+            position = team_positions([team_id])[0]
+            team_has_roster[position] = True
+            players = team_players[team_id]
+            rows.append((position, np.searchsorted(
+                player_names, np.array(players, dtype='U'))))
+        roster_offsets, roster_players = csr(rows, len(team_ids))
+
+        rows = [(np.searchsorted(league_ids, league_id),
+                 team_positions(league_teams[league_id]))
+                for league_id in league_teams]
+        league_offsets, league_teams_csr = csr(rows, len(league_ids))
+
+        return cls({'team_ids': team_ids,
+                    'team_ratings': team_ratings,
+                    'team_rated': team_rated,
+                    'player_names': player_names,
+                    'player_offsets': player_offsets,
+                    'player_teams': player_teams_csr,
+                    'roster_offsets': roster_offsets,
+                    'roster_players': roster_players,
+                    'team_has_roster': team_has_roster,
+                    'league_ids': league_ids,
+                    'league_offsets': league_offsets,
+                    'league_teams': league_teams_csr})
+
+    def save(self, directory):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+
+        """
+
+        :param directory: directory written by save
+        :param mmap: if True, memory-map the arrays instead of reading them
+        :return: HistoryStore
+
+        """
+
+        mmap_mode = 'r' if mmap else None
+        arrays = {}
+        for name in ARRAYS:
+            arrays[name] = np.load(os.path.join(directory, name + '.npy'),
+                                   mmap_mode=mmap_mode)
+        return cls(arrays)
+
+    def player_position(self, player):
+
+        """
+
+        :param player: player name
+        :return: position of the player in player_names
+        :raises KeyError: if the player isn't in the store
+
+        """
+
+        position = np.searchsorted(self.player_names, player)
+        if position == len(self.player_names) or \
+                self.player_names[position] != player:
+            raise KeyError(player)
+        return position
+
+    def team_positions(self, team_ids):
+
+        """
+
+        :param team_ids: array of team ids
+        :return: position of each team in team_ids
+        :raises KeyError: if any of the teams isn't in the store
+
+        """
+
+        team_ids = np.asarray(team_ids).astype('int64')
+        positions = np.searchsorted(self.team_ids, team_ids)
+        found = positions < len(self.team_ids)
+        found[found] = self.team_ids[positions[found]] == team_ids[found]
+        if not found.all():
+            raise KeyError(team_ids[~found][0])
+        return positions
+
+    def team_position(self, team_id):
+        return self.team_positions([team_id])[0]
+
+    def player_rows(self):
+
+        """
+
+        :return: position of the player that each entry of player_teams
+            belongs to
+
+        """
+
+        return np.repeat(np.arange(len(self.player_names)),
+                         np.diff(self.player_offsets))
+
+    def rosters(self, team_ids):
+
+        """
+
+        :param team_ids: array of team ids
+        :return: arrays of (position in team_ids, player position) with one
+            entry per roster spot, in roster order
+        :raises KeyError: if any of the teams has no roster
+
+        """
+
+        positions = self.team_positions(team_ids)
+        if not self.team_has_roster[positions].all():
+            missing = ~self.team_has_roster[positions]
+            raise KeyError(np.asarray(team_ids)[missing][0])
+        starts = self.roster_offsets[positions]
+        counts = self.roster_offsets[positions + 1] - starts
+        rows = np.repeat(np.arange(len(positions)), counts)
+        entries = np.arange(counts.sum()) + np.repeat(
+            starts - (counts.cumsum() - counts), counts)
+        return rows, self.roster_players[entries]
+
+    def teams_of(self, player):
+
+        """
+
+        :param player: player name
+        :return: positions of the player's teams, sorted by team id, as a
+            view into the store
+
+        """
+
+        position = self.player_position(player)
+        return self.player_teams[self.player_offsets[position]:
+                                 self.player_offsets[position + 1]]
+
+    def previous_teams(self, player, team_id):
+
+        """
+
+        :param player: player name
+        :param team_id: id of the current team
+        :return: ids of the player's teams with an id smaller than team_id
+
+        """
+
+        teams = self.teams_of(player)
+        cut = np.searchsorted(teams, np.searchsorted(self.team_ids,
+                                                     int(team_id)))
+        return self.team_ids[teams[:cut]]
+
+    def roster(self, team_id):
+
+        """
+
+        :param team_id: id of the team
+        :return: positions of the players on the team in roster order
+
+        """
+
+        position = self.team_position(team_id)
+        if not self.team_has_roster[position]:
+            raise KeyError(team_id)
+        return self.roster_players[self.roster_offsets[position]:
+                                   self.roster_offsets[position + 1]]
+
+
+class StoreView(Mapping):
+
+    """
+
+    Read-only dictionary view of one of the relations in a HistoryStore.
+
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+
+class PlayerTeamsView(StoreView):
+
+    def __getitem__(self, player):
+        teams = self.store.teams_of(player)
+        return [str(team_id) for team_id in self.store.team_ids[teams]]
+
+    def __iter__(self):
+        offsets = self.store.player_offsets
+        for position in np.nonzero(offsets[1:] > offsets[:-1])[0]:
+            yield self.store.player_names[position]
+
+    def __len__(self):
+        offsets = self.store.player_offsets
+        return int((offsets[1:] > offsets[:-1]).sum())
+
+    def __contains__(self, player):
+        try:
+            return len(self.store.teams_of(player)) > 0
+        except KeyError:
+            return False
+
+
+class TeamPlayersView(StoreView):
+
+    def __getitem__(self, team_id):
+        players = self.store.roster(team_id)
+        return [self.store.player_names[position] for position in players]
+
+    def __iter__(self):
+        for team_id in self.store.team_ids[self.store.team_has_roster]:
+            yield str(team_id)
+
+    def __len__(self):
+        return int(self.store.team_has_roster.sum())
+
+
+class TeamRatingView(StoreView):
+
+    def __getitem__(self, team_id):
+        position = self.store.team_position(team_id)
+        if not self.store.team_rated[position]:
+            raise KeyError(team_id)
+        rating = self.store.team_ratings[position]
+        if np.isnan(rating):
+            return None
+        return rating
+
+    def __iter__(self):
+        for team_id in self.store.team_ids[self.store.team_rated]:
+            yield str(team_id)
+
+    def __len__(self):
+        return int(self.store.team_rated.sum())
+
+
+class LeagueTeamsView(StoreView):
+
+    def __getitem__(self, league_id):
+        position = np.searchsorted(self.store.league_ids, league_id)
+        if position == len(self.store.league_ids) or \
+                self.store.league_ids[position] != league_id:
+            raise KeyError(league_id)
+        offsets = self.store.league_offsets
+        teams = self.store.league_teams[offsets[position]:
+                                        offsets[position + 1]]
+        return [str(team_id) for team_id in self.store.team_ids[teams]]
+
+    def __iter__(self):
+        for league_id in self.store.league_ids:
+            yield league_id
+
+    def __len__(self):
+        return len(self.store.league_ids)
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+
+"""
+
+On-disk cache of HTTP responses for the BUDA scraper.
+
+Response bodies are stored as zlib-compressed blobs named by the sha1 of the
+body, so identical pages (e.g. empty rosters) are only stored once.  An index
+file maps each url to the blob holding its most recent body along with the
+ETag and Last-Modified headers that came with it, which lets the fetcher ask
+the server whether a cached page is still current instead of downloading it
+again.
+
+    cache_dir/
+        index.json
+        blobs/ab/abcdef0123....z
+
+In offline mode the network is never touched: every page must come from the
+cache, which is what lets us rerun the parsing and rating code without a
+connection or point the scraper at a local stand-in server once and replay
+it afterwards.
+
+"""
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class ResponseCache(object):
+
+    """
+
+    :param cache_dir: directory holding the index and the blobs
+    :param offline: if True, never go to the network and raise CacheMiss for
+        urls that have not been cached
+    :param max_age: number of seconds a cached response is trusted without
+        revalidation.  None means cached responses never go stale, which is
+        what we want for past leagues whose pages no longer change.
+
+    """
+
+    def __init__(self, cache_dir, offline=False, max_age=None):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def blob_path(self, digest):
+        return os.path.join(self.cache_dir, 'blobs', digest[:2], digest + '.z')
+
+    def lookup(self, url):
+
+        """
+
+        :param url: url of the page
+        :return: index entry for url, or None if it has not been cached
+
+        """
+
+        with self._lock:
+            entry = self.index.get(url)
+            if entry is None:
+                self.misses += 1
+            return entry
+
+    def is_fresh(self, entry):
+        if self.max_age is None:
+            return True
+        return time.time() - entry['fetched'] < self.max_age
+
+    def read(self, entry):
+        with open(self.blob_path(entry['blob']), 'rb') as f:
+            return zlib.decompress(f.read())
+
+    def get(self, url):
+
+        """
+
+        :param url: url of the page
+        :return: cached body of the page
+        :raises CacheMiss: if url has not been cached
+
+        """
+
+        entry = self.lookup(url)
+        if entry is None:
+            raise CacheMiss(url)
+        self.hit()
+        return self.read(entry)
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def conditional_headers(self, entry):
+
+        """
+
+        :param entry: index entry of a cached page
+        :return: request headers asking the server to reply 304 Not Modified
+            if the page hasn't changed since it was cached
+
+        """
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def touch(self, url):
+
+        """
+
+        Mark the cached copy of url as revalidated by the server.
+
+        """
+
+        with self._lock:
+            self.index[url]['fetched'] = time.time()
+            self.revalidated += 1
+
+    def store(self, url, body, headers=None):
+
+        """
+
+        :param url: url of the page
+        :param body: body of the response as bytes
+        :param headers: response headers, used to keep the validators
+
+        """
+
+        if headers is None:
+            headers = {}
+        digest = hashlib.sha1(body).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            blob_dir = os.path.dirname(path)
+            if not os.path.exists(blob_dir):
+                try:
+                    os.makedirs(blob_dir)
+                except OSError:
+                    # another thread created it first
+                    pass
+            tmp_path = '{}.{}.tmp'.format(path, threading.current_thread().ident)
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(body))
+            os.rename(tmp_path, path)
+
+        with self._lock:
+            self.index[url] = {'blob': digest,
+                               'etag': headers.get('ETag'),
+                               'last_modified': headers.get('Last-Modified'),
+                               'fetched': time.time()}
+
+    def save(self):
+
+        """
+
+        Write the index to disk.  Blobs are written as they are stored, so
+        only the index needs flushing.
+
+        """
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        with self._lock:
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f, indent=0, sort_keys=True)
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(tmp_path, self.index_path)
+
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'entries': len(self.index)}
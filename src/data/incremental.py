@@ -0,0 +1,154 @@
+from collections import deque
+
+import numpy as np
+
+from batch_predict import club_history, history_entries
+
+
+"""
+
+Running club history of every player, for rating a new league without
+recomputing every team since 2010.
+
+A team's experience rating only depends on the club teams its players were
+on before it, and team ids grow over time.  So when a league closes, the
+experience ratings of its teams only need the club history of its players
+up to now: a count, a sum of ratings and a count of unrated teams per player,
+plus the last few club ratings for schemes that weight recent seasons.
+Those running totals are built once from the history store and then folded
+forward one league at a time.
+
+"""
+
+
+class RunningClubHistory(object):
+
+    """
+
+    :param nrecent: number of most recent club ratings to keep per player
+
+    """
+
+    def __init__(self, nrecent=5):
+        self.nrecent = nrecent
+
+        # player name -> [number of club teams, sum of their ratings,
+        #                 number of them without a rating,
+        #                 deque of the most recent club ratings]
+        self.players = {}
+
+        # largest team id that has been folded in
+        self.last_team = -1
+
+    @classmethod
+    def from_buda(cls, buda, nrecent=5):
+
+        """
+
+        :param buda: BudaRating with the data loaded
+        :param nrecent: number of most recent club ratings to keep per player
+        :return: RunningClubHistory covering every team in the history store
+
+        """
+
+        running = cls(nrecent)
+        history = buda.history
+        _, cum_club, cum_sum, cum_unrated = club_history(buda)
+        offsets = history.player_offsets
+        start = offsets[:-1]
+        end = offsets[1:]
+        n_club = cum_club[end] - cum_club[start]
+        club_sum = cum_sum[end] - cum_sum[start]
+        n_unrated = cum_unrated[end] - cum_unrated[start]
+
+        # club flags and ratings of every history entry, for the recent
+        # ratings
+        entry_club, entry_ratings = history_entries(buda)
+
+        for position in np.nonzero(n_club)[0]:
+            entries = np.arange(start[position], end[position])
+            entries = entries[entry_club[entries]]
+            running.players[history.player_names[position]] = [
+                int(n_club[position]), float(club_sum[position]),
+                int(n_unrated[position]),
+                deque(entry_ratings[entries[-nrecent:]], maxlen=nrecent)]
+
+        if len(history.team_ids) > 0:
+            running.last_team = int(history.team_ids[-1])
+        return running
+
+    def recent(self, player):
+
+        """
+
+        :param player: player name
+        :return: list of the player's most recent club team ratings, oldest
+            first
+
+        """
+
+        if player not in self.players:
+            return []
+        return list(self.players[player][3])
+
+    def totals(self, buda, roster):
+
+        """
+
+        Club history totals of each roster row, with the same signature as
+        batch_predict.club_totals, for teams newer than every team folded in
+        so far.
+
+        """
+
+        if len(roster) > 0 and roster['teamid'].min() <= self.last_team:
+            raise ValueError("Team {} is not newer than the running history, "
+                             "which already covers team {}".format(
+                                 roster['teamid'].min(), self.last_team))
+
+        n_club = np.zeros(len(roster), dtype='int')
+        club_sum = np.zeros(len(roster))
+        n_unrated = np.zeros(len(roster), dtype='int')
+        for i, player in enumerate(roster['name'].values):
+            record = self.players.get(player)
+            if record is not None:
+                n_club[i], club_sum[i], n_unrated[i] = record[:3]
+        return n_club, club_sum, n_unrated
+
+    def add_teams(self, buda, team_ids):
+
+        """
+
+        :param buda: BudaRating with the new teams loaded
+        :param team_ids: ids of the new teams, all newer than the teams
+            folded in so far
+
+        """
+
+        team_ids = np.sort(np.asarray(team_ids).astype('int64'))
+        if len(team_ids) == 0:
+            return
+        if team_ids[0] <= self.last_team:
+            raise ValueError("Team {} is not newer than the running history, "
+                             "which already covers team {}".format(
+                                 team_ids[0], self.last_team))
+
+        for team_id in team_ids:
+            if buda.index.team_type(team_id) != 'Club':
+                continue
+            rating = buda.index.team_ratings([team_id])[0]
+            for player in buda.team_players[str(team_id)]:
+                if player == '':
+                    continue
+                record = self.players.get(player)
+                if record is None:
+                    record = [0, 0., 0, deque(maxlen=self.nrecent)]
+                    self.players[player] = record
+                record[0] += 1
+                if np.isnan(rating):
+                    record[2] += 1
+                else:
+                    record[1] += rating
+                record[3].append(rating)
+
+        self.last_team = int(team_ids[-1])
@@ -0,0 +1,223 @@
+import cProfile
+import json
+import logging
+import pstats
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+"""
+
+Stage timers, counters and events for the scraper and the rating code.
+
+A BudaRating keeps a Metrics object and records into it as it works:
+
+ - timers: calls and total seconds of each stage (fetch, parse, normalize,
+   roster_join, write_scores, predict), plus http_request for the time the
+   fetcher spends on each request, summed over its worker threads
+ - counters: leagues and teams scraped, unmatched teams, players joined,
+   HTTP retries and so on
+ - events: one record per notable thing that happened, such as a skipped
+   league and the reason it was skipped
+
+Events are also logged as JSON lines on the 'buda' logger, which is silent
+unless the application configures logging, e.g.
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+report() gathers everything into a dictionary, with the hit rate of the
+response cache if one is passed in; BudaRating.report() passes in the cache
+of its fetcher.  Work done in forked workers is not recorded, since the
+workers have their own copies of the Metrics.
+
+profile() runs a block under cProfile and/or tracemalloc and writes the
+results to files and to the Metrics instead of stopping to be inspected, so
+that it can be left on in batch jobs:
+
+    with instrument.profile(buda.metrics, 'scrape', path='scrape.prof',
+                            memory=True):
+        buda.scrape_buda()
+
+"""
+
+
+logger = logging.getLogger('buda')
+logger.addHandler(logging.NullHandler())
+
+
+class Metrics(object):
+
+    """
+
+    Thread-safe timers, counters and events.
+
+    :param logger: logger to write the events to as JSON lines
+
+    """
+
+    def __init__(self, logger=logger):
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.events = []
+            self.memory = {}
+
+    @contextmanager
+    def stage(self, name):
+
+        """
+
+        Time the enclosed block as one call of stage name.
+
+        """
+
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.add_time(name, default_timer() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            calls, total = self.timers.get(name, (0, 0.))
+            self.timers[name] = (calls + 1, total + seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_memory(self, stage, usage):
+        with self._lock:
+            self.memory[stage] = usage
+        self.logger.info(json.dumps(dict(usage, event='memory', stage=stage)))
+
+    def event(self, kind, **fields):
+
+        """
+
+        :param kind: kind of event, e.g. 'league_skipped'
+        :param fields: details of the event, which must be JSON serializable
+            or convertible with str
+
+        """
+
+        record = dict(fields)
+        record['event'] = kind
+        with self._lock:
+            self.events.append(record)
+        self.logger.info(json.dumps(record, sort_keys=True, default=str))
+
+    def skip_league(self, leagueid, reason, **fields):
+
+        """
+
+        Record that a league was not scraped.
+
+        :param leagueid: id of the league
+        :param reason: short machine readable reason, e.g. 'no_divisions'
+
+        """
+
+        self.count('leagues_skipped')
+        self.event('league_skipped', league=leagueid, reason=reason, **fields)
+
+    def report(self, cache=None):
+
+        """
+
+        :param cache: optional ResponseCache whose hit rate to include
+        :return: dictionary of the timers, counters, events, memory
+            measurements, skipped leagues by reason and cache statistics
+
+        """
+
+        with self._lock:
+            report = {
+                'timers': dict((name, {'calls': calls, 'seconds': seconds})
+                               for name, (calls, seconds) in
+                               self.timers.items()),
+                'counters': dict(self.counters),
+                'events': list(self.events),
+                'memory': dict(self.memory)}
+
+        skipped = {}
+        for record in report['events']:
+            if record['event'] == 'league_skipped':
+                skipped[record['reason']] = skipped.get(record['reason'],
+                                                        0) + 1
+        report['skipped_leagues'] = skipped
+
+        if cache is not None:
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / float(lookups) \
+                if lookups > 0 else None
+            report['cache'] = stats
+        return report
+
+
+@contextmanager
+def profile(metrics=None, stage='profile', path=None, memory=False, top=25):
+
+    """
+
+    Profile the enclosed block without interaction.
+
+    :param metrics: Metrics to record the stage time and memory use in
+    :param stage: name of the stage
+    :param path: if given, run cProfile and dump its stats to path, with the
+        top functions by cumulative time written as text to path + '.txt'
+    :param memory: if True, trace allocations with tracemalloc, which needs
+        python 3, and record the peak and the lines that allocated the most
+    :param top: number of functions and allocating lines to keep
+
+    """
+
+    profiler = None
+    if path is not None:
+        profiler = cProfile.Profile()
+    tracing = memory and tracemalloc is not None and \
+        not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+
+    start = default_timer()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        seconds = default_timer() - start
+
+        if metrics is not None:
+            metrics.add_time(stage, seconds)
+
+        if profiler is not None:
+            profiler.dump_stats(path)
+            with open(path + '.txt', 'w') as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats('cumulative').print_stats(top)
+
+        if tracing:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = snapshot.statistics('lineno')[:top]
+            usage = {'peak_bytes': peak, 'current_bytes': current,
+                     'top': [(str(line.traceback), line.size)
+                             for line in lines]}
+            if metrics is not None:
+                metrics.record_memory(stage, usage)
@@ -0,0 +1,133 @@
+import functools
+import multiprocessing
+
+import numpy as np
+
+import batch_predict
+
+
+"""
+
+Run per-team work on a pool of processes, one league per task.
+
+The teams of different leagues don't depend on each other once the data is
+loaded, so the teams are split into one shard per league and the shards are
+mapped over a process pool.  The BudaRating is handed to the workers by
+forking: it is stored in a module global before the pool is created, so
+every worker starts with a copy-on-write view of it and nothing but the
+team ids and the results is pickled.  A history store that was loaded with
+mmap=True is shared through the page cache as well.
+
+Results come back in the order of the team ids that were passed in, however
+the shards were scheduled.
+
+"""
+
+
+# (buda, extra arguments) seen by the workers; only set while a pool is alive
+_SHARED = None
+
+
+def shard_by_league(buda, team_ids):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param team_ids: array of team ids
+    :return: list of arrays of positions in team_ids, one per league, in the
+        order each league first appears in team_ids
+
+    """
+
+    leagues = [buda.index.league(team_id) for team_id in team_ids]
+    shards = {}
+    order = []
+    for position, league in enumerate(leagues):
+        if league not in shards:
+            shards[league] = []
+            order.append(league)
+        shards[league].append(position)
+    return [np.array(shards[league]) for league in order]
+
+
+def fork_pool(nworkers):
+
+    """
+
+    :return: multiprocessing pool whose workers are forked from this process
+
+    """
+
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:
+        # python 2 always forks
+        context = multiprocessing
+    return context.Pool(nworkers)
+
+
+def _run_shard(task):
+    func, team_ids = task
+    buda, args = _SHARED
+    return func(buda, team_ids, *args)
+
+
+def map_leagues(buda, func, team_ids, nworkers, *args):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param func: module level function taking (buda, team ids of one league,
+        *args) and returning a list with one result per team
+    :param team_ids: array of team ids
+    :param nworkers: number of processes
+    :param args: extra arguments for func, shared with the workers by forking
+        instead of pickling
+    :return: list with the result of every team, in the order of team_ids
+
+    """
+
+    global _SHARED
+
+    team_ids = np.asarray(team_ids)
+    shards = shard_by_league(buda, team_ids)
+    tasks = [(func, team_ids[shard]) for shard in shards]
+
+    _SHARED = (buda, args)
+    pool = fork_pool(nworkers)
+    try:
+        shard_results = pool.map(_run_shard, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        _SHARED = None
+
+    results = [None] * len(team_ids)
+    for shard, shard_result in zip(shards, shard_results):
+        for position, result in zip(shard, shard_result):
+            results[position] = result
+    return results
+
+
+def predict_shard(buda, team_ids, club):
+
+    """
+
+    :param club: club history of the history store from
+        batch_predict.club_history, computed once before forking
+    :return: array of the batch_predict.COLUMNS of each team
+
+    """
+
+    teams, roster = batch_predict.predict_teams(
+        buda, team_ids, buda.scale.to_experience, buda.scale.to_self,
+        totals=functools.partial(batch_predict.club_totals, club=club))
+    return list(teams[batch_predict.COLUMNS].values)
+
+
+def predict_team_shard(buda, team_ids):
+    return [buda.predict_team(str(team_id)) for team_id in team_ids]
+
+
+def team_detail_shard(buda, team_ids):
+    return [buda.team_detail(str(team_id)) for team_id in team_ids]
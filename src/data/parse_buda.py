@@ -0,0 +1,425 @@
+import sys
+from bs4 import BeautifulSoup, UnicodeDammit
+
+try:
+    from HTMLParser import HTMLParser
+except ImportError:
+    from html.parser import HTMLParser
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+
+"""
+
+Extract the few pieces of the BUDA pages that the scraper actually uses.
+
+The scraper only ever needs three things from a page:
+
+ - the rows of the second table with class "info" (the league schedule),
+ - the text and first link of every td with class "infobody" (the list of
+   teams in a league, the players on a roster and the list of past leagues),
+ - the src of the first iframe (the past leagues page).
+
+Building a full html5lib tree of every page just to read those is the slowest
+part of a scrape once pages are cached, so the extraction is done by one of
+several interchangeable backends:
+
+ - 'html5lib': BeautifulSoup with html5lib, the original behaviour and the
+   reference that the other backends are checked against,
+ - 'lxml': lxml.html with XPath, if lxml is installed.  libxml2 doesn't
+   build the tree the way an html5 parser does, so on malformed tables it
+   can disagree with html5lib: a <td> that isn't in a <tr>, including the
+   cells of an unclosed nested table, is dropped rather than put in an
+   implied row, and a <td class="infobody"> outside of any table is kept
+   rather than dropped.  tests/fixtures/known_differences has an example
+   of each,
+ - 'stream': a single pass of the standard library HTMLParser that only keeps
+   track of the elements listed above.
+
+Run this module with the path to a ResponseCache directory to check that
+every backend gives the same answer as html5lib on all of the cached pages.
+
+"""
+
+
+DEFAULT_BACKEND = 'stream'
+
+
+def has_class(class_attr, name):
+    return class_attr is not None and name in class_attr.split()
+
+
+def decode(page):
+
+    """
+
+    :param page: page as bytes or text
+    :return: page as text, decoded the same way BeautifulSoup would
+
+    """
+
+    if isinstance(page, bytes):
+        return UnicodeDammit(page, is_html=True).unicode_markup
+    return page
+
+
+# html5lib backend
+
+def _html5lib_info_table_rows(page, which):
+    soup = BeautifulSoup(page, "html5lib")
+    try:
+        table = soup.find_all('table', attrs={'class': 'info'})[which]
+    except IndexError:
+        return None
+    data = []
+    for row in table.find_all('tr'):
+        th_cols = [ele.text.strip() for ele in row.find_all('th')]
+        if th_cols != []:
+            data.append(th_cols)
+        td_cols = [ele.text.strip() for ele in row.find_all('td')]
+        if td_cols != []:
+            data.append(td_cols)
+    return data
+
+
+def _html5lib_infobody_cells(page):
+    soup = BeautifulSoup(page, "html5lib")
+    cells = []
+    for td in soup.find_all('td', class_='infobody'):
+        if td.a is None:
+            cells.append((td.get_text(), None, None))
+        else:
+            cells.append((td.get_text(), td.a.get('href'), td.a.get_text()))
+    return cells
+
+
+def _html5lib_iframe_src(page):
+    soup = BeautifulSoup(page, "html5lib")
+    return soup.find_all('iframe')[0].attrs['src']
+
+
+# lxml backend
+
+INFO_TABLE_XPATH = '//table[contains(concat(" ", normalize-space(@class), ' \
+                   '" "), " info ")]'
+INFOBODY_XPATH = '//td[contains(concat(" ", normalize-space(@class), " "), ' \
+                 '" infobody ")]'
+
+
+def _lxml_document(page):
+    if lxml is None:
+        raise ImportError("the lxml backend needs lxml to be installed")
+    return lxml.html.document_fromstring(decode(page))
+
+
+def _lxml_info_table_rows(page, which):
+    tables = _lxml_document(page).xpath(INFO_TABLE_XPATH)
+    try:
+        table = tables[which]
+    except IndexError:
+        return None
+    data = []
+    for row in table.iter('tr'):
+        th_cols = [ele.text_content().strip() for ele in row.iter('th')]
+        if th_cols != []:
+            data.append(th_cols)
+        td_cols = [ele.text_content().strip() for ele in row.iter('td')]
+        if td_cols != []:
+            data.append(td_cols)
+    return data
+
+
+def _lxml_infobody_cells(page):
+    cells = []
+    for td in _lxml_document(page).xpath(INFOBODY_XPATH):
+        anchors = td.xpath('.//a')
+        if len(anchors) == 0:
+            cells.append((td.text_content(), None, None))
+        else:
+            a = anchors[0]
+            cells.append((td.text_content(), a.get('href'), a.text_content()))
+    return cells
+
+
+def _lxml_iframe_src(page):
+    return _lxml_document(page).xpath('//iframe')[0].get('src')
+
+
+# streaming backend
+
+class TargetedExtractor(HTMLParser):
+
+    """
+
+    Single pass over a page that records the rows of every table with class
+    "info", the text and first link of every td with class "infobody" and
+    the src of every iframe.  Everything else is skipped.
+
+    Cells and rows are closed implicitly when the next cell or row of the
+    same table starts, the way an html5 parser would close an unterminated
+    <td>, and a <td> outside of any table is ignored.  Like find_all in the html5lib backend, a row of an info table
+    includes the cells of any table nested in it, and the rows of a nested
+    table are rows of every info table around it.
+
+    """
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.info_tables = []
+        self.infobody_cells = []
+        self.iframe_srcs = []
+
+        # open info tables, rows and cells, each with the table depth at
+        # which it was opened; rows are {'th': cells, 'td': cells} and cells
+        # are lists of text, shared by every row and table they belong to
+        self._depth = 0
+        self._tables = []
+        self._rows = []
+        self._cells = []
+
+        # infobody cell currently being read, as [text, href, anchor text]
+        self._infobody = None
+        self._infobody_depth = None
+        self._in_anchor = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'table':
+            self._depth += 1
+            if has_class(attrs.get('class'), 'info'):
+                self.info_tables.append([])
+                self._tables.append((self._depth, self.info_tables[-1]))
+        elif tag == 'tr':
+            self._close_row(self._depth)
+            if self._tables:
+                self._open_row()
+        elif tag in ('td', 'th'):
+            self._close_cell(self._depth)
+            if self._tables:
+                if not self._rows or self._rows[-1][0] != self._depth:
+                    self._open_row()
+                cell = []
+                for depth, row in self._rows:
+                    row[tag].append(cell)
+                self._cells.append((self._depth, cell))
+            # html5 parsers drop a td that isn't in any table
+            if tag == 'td' and self._depth > 0:
+                if has_class(attrs.get('class'), 'infobody'):
+                    self._close_infobody()
+                    self._infobody = [[], None, None]
+                    self._infobody_depth = self._depth
+        elif tag == 'a':
+            if self._infobody is not None and self._infobody[1] is None and \
+                    self._infobody[2] is None:
+                self._infobody[1] = attrs.get('href')
+                self._infobody[2] = []
+                self._in_anchor = True
+        elif tag == 'iframe':
+            self.iframe_srcs.append(attrs.get('src'))
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th'):
+            self._close_cell(self._depth)
+        elif tag == 'tr':
+            self._close_row(self._depth)
+        elif tag == 'a':
+            self._in_anchor = False
+        elif tag == 'table':
+            self._close_row(self._depth)
+            if self._tables and self._tables[-1][0] == self._depth:
+                self._tables.pop()
+            self._depth = max(self._depth - 1, 0)
+
+    def handle_data(self, data):
+        for depth, cell in self._cells:
+            cell.append(data)
+        if self._infobody is not None:
+            self._infobody[0].append(data)
+            if self._in_anchor:
+                self._infobody[2].append(data)
+
+    def handle_entityref(self, name):
+        # only called by the python 2 parser
+        self.handle_data(self.unescape('&{};'.format(name)))
+
+    def handle_charref(self, name):
+        # only called by the python 2 parser
+        self.handle_data(self.unescape('&#{};'.format(name)))
+
+    def _open_row(self):
+        row = {'th': [], 'td': []}
+        self._rows.append((self._depth, row))
+        for depth, rows in self._tables:
+            rows.append(row)
+
+    def _close_infobody(self):
+        if self._infobody is not None:
+            text, href, anchor_text = self._infobody
+            if anchor_text is not None:
+                anchor_text = ''.join(anchor_text)
+            self.infobody_cells.append((''.join(text), href, anchor_text))
+            self._infobody = None
+            self._infobody_depth = None
+            self._in_anchor = False
+
+    def _close_cell(self, depth):
+        if self._cells and self._cells[-1][0] == depth:
+            self._cells.pop()
+        if self._infobody_depth == depth:
+            self._close_infobody()
+
+    def _close_row(self, depth):
+        self._close_cell(depth)
+        if self._rows and self._rows[-1][0] == depth:
+            self._rows.pop()
+
+    def close(self):
+        HTMLParser.close(self)
+        self._tables = []
+        self._rows = []
+        self._cells = []
+        self._close_infobody()
+
+        # rows as lists of stripped strings, th cells before td cells
+        for i, rows in enumerate(self.info_tables):
+            data = []
+            for row in rows:
+                for tag in ('th', 'td'):
+                    if row[tag] != []:
+                        data.append([''.join(cell).strip()
+                                     for cell in row[tag]])
+            self.info_tables[i] = data
+
+
+def _extract(page):
+    extractor = TargetedExtractor()
+    extractor.feed(decode(page))
+    extractor.close()
+    return extractor
+
+
+def _stream_info_table_rows(page, which):
+    try:
+        return _extract(page).info_tables[which]
+    except IndexError:
+        return None
+
+
+def _stream_infobody_cells(page):
+    return _extract(page).infobody_cells
+
+
+def _stream_iframe_src(page):
+    return _extract(page).iframe_srcs[0]
+
+
+BACKENDS = {
+    'html5lib': (_html5lib_info_table_rows, _html5lib_infobody_cells,
+                 _html5lib_iframe_src),
+    'lxml': (_lxml_info_table_rows, _lxml_infobody_cells, _lxml_iframe_src),
+    'stream': (_stream_info_table_rows, _stream_infobody_cells,
+               _stream_iframe_src),
+}
+
+
+def info_table_rows(page, which=1, backend=DEFAULT_BACKEND):
+
+    """
+
+    :param page: html of the page
+    :param which: which of the tables with class "info" to read
+    :param backend: name of the parsing backend
+    :return: list of rows, where the th cells and the td cells of each tr
+        are separate rows of stripped strings, or None if there is no such
+        table
+
+    """
+
+    return BACKENDS[backend][0](page, which)
+
+
+def infobody_cells(page, backend=DEFAULT_BACKEND):
+
+    """
+
+    :param page: html of the page
+    :param backend: name of the parsing backend
+    :return: list of (text, href, anchor text) for every td with class
+        "infobody", where href and anchor text belong to the first link in
+        the cell and are None if the cell has no link
+
+    """
+
+    return BACKENDS[backend][1](page)
+
+
+def iframe_src(page, backend=DEFAULT_BACKEND):
+
+    """
+
+    :param page: html of the page
+    :param backend: name of the parsing backend
+    :return: src attribute of the first iframe on the page
+
+    """
+
+    return BACKENDS[backend][2](page)
+
+
+def compare_backends(pages, backends=None, reference='html5lib'):
+
+    """
+
+    :param pages: dictionary of page name to html
+    :param backends: list of backend names to check, defaults to all
+        backends that can run here
+    :param reference: backend whose output is taken to be correct
+    :return: list of (page name, backend, extractor) for every mismatch
+
+    """
+
+    if backends is None:
+        backends = [name for name in BACKENDS if name != reference]
+        if lxml is None:
+            backends.remove('lxml')
+
+    def run(backend, page):
+        try:
+            src = iframe_src(page, backend)
+        except IndexError:
+            src = None
+        return {'info_table_rows': [info_table_rows(page, which, backend)
+                                    for which in (0, 1)],
+                'infobody_cells': infobody_cells(page, backend),
+                'iframe_src': src}
+
+    mismatches = []
+    for name in sorted(pages):
+        expected = run(reference, pages[name])
+        for backend in backends:
+            result = run(backend, pages[name])
+            for extractor in sorted(expected):
+                if result[extractor] != expected[extractor]:
+                    mismatches.append((name, backend, extractor))
+    return mismatches
+
+
+if __name__ == '__main__':
+
+    from http_cache import ResponseCache
+
+    cache = ResponseCache(sys.argv[1], offline=True)
+    pages = {}
+    for url in cache.index:
+        pages[url] = cache.get(url)
+
+    mismatches = compare_backends(pages)
+    for url, backend, extractor in mismatches:
+        print("{} {} differs from html5lib on {}".format(backend, extractor,
+                                                         url))
+    print("Checked {} pages, found {} mismatches".format(len(pages),
+                                                         len(mismatches)))
+    sys.exit(len(mismatches) > 0)
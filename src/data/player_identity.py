@@ -0,0 +1,446 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from self_rating_index import ALIASES, split_player_name
+
+
+"""
+
+Resolve the spellings of player names to stable integer player ids.
+
+Players are keyed by their raw "Last, First" roster name, so a typo or a
+change in how a name was entered splits one player's history in two and
+lowers their experience rating.  PlayerIdentity groups the names that
+belong to the same player and gives every group an integer id.
+
+Comparing every name with every other one is quadratic, so candidate pairs
+come from blocking instead:
+
+ - names whose last names have the same Soundex code and whose first names
+   start with the same letter
+ - sorted neighbourhoods: the names are sorted by "last first" and by
+   "first last", and each name is compared with the next few in each order,
+   which catches typos in the first letter of either name
+
+Within a block that is larger than the window, only the sorted neighbours
+are compared, so the number of comparisons grows linearly with the number
+of names.  A candidate pair is a match when the Jaro-Winkler similarity of
+both the last and the first names is high enough, with first names that
+are the same in the NICKNAMES table ("Chris" and "Christopher") counting
+as equal.  Groups are merged complete-link: only if every name of one is a
+match for every name of the other, so that "Chris", "Christopher" and
+"Christina" can't be chained into one player.  Two names are never merged
+if they were on different teams in the same league, since nobody plays on
+two teams of one league.
+
+The groups are kept in an alias table with a row per name, its player id,
+the canonical name of the player (the spelling on the most teams) and
+where the row came from: 'auto' for rows found by resolve() and 'manual'
+for rows added by hand, e.g. for a change of last name that can't be
+found by spelling.  Ids of names already in the table never change when
+resolve() is run again with new names; groups that are merged keep the
+smallest of their ids.
+
+"""
+
+
+COLUMNS = ['name', 'player_id', 'canonical', 'source']
+
+# normalized nickname -> the first name it is short for
+NICKNAMES = {
+    'andy': 'andrew', 'ben': 'benjamin', 'bill': 'william',
+    'bob': 'robert', 'chris': 'christopher', 'dan': 'daniel',
+    'danny': 'daniel', 'dave': 'david', 'ed': 'edward', 'greg': 'gregory',
+    'jeff': 'jeffrey', 'jen': 'jennifer', 'jenny': 'jennifer',
+    'jim': 'james', 'jimmy': 'james', 'joe': 'joseph', 'jon': 'jonathan',
+    'kate': 'katherine', 'katie': 'katherine', 'liz': 'elizabeth',
+    'matt': 'matthew', 'mike': 'michael', 'nick': 'nicholas',
+    'rob': 'robert', 'steve': 'steven', 'tom': 'thomas', 'tony': 'anthony',
+    'will': 'william',
+}
+
+SOUNDEX_CODES = dict(
+    [(letter, '1') for letter in 'bfpv'] +
+    [(letter, '2') for letter in 'cgjkqsxz'] +
+    [(letter, '3') for letter in 'dt'] +
+    [('l', '4')] +
+    [(letter, '5') for letter in 'mn'] +
+    [('r', '6')])
+
+
+def soundex(name):
+
+    """
+
+    :param name: normalized name
+    :return: American Soundex code of the name, or '' if it has no letters
+
+    """
+
+    letters = [char for char in name if char.isalpha()]
+    if len(letters) == 0:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for char in letters[1:]:
+        digit = SOUNDEX_CODES.get(char, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w don't separate letters with the same code
+        if char not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def jaro_winkler(a, b, prefix_scale=0.1):
+
+    """
+
+    :return: Jaro-Winkler similarity of strings a and b, from 0 to 1
+
+    """
+
+    if a == b:
+        return 1.
+    len_a = len(a)
+    len_b = len(b)
+    if len_a == 0 or len_b == 0:
+        return 0.
+
+    window = max(max(len_a, len_b) // 2 - 1, 0)
+    matched_a = [False] * len_a
+    matched_b = [False] * len_b
+    matches = 0
+    for i, char in enumerate(a):
+        for j in range(max(0, i - window), min(len_b, i + window + 1)):
+            if not matched_b[j] and b[j] == char:
+                matched_a[i] = True
+                matched_b[j] = True
+                matches += 1
+                break
+    if matches == 0:
+        return 0.
+
+    transpositions = 0
+    j = 0
+    for i in range(len_a):
+        if matched_a[i]:
+            while not matched_b[j]:
+                j += 1
+            if a[i] != b[j]:
+                transpositions += 1
+            j += 1
+    matches = float(matches)
+    jaro = (matches / len_a + matches / len_b +
+            (matches - transpositions / 2.) / matches) / 3.
+
+    prefix = 0
+    for char_a, char_b in zip(a[:4], b[:4]):
+        if char_a != char_b:
+            break
+        prefix += 1
+    return jaro + prefix * prefix_scale * (1 - jaro)
+
+
+def candidate_pairs(keys, window=4):
+
+    """
+
+    :param keys: list of (last name, first name) of each name, normalized
+    :param window: number of following names each name is compared with in
+        every sorted order
+    :return: set of (i, j) positions of names to compare, with i < j
+
+    """
+
+    pairs = set()
+
+    def neighbours(order):
+        for start in range(len(order)):
+            i = order[start]
+            for j in order[start + 1:start + 1 + window]:
+                pairs.add((min(i, j), max(i, j)))
+
+    # sorted neighbourhoods over the whole list
+    positions = list(range(len(keys)))
+    neighbours(sorted(positions, key=lambda i: (keys[i][0], keys[i][1])))
+    neighbours(sorted(positions, key=lambda i: (keys[i][1], keys[i][0])))
+
+    # phonetic blocks, compared in sorted order within each block
+    blocks = {}
+    for i, (last, first) in enumerate(keys):
+        blocks.setdefault((soundex(last), first[:1]), []).append(i)
+    for block in blocks.values():
+        if len(block) > 1:
+            neighbours(sorted(block, key=lambda i: keys[i]))
+    return pairs
+
+
+def name_similarity(key_a, key_b, max_length_change=1, nicknames=NICKNAMES):
+
+    """
+
+    :param key_a: normalized (last name, first name)
+    :param key_b: normalized (last name, first name)
+    :param max_length_change: largest difference in length of the last
+        names, or of the first names, of two spellings of one name
+    :param nicknames: dictionary of nickname to the first name it is short
+        for; a nickname and its first name are treated as equal
+    :return: similarity from 0 to 1 of the two names
+
+    """
+
+    last_a, first_a = key_a
+    last_b, first_b = key_b
+    # a typo adds or drops a letter or two, while names that only share a
+    # long prefix ("Anderson" and "Andersen-Smith") score high on their own
+    if abs(len(last_a) - len(last_b)) > max_length_change:
+        return 0.
+    last = jaro_winkler(last_a, last_b)
+    if nicknames.get(first_a, first_a) == nicknames.get(first_b, first_b):
+        first = 1.
+    elif abs(len(first_a) - len(first_b)) > max_length_change:
+        return 0.
+    else:
+        first = jaro_winkler(first_a, first_b)
+    return min(last, first)
+
+
+class PlayerIdentity(object):
+
+    """
+
+    :param table: alias table with the COLUMNS, e.g. from load
+
+    """
+
+    def __init__(self, table=None):
+        if table is None:
+            table = pd.DataFrame(columns=COLUMNS)
+        self.table = table[COLUMNS].reset_index(drop=True)
+        self._build_lookup()
+
+    @classmethod
+    def load(cls, path):
+
+        """
+
+        :param path: csv file written by save; a missing file gives an empty
+            table
+        :return: PlayerIdentity
+
+        """
+
+        if not os.path.exists(path):
+            return cls()
+        table = pd.read_csv(path, dtype={'name': str, 'canonical': str,
+                                         'source': str})
+        return cls(table)
+
+    def save(self, path):
+        self.table.sort_values(['player_id', 'name']).to_csv(path,
+                                                             index=False)
+
+    def _build_lookup(self):
+        self.ids = dict(zip(self.table['name'],
+                            self.table['player_id'].astype('int64')))
+        self.canonical_names = dict(zip(self.table['name'],
+                                        self.table['canonical']))
+
+    def player_id(self, name):
+
+        """
+
+        :return: id of the player with this name, or None if the name has
+            not been resolved
+
+        """
+
+        return self.ids.get(name)
+
+    def player_ids(self, names):
+
+        """
+
+        :param names: array of player names
+        :return: array of their player ids, -1 for names not resolved
+
+        """
+
+        return np.array([self.ids.get(name, -1) for name in names],
+                        dtype='int64')
+
+    def canonical(self, name):
+
+        """
+
+        :return: canonical spelling of the player's name, or the name itself
+            if it has not been resolved
+
+        """
+
+        return self.canonical_names.get(name, name)
+
+    def resolve(self, player_teams, team_league, extra_names=(),
+                threshold=0.94, window=4, aliases=ALIASES,
+                nicknames=NICKNAMES):
+
+        """
+
+        Add the names in player_teams and extra_names to the alias table,
+        merging them into existing players where they match.
+
+        :param player_teams: dictionary of player name to list of team ids
+        :param team_league: dictionary of team id to league id
+        :param extra_names: names without teams, such as the names in the
+            self ratings, that should get ids as well
+        :param threshold: smallest name_similarity of a match
+        :param window: sorted neighbourhood window of candidate_pairs
+        :param aliases: dictionary of first name aliases used when
+            normalizing the names
+        :param nicknames: dictionary of nicknames for name_similarity
+        :return: number of names that were merged into another name's player
+
+        """
+
+        names = set(name for name in player_teams if name != '')
+        names.update(name for name in extra_names if name != '')
+        names.update(self.table['name'])
+        names = sorted(names)
+        position = dict((name, i) for i, name in enumerate(names))
+        keys = [split_player_name(name, aliases) for name in names]
+
+        parent = list(range(len(names)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        leagues = [set(team_league.get(team) for team in
+                       player_teams.get(name, ())) - set([None])
+                   for name in names]
+        nteams = [len(player_teams.get(name, ())) for name in names]
+        members = [[i] for i in range(len(names))]
+
+        # names put together by hand don't have to look alike, and names
+        # already in one group stay together
+        manual = set(position[name] for name, source in
+                     zip(self.table['name'], self.table['source'])
+                     if source == 'manual')
+        seed = {}
+        for name, player in zip(self.table['name'], self.table['player_id']):
+            seed[position[name]] = player
+
+        def compatible(i, j):
+            if i in manual or j in manual or keys[i] == keys[j]:
+                return True
+            if i in seed and seed.get(i) == seed.get(j):
+                return True
+            return name_similarity(keys[i], keys[j],
+                                   nicknames=nicknames) >= threshold
+
+        def join(root_i, root_j):
+            root = min(root_i, root_j)
+            other = max(root_i, root_j)
+            parent[other] = root
+            leagues[root] = leagues[root_i] | leagues[root_j]
+            members[root] = members[root_i] + members[root_j]
+            members[other] = []
+
+        def union(i, j):
+            root_i = find(i)
+            root_j = find(j)
+            if root_i == root_j:
+                return False
+            if leagues[root_i] & leagues[root_j]:
+                return False
+            # complete link: every pair across the two groups must match
+            for a in members[root_i]:
+                for b in members[root_j]:
+                    if not compatible(a, b):
+                        return False
+            join(root_i, root_j)
+            return True
+
+        # players start out as the groups already in the table
+        first_row = {}
+        for name, player in zip(self.table['name'], self.table['player_id']):
+            if player in first_row:
+                root_i = find(position[name])
+                root_j = find(first_row[player])
+                if root_i != root_j:
+                    join(root_i, root_j)
+            else:
+                first_row[player] = position[name]
+
+        # exact matches after normalization, then the best fuzzy matches
+        scored = []
+        for i, j in candidate_pairs(keys, window):
+            if keys[i] == keys[j]:
+                scored.append((2., i, j))
+                continue
+            similarity = name_similarity(keys[i], keys[j],
+                                         nicknames=nicknames)
+            if similarity >= threshold:
+                scored.append((similarity, i, j))
+        scored.sort(key=lambda item: (-item[0], item[1], item[2]))
+        nmerged = sum(1 for similarity, i, j in scored if union(i, j))
+
+        self._assign_ids(names, find, nteams)
+        return nmerged
+
+    def _assign_ids(self, names, find, nteams):
+
+        """
+
+        Rebuild the alias table from the groups, keeping existing ids.
+
+        """
+
+        old_ids = self.ids
+        old_source = dict(zip(self.table['name'], self.table['source']))
+        groups = {}
+        for i, name in enumerate(names):
+            groups.setdefault(find(i), []).append(i)
+
+        next_id = max(old_ids.values()) + 1 if len(old_ids) > 0 else 1
+        rows = []
+        for members in sorted(groups.values(),
+                              key=lambda members: names[members[0]]):
+            ids = [old_ids[names[i]] for i in members if names[i] in old_ids]
+            if len(ids) > 0:
+                player = min(ids)
+            else:
+                player = next_id
+                next_id += 1
+            canonical = names[max(members, key=lambda i: (nteams[i],
+                                                          -i))]
+            for i in members:
+                rows.append((names[i], player, canonical,
+                             old_source.get(names[i], 'auto')))
+
+        self.table = pd.DataFrame.from_records(rows, columns=COLUMNS)
+        self._build_lookup()
+
+    def add_alias(self, name, same_as):
+
+        """
+
+        Record by hand that name is the same player as same_as.
+
+        """
+
+        player = self.ids.get(same_as)
+        if player is None:
+            raise KeyError(same_as)
+        row = pd.DataFrame([(name, player, self.canonical(same_as),
+                             'manual')], columns=COLUMNS)
+        self.table = pd.concat([self.table[self.table['name'] != name], row],
+                               ignore_index=True)
+        self._build_lookup()
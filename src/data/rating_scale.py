@@ -0,0 +1,92 @@
+import csv
+
+import numpy as np
+
+
+"""
+
+Conversion between the self rating scale (0 to 100, as entered by players
+when they sign up for a hat league) and the experience rating scale (the
+base division ratings of club teams, roughly 500 to 2000).
+
+Both directions are piecewise linear through a table of calibration points.
+The tables are turned into arrays once and converted with np.interp, so a
+whole season's roster can be converted in one call.
+
+"""
+
+
+class Calibration(object):
+
+    """
+
+    :param breakpoints: increasing values on the scale being converted from
+    :param values: matching values on the scale being converted to
+    :param check_bounds: if True, raise ValueError for ratings outside of the
+        breakpoints instead of clamping them to the end values
+
+    """
+
+    def __init__(self, breakpoints, values, check_bounds=True):
+        self.breakpoints = np.asarray(breakpoints, dtype='float')
+        self.values = np.asarray(values, dtype='float')
+        self.check_bounds = check_bounds
+        if self.breakpoints.shape != self.values.shape:
+            raise ValueError("breakpoints and values must have the same "
+                             "length")
+        if np.any(np.diff(self.breakpoints) < 0):
+            raise ValueError("breakpoints must be increasing")
+
+    def __call__(self, ratings):
+        ratings = np.asarray(ratings, dtype='float')
+        if self.check_bounds:
+            if np.any(ratings < self.breakpoints[0]):
+                raise ValueError("A value in ratings is below the "
+                                 "calibration range.")
+            if np.any(ratings > self.breakpoints[-1]):
+                raise ValueError("A value in ratings is above the "
+                                 "calibration range.")
+        return np.interp(ratings, self.breakpoints, self.values)
+
+    @classmethod
+    def from_csv(cls, path, check_bounds=True):
+
+        """
+
+        :param path: csv file with breakpoint and value columns
+        :return: Calibration
+
+        """
+
+        breakpoints = []
+        values = []
+        with open(path, 'r') as f:
+            for row in csv.DictReader(f):
+                breakpoints.append(float(row['breakpoint']))
+                values.append(float(row['value']))
+        return cls(breakpoints, values, check_bounds)
+
+
+class RatingScale(object):
+
+    """
+
+    :param self_to_experience: Calibration from self to experience ratings
+    :param experience_to_self: Calibration from experience to self ratings
+
+    """
+
+    def __init__(self, self_to_experience, experience_to_self):
+        self.to_experience = self_to_experience
+        self.to_self = experience_to_self
+
+
+SELF_TO_EXPERIENCE = Calibration(
+    [-1] + list(range(0, 110, 10)),
+    100 * np.array([5, 5, 6, 8, 9, 10, 12, 14, 16, 18, 20, 20]))
+
+EXPERIENCE_TO_SELF = Calibration(
+    100 * np.array([-5, 5, 5, 6, 8, 9, 10, 12, 14, 16, 18, 20, 20, 21, 29]),
+    [0, 0] + list(range(0, 110, 10)) + [100, 100])
+
+DEFAULT_SCALE = RatingScale(SELF_TO_EXPERIENCE, EXPERIENCE_TO_SELF)
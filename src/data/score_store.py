@@ -0,0 +1,459 @@
+import glob
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+
+"""
+
+One partitioned dataset of the game scores of every league.
+
+scrape_buda writes a scores_{leagueid}.csv file per league, so a question
+about many leagues opens and parses a file per league and compares team
+names as strings.  A ScoreStore keeps all of the games in one directory,
+partitioned by the year and season of the league:
+
+    game_scores_store/
+        manifest.json
+        dictionaries/team.npy, divname.npy, type.npy
+        2014/Spring/league.npy, team_a.npy, team_b.npy, divname.npy, ...
+
+Every partition has a .npy file per column.  Team names, division names and
+league types are dictionary encoded: the column holds int32 codes into a
+dictionary shared by all partitions, which only ever grows, so codes never
+change.  Each game also has the team ids of both teams (-1 if the name
+couldn't be matched to a team of the league), taken from allteams when the
+league is added.
+
+The manifest lists the partitions with their leagues, league types and
+division codes, so read() skips partitions that can't match a filter
+without opening them, then filters the rows of the rest on the codes and
+loads only the requested columns:
+
+    store = ScoreStore('data/interim/game_scores_store')
+    games = store.read(['league', 'teamid A', 'teamid B', 'Score A',
+                        'Score B'], since=2010, seasons=['Spring'],
+                       league_type='Hat', divnames=['JP Mixed (4/3)'])
+
+import_scores fills a store from the existing scores_{leagueid}.csv files,
+and league_scores returns one league in the format of those files, so code
+written for them can switch over one league at a time.
+
+"""
+
+
+STORE_VERSION = 1
+
+# column name -> (file name, dictionary name or None, dtype)
+COLUMNS = [('league', 'league', None, 'int64'),
+           ('type', 'type', 'type', 'int32'),
+           ('Team A', 'team_a', 'team', 'int32'),
+           ('Team B', 'team_b', 'team', 'int32'),
+           ('divname', 'divname', 'divname', 'int32'),
+           ('Score A', 'score_a', None, 'int16'),
+           ('Score B', 'score_b', None, 'int16'),
+           ('teamid A', 'teamid_a', None, 'int64'),
+           ('teamid B', 'teamid_b', None, 'int64')]
+COLUMN_NAMES = [name for name, _, _, _ in COLUMNS]
+COLUMN_INFO = dict((name, (file_name, dictionary, dtype))
+                   for name, file_name, dictionary, dtype in COLUMNS)
+DICTIONARIES = ['team', 'divname', 'type']
+
+# columns of the scores_{leagueid}.csv files
+CSV_COLUMNS = ['Team A', 'Team B', 'divname', 'Score A', 'Score B']
+
+SCORES_FILE_RE = re.compile(r'scores_(\d+)\.csv$')
+
+
+class ScoreStoreError(ValueError):
+    pass
+
+
+def team_name_ids(buda, leagueid):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param leagueid: id of the league
+    :return: dictionary of the names of the league's teams, as they appear
+        in its schedule, to their team ids
+
+    """
+
+    if leagueid not in buda.league_teams:
+        return {}
+    team_ids = np.array(buda.league_teams[leagueid], dtype='int64')
+    teams = buda.allteams[buda.allteams['teamid'].astype('int64').isin(
+        team_ids)]
+    return dict(zip(teams['teamname'].str.strip(' '),
+                    teams['teamid'].values.astype('int64')))
+
+
+class ScoreStore(object):
+
+    """
+
+    :param path: directory of the store; created on the first write
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        manifest_path = os.path.join(path, 'manifest.json')
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                self.manifest = json.load(f)
+            if self.manifest.get('version') != STORE_VERSION:
+                raise ScoreStoreError(
+                    "{} has version {}, expected {}".format(
+                        path, self.manifest.get('version'), STORE_VERSION))
+            self.dictionaries = dict(
+                (name, list(np.load(self.dictionary_file(name))))
+                for name in DICTIONARIES)
+        else:
+            self.manifest = {'version': STORE_VERSION, 'partitions': {}}
+            self.dictionaries = dict((name, []) for name in DICTIONARIES)
+        self.codes = dict(
+            (name, dict((value, code) for code, value in enumerate(values)))
+            for name, values in self.dictionaries.items())
+
+    def dictionary_file(self, name):
+        return os.path.join(self.path, 'dictionaries', name + '.npy')
+
+    def partition_dir(self, key):
+        year, season = key.split('/')
+        return os.path.join(self.path, year, season)
+
+    def leagues(self):
+
+        """
+
+        :return: ids of the leagues in the store, as strings
+
+        """
+
+        leagueids = []
+        for partition in self.manifest['partitions'].values():
+            leagueids.extend(str(leagueid)
+                             for leagueid in partition['leagues'])
+        return sorted(leagueids, key=int)
+
+    def encode(self, name, values):
+
+        """
+
+        :param name: name of the dictionary
+        :param values: array of values
+        :return: int32 codes of the values, adding new values to the
+            dictionary
+
+        """
+
+        codes = self.codes[name]
+        dictionary = self.dictionaries[name]
+        uniques, inverse = np.unique(np.asarray(values, dtype='U'),
+                                     return_inverse=True)
+        unique_codes = np.empty(len(uniques), dtype='int32')
+        for i, value in enumerate(uniques):
+            value = u'{}'.format(value)
+            if value not in codes:
+                codes[value] = len(dictionary)
+                dictionary.append(value)
+            unique_codes[i] = codes[value]
+        return unique_codes[inverse]
+
+    def league_columns(self, leagueid, scores, league_type, team_ids):
+
+        """
+
+        :return: dictionary of column name to array for the games of one
+            league, from its schedule in the format of the csv files
+
+        """
+
+        team_a = scores['Team A'].astype('str').str.strip(' ').values
+        team_b = scores['Team B'].astype('str').str.strip(' ').values
+        nrows = len(scores)
+
+        def ids(names):
+            return np.array([team_ids.get(name, -1) for name in names],
+                            dtype='int64')
+
+        return {'league': np.full(nrows, int(leagueid), dtype='int64'),
+                'type': self.encode('type', [league_type] * nrows),
+                'Team A': self.encode('team', team_a),
+                'Team B': self.encode('team', team_b),
+                'divname': self.encode('divname',
+                                       scores['divname'].astype('str')),
+                'Score A': scores['Score A'].values.astype('int16'),
+                'Score B': scores['Score B'].values.astype('int16'),
+                'teamid A': ids(team_a),
+                'teamid B': ids(team_b)}
+
+    def add_leagues(self, leagues):
+
+        """
+
+        Add or replace the games of several leagues, rewriting each affected
+        partition once.
+
+        :param leagues: iterable of (league id, schedule in the format of
+            the csv files, year, season, league type, dictionary of team
+            name to team id)
+
+        """
+
+        new_columns = {}
+        for leagueid, scores, year, season, league_type, team_ids in leagues:
+            key = '{}/{}'.format(int(year), season)
+            columns = self.league_columns(leagueid, scores, league_type,
+                                          team_ids)
+            new_columns.setdefault(key, []).append((int(leagueid), columns))
+
+        # the dictionaries only grow, so writing them first keeps the
+        # current manifest valid if a partition fails to write
+        dictionary_dir = os.path.join(self.path, 'dictionaries')
+        if not os.path.exists(dictionary_dir):
+            os.makedirs(dictionary_dir)
+        for name in DICTIONARIES:
+            np.save(self.dictionary_file(name),
+                    np.array(self.dictionaries[name], dtype='U'))
+
+        for key in sorted(new_columns):
+            added = new_columns[key]
+            replaced = set(leagueid for leagueid, _ in added)
+            parts = []
+            if key in self.manifest['partitions']:
+                old = self.load_partition(key, COLUMN_NAMES)
+                keep = ~np.isin(old['league'], list(replaced))
+                parts.append(dict((name, values[keep])
+                                  for name, values in old.items()))
+            parts.extend(columns for _, columns in added)
+            columns = dict((name, np.concatenate([part[name]
+                                                  for part in parts]))
+                           for name in COLUMN_NAMES)
+            self.write_partition(key, columns)
+
+        self.write_manifest()
+
+    def add_league(self, leagueid, scores, year, season, league_type,
+                   team_ids):
+
+        """
+
+        :param leagueid: id of the league
+        :param scores: schedule of the league in the format of the csv files
+        :param year: year of the league
+        :param season: season of the league, e.g. 'Spring'
+        :param league_type: 'Hat' or 'Club'
+        :param team_ids: dictionary of team name to team id
+
+        """
+
+        self.add_leagues([(leagueid, scores, year, season, league_type,
+                           team_ids)])
+
+    def write_partition(self, key, columns):
+        partition_dir = self.partition_dir(key)
+        tmp_dir = partition_dir + '.tmp'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+        for name in COLUMN_NAMES:
+            file_name, _, dtype = COLUMN_INFO[name]
+            np.save(os.path.join(tmp_dir, file_name + '.npy'),
+                    columns[name].astype(dtype))
+        if os.path.exists(partition_dir):
+            shutil.rmtree(partition_dir)
+        os.rename(tmp_dir, partition_dir)
+
+        year, season = key.split('/')
+        self.manifest['partitions'][key] = {
+            'year': int(year),
+            'season': season,
+            'nrows': len(columns['league']),
+            'leagues': sorted(set(columns['league'].tolist())),
+            'types': sorted(set(columns['type'].tolist())),
+            'divnames': sorted(set(columns['divname'].tolist()))}
+
+    def write_manifest(self):
+        path = os.path.join(self.path, 'manifest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + '.tmp', path)
+
+    def load_partition(self, key, columns, mmap=False):
+        partition_dir = self.partition_dir(key)
+        mmap_mode = 'r' if mmap else None
+        return dict((name, np.load(os.path.join(
+            partition_dir, COLUMN_INFO[name][0] + '.npy'),
+            mmap_mode=mmap_mode)) for name in columns)
+
+    def lookup_codes(self, name, values):
+
+        """
+
+        :return: codes of the values that are in dictionary name
+
+        """
+
+        codes = self.codes[name]
+        return [codes[value] for value in values if value in codes]
+
+    def read(self, columns=None, since=None, until=None, seasons=None,
+             league_type=None, divnames=None, leagueids=None, decode=True):
+
+        """
+
+        :param columns: columns to read, defaults to all of them; year and
+            season can be asked for as well
+        :param since: first year to read
+        :param until: last year to read
+        :param seasons: list of seasons to read
+        :param league_type: 'Hat' or 'Club'
+        :param divnames: list of division names to read
+        :param leagueids: list of league ids to read
+        :param decode: if True, return the dictionary columns as
+            categoricals of their values, otherwise as their codes
+        :return: dataframe of the games that match every filter, ordered by
+            partition and then as they were added
+
+        """
+
+        if columns is None:
+            columns = ['year', 'season'] + COLUMN_NAMES
+        for name in columns:
+            if name not in COLUMN_INFO and name not in ('year', 'season'):
+                raise KeyError(name)
+
+        # filters on the codes, so the strings are never compared
+        filters = {}
+        if league_type is not None:
+            filters['type'] = self.lookup_codes('type', [league_type])
+        if divnames is not None:
+            filters['divname'] = self.lookup_codes('divname', divnames)
+        if leagueids is not None:
+            filters['league'] = [int(leagueid) for leagueid in leagueids]
+
+        stored = [name for name in columns if name in COLUMN_INFO]
+        needed = sorted(set(stored) | set(filters))
+
+        parts = []
+        for key in sorted(self.manifest['partitions']):
+            partition = self.manifest['partitions'][key]
+            if since is not None and partition['year'] < since:
+                continue
+            if until is not None and partition['year'] > until:
+                continue
+            if seasons is not None and partition['season'] not in seasons:
+                continue
+            listed = {'type': partition['types'],
+                      'divname': partition['divnames'],
+                      'league': partition['leagues']}
+            if any(len(set(listed[name]) & set(codes)) == 0
+                   for name, codes in filters.items()):
+                continue
+
+            data = self.load_partition(key, needed)
+            rows = np.ones(partition['nrows'], dtype='bool')
+            for name, codes in filters.items():
+                rows &= np.isin(data[name], codes)
+            part = dict((name, np.asarray(data[name][rows]))
+                        for name in stored)
+            nrows = int(rows.sum())
+            part['year'] = np.full(nrows, partition['year'], dtype='int64')
+            part['season'] = np.array([partition['season']] * nrows,
+                                      dtype='object')
+            parts.append(part)
+
+        result = {}
+        for name in columns:
+            if len(parts) > 0:
+                values = np.concatenate([part[name] for part in parts])
+            elif name in COLUMN_INFO:
+                values = np.array([], dtype=COLUMN_INFO[name][2])
+            else:
+                values = np.array([], dtype='object')
+            dictionary = COLUMN_INFO.get(name, (None, None))[1]
+            if decode and dictionary is not None:
+                values = pd.Categorical.from_codes(
+                    values, self.dictionaries[dictionary])
+            result[name] = values
+        return pd.DataFrame(result, columns=columns)
+
+    def league_scores(self, leagueid):
+
+        """
+
+        :param leagueid: id of the league
+        :return: the league's games in the format of scores_{leagueid}.csv
+
+        """
+
+        games = self.read(CSV_COLUMNS, leagueids=[leagueid])
+        for name in ['Team A', 'Team B', 'divname']:
+            games[name] = games[name].astype('str')
+        return games
+
+
+def import_scores(store, scores_dir, buda, batch_size=50):
+
+    """
+
+    Add the scores_{leagueid}.csv files of a directory to a store.
+
+    :param store: ScoreStore to add to
+    :param scores_dir: directory of the csv files written by scrape_buda
+    :param buda: BudaRating with league_meta and the data loaded, for the
+        year, season and type of each league and the ids of its teams
+    :param batch_size: number of leagues to read before writing them, so
+        that a partition is rewritten once per batch rather than per league
+    :return: ids of the leagues imported; files of leagues that aren't in
+        league_meta are skipped
+
+    """
+
+    meta = buda.league_meta
+    paths = {}
+    for path in glob.glob(os.path.join(scores_dir, 'scores_*.csv')):
+        match = SCORES_FILE_RE.search(path)
+        if match is not None and match.group(1) in meta.index:
+            paths[match.group(1)] = path
+    leagueids = sorted(paths, key=int)
+
+    for start in range(0, len(leagueids), batch_size):
+        batch = []
+        for leagueid in leagueids[start:start + batch_size]:
+            scores = pd.read_csv(paths[leagueid])
+            batch.append((leagueid, scores, meta.loc[leagueid, 'year'],
+                          meta.loc[leagueid, 'season'],
+                          meta.loc[leagueid, 'type'],
+                          team_name_ids(buda, leagueid)))
+        store.add_leagues(batch)
+    return leagueids
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    from scrape_buda import BudaRating
+
+    parser = argparse.ArgumentParser(
+        description='Import scores_{leagueid}.csv files into a ScoreStore.')
+    parser.add_argument('prefix', help='prefix of the database to take the '
+                                       'team ids from, as for load_buda')
+    parser.add_argument('scores_dir')
+    parser.add_argument('store')
+    args = parser.parse_args()
+
+    buda = BudaRating()
+    buda.load_buda(args.prefix)
+    imported = import_scores(ScoreStore(args.store), args.scores_dir, buda)
+    print("Imported {} leagues into {}".format(len(imported), args.store))
@@ -1,13 +1,22 @@
-from bs4 import BeautifulSoup
-import urllib2
-import urllib
 import pandas as pd
 import numpy as np
 import os
-import pickle
-import urlparse
+from requests.compat import urlencode, urlunparse
 from tqdm import tqdm
-from scipy.interpolate import interp1d
+from fetch import Fetcher
+from http_cache import ResponseCache
+import parse_buda
+from team_index import TeamIndex
+from history_store import HistoryStore
+import snapshot
+import sqlite_store
+import batch_predict
+import instrument
+import parallel
+import player_identity
+import rating_scale
+import self_rating_index
+from incremental import RunningClubHistory
 
 
 """
@@ -40,23 +49,83 @@ experience rating
 """
 
 
+# point this at a local stand-in server to test the scraper without
+# touching the real site
+BUDA_NETLOC = os.environ.get('BUDA_NETLOC', 'old.buda.org')
+
+
 class BudaRating(object):
 
-    def __init__(self):
+    def __init__(self, fetcher=None, offline=False,
+                 parser=parse_buda.DEFAULT_BACKEND,
+                 aliases=self_rating_index.ALIASES,
+                 scale=rating_scale.DEFAULT_SCALE, metrics=None,
+                 score_store=None):
         self.base_dir = '/Users/sbussmann/Development/buda/buda-ratings'
-        self.league_meta = scrape_leagues()
+        if metrics is None:
+            metrics = instrument.Metrics()
+        self.metrics = metrics
+        if fetcher is None:
+            # cache every page we fetch so that reruns don't need the network
+            cache_dir = os.path.join(self.base_dir, 'data', 'raw', 'http_cache')
+            cache = ResponseCache(cache_dir, offline=offline)
+            fetcher = Fetcher(cache=cache, metrics=metrics)
+        elif fetcher.metrics is None:
+            fetcher.metrics = metrics
+        self.fetcher = fetcher
+        self.parser = parser
+        self.aliases = aliases
+        self.scale = scale
+        # optional ScoreStore that scraped schedules are also added to
+        self.score_store = score_store
+        self.league_meta = scrape_leagues(self.fetcher, self.parser)
         self.div_ratings = define_ratings()
 
-    def scrape_buda(self, prefix=None):
+    def scrape_buda(self, prefix=None, leagueids=None, resume=False):
+
+        """
+
+        :param prefix: location of existing scraped data, so that only new
+            data needs to be scraped
+        :param leagueids: list of league ids to consider, defaults to every
+            league in league_meta
+        :param resume: if True, add the new leagues to the data already in
+            memory instead of loading it from prefix
+
+        """
+
+        # teams scraped before this call when resuming; their rows of
+        # allteams are kept as they are, predicted ratings included
+        previous = None
+
+        if resume:
+            previous = self.allteams
+            league_teams = dict(self.league_teams.items())
+            player_teams = dict((player, list(teams)) for player, teams in
+                                self.player_teams.items())
+            team_players = dict(self.team_players.items())
+            team_rating = dict(self.team_rating.items())
+            allteamids = []
+            allteamnames = []
+            allseasons = []
+            alltypes = []
+            allyears = []
+            alldivnames = []
+            alldivratings = []
+            allplusminus = []
 
         # set prefix to the location of existing scraped data so that only
         # new data needs to be scraped
-        if prefix is not None:
+        elif prefix is not None:
             self.load_buda(prefix)
-            league_teams = self.league_teams
-            player_teams = self.player_teams
-            team_players = self.team_players
-            team_rating = self.team_rating
+
+            # copy the loaded history into plain dictionaries, since new
+            # leagues are added to them below
+            league_teams = dict(self.league_teams.items())
+            player_teams = dict((player, list(teams)) for player, teams in
+                                self.player_teams.items())
+            team_players = dict(self.team_players.items())
+            team_rating = dict(self.team_rating.items())
             #
             # # remove summer club 2016 data
             # import pdb; pdb.set_trace()
@@ -113,10 +182,13 @@ class BudaRating(object):
             alldivratings = []
             allplusminus = []
 
+        if leagueids is None:
+            leagueids = list(self.league_meta.index)
+
         # test for how many leagues we'll need to scrape
         alreadyscraped = 0
-        totalleagues = len(self.league_meta.index)
-        for leagueid in self.league_meta.index:
+        totalleagues = len(leagueids)
+        for leagueid in leagueids:
             if leagueid in league_teams:
                 alreadyscraped += 1
 
@@ -124,28 +196,32 @@ class BudaRating(object):
         print("Planning to scrape {} leagues out of a total of {} leagues in "
               "the BUDA database.".format(tobescraped, totalleagues))
 
-        # loop over all the leagues in league_meta
-        for leagueid in self.league_meta.index:
+        # work out which leagues need to be scraped before fetching anything,
+        # so that their pages can be requested concurrently
+        candidates = leagueids
+        leagueids = []
+        for leagueid in candidates:
 
             # skip this league if it's already been scraped
             if (leagueid in league_teams) & (leagueid != '40264'):
                 print("Found that league {} has already been scraped, "
                       "skipping".format(leagueid))
+                self.metrics.skip_league(leagueid, 'already_scraped')
                 continue
 
-            league_season = self.league_meta.ix[leagueid, 'season']
-            league_type = self.league_meta.ix[leagueid, 'type']
-            league_year = self.league_meta.ix[leagueid, 'year']
-            league_name = self.league_meta.ix[leagueid, 'name']
+            league_season = self.league_meta.loc[leagueid, 'season']
+            league_type = self.league_meta.loc[leagueid, 'type']
+            league_name = self.league_meta.loc[leagueid, 'name']
             if league_season == 'Winter':
                 league_type = 'Hat'
-            league_meta = " ".join([league_season, league_type])
 
             # only analyze leagues where league_type is Hat or Club
             if league_type != 'Hat':
                 if league_type != 'Club':
                     print("{} is not Hat or Club, skipping {}".format(
                         league_name, leagueid))
+                    self.metrics.skip_league(leagueid, 'league_type',
+                                             league_type=league_type)
                     continue
 
             dfname = 'scores_{}.csv'.format(leagueid)
@@ -153,60 +229,41 @@ class BudaRating(object):
                 self.base_dir, 'data', 'raw', 'game_scores', dfname)
             if os.path.exists(dfpath):
                 print("Already scraped {}".format(league_name))
+                self.metrics.skip_league(leagueid, 'scores_exist')
                 continue
 
-            print("Scraping {}".format(league_name))
+            leagueids.append(leagueid)
 
-            # scrape the scores for this league
-            scheme = 'http'
-            netloc = 'old.buda.org'
-            path = '/hatleagues/scores.php'
-            params = ''
-            querydict = {'section': 'showLeagueSchedule',
-                         'league': '{}'.format(leagueid),
-                         'byDivision': '1',
-                         'showGames': '1'}
-            query = urllib.urlencode(querydict)
-            fragment = ''
-            parts = (scheme, netloc, path, params, query, fragment)
-            leaguescoreurl = urlparse.urlunparse(parts)
-            response = urllib2.urlopen(leaguescoreurl)
-            leaguescore_soup = BeautifulSoup(response, "html5lib")
+        # loop over the leagues in league_meta order, fetching the pages for a
+        # batch of leagues at a time
+        for leagueid, leaguescore_page, teams_page in self._fetch_leagues(
+                leagueids):
+
+            league_season = self.league_meta.loc[leagueid, 'season']
+            league_type = self.league_meta.loc[leagueid, 'type']
+            league_year = self.league_meta.loc[leagueid, 'year']
+            league_name = self.league_meta.loc[leagueid, 'name']
+            if league_season == 'Winter':
+                league_type = 'Hat'
+            league_meta = " ".join([league_season, league_type])
+
+            print("Scraping {}".format(league_name))
 
             # assemble the dataframe of team ratings for this league
-            data = []
-            try:
-                table = leaguescore_soup.find_all('table',
-                                                  attrs={'class':'info'})[1]
-            except IndexError:
+            with self.metrics.stage('parse'):
+                data = parse_buda.info_table_rows(leaguescore_page, which=1,
+                                                  backend=self.parser)
+            if data is None:
                 print("Unable to find a database of scores for league "
                       "{}".format(leagueid))
+                self.metrics.skip_league(leagueid, 'no_scores')
                 continue
-            rows = table.find_all('tr')
-            for row in rows:
-                cols = row.find_all('th')
-                th_cols = [ele.text.strip() for ele in cols]
-                if th_cols != []:
-                    data.append(th_cols)
-                cols = row.find_all('td')
-                td_cols = [ele.text.strip() for ele in cols]
-                if td_cols != []:
-                    data.append(td_cols)
-                 # Get rid of empty values
-                # data.append([ele for ele in cols if ele])
-
-            # convert to dataframe and drop irrelevant columns
-            dfdata = pd.DataFrame(data)
-            dfdata.columns = dfdata.ix[0, :]
-            dfdata = dfdata.drop(0).reset_index()
-
-            # fill na's with -99 to facilitate division dividers
-            dfdata = dfdata.fillna(-99)
-
-            # get the list of divisions in this league
-            divnames = dfdata.ix[dfdata['Record'] == -99, 'Team'].values
+
+            # get the schedule table and the list of divisions in this league
+            dfdata, divnames = schedule_table(data)
             if len(divnames) == 0:
                 print("No divisions found, skipping league {}".format(leagueid))
+                self.metrics.skip_league(leagueid, 'no_divisions')
                 continue
 
             # associate the division names with this league id
@@ -220,179 +277,134 @@ class BudaRating(object):
                 for divname in divnames:
                     div_ratings[divname] = 0
 
-            # define base ratings by division (arbitrarily assigned based on my
-            # experience)
-            dfdata['div'] = np.zeros(len(dfdata))
-            dfdata['divname'] = np.zeros(len(dfdata))
-            for i in range(len(divnames)-1):
-                try:
-                    divstart = np.where(dfdata['Team'] == divnames[i])[0][0]
-                except IndexError:
-                    print("{} not found, skipping league {}".format(
-                        divnames[i], leagueid))
-                    continue
-                try:
-                    divend = np.where(dfdata['Team'] == divnames[i + 1])[0][0]
-                except IndexError:
-                    print("{} not found, skipping league {}".format(
-                        divnames[i + 1], leagueid))
-                    continue
-                try:
-                    dfdata.ix[divstart + 1: divend, 'div'] = div_ratings[
-                        divnames[i]]
-                    dfdata.ix[divstart + 1: divend, 'divname'] = divnames[i]
-                except KeyError:
-                    print("No base rating for {}, skipping league {}".format(
-                        divnames[i], leagueid))
-                    continue
+            # divisions without a base rating are left unrated, except for
+            # the last one, which has always meant skipping the league
+            for divname in divnames[:-1]:
+                if divname not in div_ratings:
+                    print("No base rating for {} in league {}".format(
+                        divname, leagueid))
+                    self.metrics.event('unrated_division', league=leagueid,
+                                       division=divname)
             try:
-                dfdata.ix[divend + 1:, 'div'] = div_ratings[divnames[-1]]
-                dfdata.ix[divend + 1:, 'divname'] = divnames[-1]
+                with self.metrics.stage('normalize'):
+                    dfdata = normalize_schedule(dfdata, divnames, div_ratings,
+                                                league_type)
             except KeyError:
                 print("No base rating for {}, skipping league {}".format(
                     divnames[-1], leagueid))
+                self.metrics.skip_league(leagueid, 'unrated_division',
+                                         division=divnames[-1])
                 continue
 
-                # remove the division dividers from the dataframe
-            for i in range(len(divnames)):
-                dfdata = dfdata.drop(
-                    dfdata.index[dfdata['Team'] == divnames[i]])
-
-            teamindex = dfdata['Team'] != ''
-            teamindices = dfdata.index[teamindex]
-            for s_index, e_index in zip(teamindices[:-1], teamindices[1:]):
-                start_index = s_index + 1
-                end_index = e_index - 1
-                team_name = dfdata.loc[s_index, 'Team']
-                dfdata.loc[start_index:end_index, 'Team'] = team_name
-
-            s_index = e_index
-            start_index = s_index + 1
-            end_index = dfdata.index[-1]
-            team_name = dfdata.loc[s_index, 'Team']
-            dfdata.loc[start_index:end_index, 'Team'] = team_name
-
-            dfdata = dfdata.drop(teamindices)
-
-            dfdata = dfdata.rename(columns={
-                'Team': 'Team A',
-                'Record': 'Team B'
-            })
-
-            def reformat(team_string):
-                if team_string != '':
-                    if team_string[-1] != ')':
-                        team_string += ' ({})'.format(team_string[5:7])
-                return team_string
-
-            # make sure the Team identifier includes (team number) if this is
-            #  a hat league team
-            if league_type == 'Hat':
-                for indx in dfdata.index:
-                    dfdata['Team A'] = dfdata['Team A'].apply(reformat)
-                    # tindx = dfdata.loc[indx, 'Team A']
-                    # if tindx[-1] != ')':
-                    #     dfdata.loc[indx, 'Team A'] += ' ({})'.format(tindx[5:7])
-                    # tindx = dfdata.ix[indx, 'Team B']
-                    # if tindx[-1] != ')':
-                    #     dfdata.ix[indx, 'Team B'] += ' ({})'.format(tindx[5:7])
-
-            # generate the average goal differential column
-            dfdata['Score A'] = dfdata['Plus/Minus'].apply(
-                lambda x: int(x.split('-')[0]))
-            dfdata['Score B'] = dfdata['Plus/Minus'].apply(
-                lambda x: int(x.split('-')[1]))
-
-            dfdata.head(10)
-
             # assert that an average goal differential per game of +5 gives +300
             # rating points.
             # dfdata['adhocrating'] = dfdata['div'] + 60. * dfdata['avgplusminus']
 
-            # scrape the list of teams for this league
-            teamsurl = 'http://old.buda.org/hatleagues/rosters.php?section=' \
-                       'showTeams&league=' + leagueid
-            response = urllib2.urlopen(teamsurl)
-            teams_soup = BeautifulSoup(response, "html5lib")
-
             # generate list of team ids and names for this league
-            tdlist = teams_soup.find_all('td', class_='infobody')
+            with self.metrics.stage('parse'):
+                cells = parse_buda.infobody_cells(teams_page,
+                                                  backend=self.parser)
             teamids = []
             teamnames = []
-            for td in tdlist:
+            for text, url, anchor_text in cells:
                 try:
-                    url = td.a['href']
                     idindex = url.index('team=')
                     whichindex = url.index('which=')
                     teamids.append(url[idindex+5:whichindex-1])
-                    teamnames.append(td.a.get_text())
+                    teamnames.append(anchor_text)
                 except:
                     continue
 
             # store the list of team ids associated with this league
             league_teams[leagueid] = teamids
 
-            # find all players associated with each team
-            # link the team rating to each player on that team
+            # match each team to its division in the scores database
+            matched_teams = []
             for teamid, teamname in zip(teamids, teamnames):
                 try:
                     index = dfdata['Team A'] == teamname.strip(' ')
-                    # adhocrating = dfdata.ix[index, 'adhocrating'].values[0]
-                    divrating = dfdata.ix[index, 'div'].values[0]
-                    divisionname = dfdata.ix[index, 'divname'].values[0]
-                    # avgplusminus = dfdata.ix[index, 'avgplusminus'].values[0]
+                    # adhocrating = dfdata.loc[index, 'adhocrating'].values[0]
+                    divrating = dfdata.loc[index, 'div'].values[0]
+                    divisionname = dfdata.loc[index, 'divname'].values[0]
+                    # avgplusminus = dfdata.loc[index, 'avgplusminus'].values[0]
                 except IndexError:
                     print("Couldn't match {} to scores database, skipping "
                           "this team.".format(teamname))
-                    import pdb; pdb.set_trace()
+                    self.metrics.count('teams_unmatched')
+                    self.metrics.event('team_unmatched', league=leagueid,
+                                       team=teamid, name=teamname)
                     continue
+                matched_teams.append((teamid, teamname, divrating,
+                                      divisionname))
 
-                if teamid in team_rating:
-                    print("Uh oh, duplicate found in league {}!".format(
-                        leagueid))
-                # team_rating[teamid] = adhocrating
-                team_rating[teamid] = None
-
-                path = '/hatleagues/rosters.php'
-                querydict = {'section': 'showTeamRoster',
-                             'team': '{}'.format(teamid)}
-                query = urllib.urlencode(querydict)
-                parts = (scheme, netloc, path, params, query, fragment)
-                teamurl = urlparse.urlunparse(parts)
-                response = urllib2.urlopen(teamurl)
-                roster_soup = BeautifulSoup(response, "html5lib")
-
-                # list of players on this team
-                players = [td.get_text() for td in
-                           roster_soup.find_all("td", class_="infobody")]
-
-                # store the players for this team in a dictionary
-                team_players[teamid] = players
-
-                # associate this team id with each player on the team
-                for player in players:
-                    if player in player_teams:
-                        player_teams[player].append(teamid)
-                    else:
-                        player_teams[player] = [teamid]
-
-                # build the super list of teams
-                allteamids.append(teamid)
-                allteamnames.append(teamname)
-                allseasons.append(league_season)
-                alltypes.append(league_type)
-                allyears.append(league_year)
-                alldivnames.append(divisionname)
-                alldivratings.append(divrating)
-                # allplusminus.append(avgplusminus)
-
-            dfdata = dfdata.drop(['index', 'Plus/Minus', 'div'], axis=1)
-            file_directory = os.path.join(self.base_dir, 'data', 'raw',
-                                          'game_scores')
-            file_name = "scores_{}.csv".format(leagueid)
-            file_path = os.path.join(file_directory, file_name)
-            dfdata.to_csv(file_path, index=False)
+            # fetch all of the rosters for this league concurrently
+            with self.metrics.stage('fetch'):
+                roster_pages = self.fetcher.fetch_all(
+                    [team_roster_url(teamid)
+                     for teamid, _, _, _ in matched_teams])
 
+            # list of players on each team
+            with self.metrics.stage('parse'):
+                rosters = [[text for text, _, _ in parse_buda.infobody_cells(
+                    roster_page, backend=self.parser)]
+                    for roster_page in roster_pages]
+
+            # find all players associated with each team
+            # link the team rating to each player on that team
+            with self.metrics.stage('roster_join'):
+                for (teamid, teamname, divrating, divisionname), players in \
+                        zip(matched_teams, rosters):
+
+                    if teamid in team_rating:
+                        print("Uh oh, duplicate found in league {}!".format(
+                            leagueid))
+                        self.metrics.event('duplicate_team', league=leagueid,
+                                           team=teamid)
+                    # team_rating[teamid] = adhocrating
+                    team_rating[teamid] = None
+
+                    # store the players for this team in a dictionary
+                    team_players[teamid] = players
+
+                    # associate this team id with each player on the team
+                    for player in players:
+                        if player in player_teams:
+                            player_teams[player].append(teamid)
+                        else:
+                            player_teams[player] = [teamid]
+
+                    # build the super list of teams
+                    allteamids.append(teamid)
+                    allteamnames.append(teamname)
+                    allseasons.append(league_season)
+                    alltypes.append(league_type)
+                    allyears.append(league_year)
+                    alldivnames.append(divisionname)
+                    alldivratings.append(divrating)
+                    # allplusminus.append(avgplusminus)
+                    allplusminus.append(np.nan)
+            self.metrics.count('teams_scraped', len(matched_teams))
+            self.metrics.count('players_joined',
+                               sum(len(players) for players in rosters))
+
+            with self.metrics.stage('write_scores'):
+                dfdata = dfdata.drop(['index', 'Plus/Minus', 'div'], axis=1)
+                file_directory = os.path.join(self.base_dir, 'data', 'raw',
+                                              'game_scores')
+                file_name = "scores_{}.csv".format(leagueid)
+                file_path = os.path.join(file_directory, file_name)
+                dfdata.to_csv(file_path, index=False)
+                if self.score_store is not None:
+                    team_ids = dict((teamname.strip(' '), int(teamid))
+                                    for teamid, teamname, _, _ in
+                                    matched_teams)
+                    self.score_store.add_league(leagueid, dfdata, league_year,
+                                                league_season, league_type,
+                                                team_ids)
+
+            self.fetcher.checkpoint()
+
+            self.metrics.count('leagues_scraped')
             print("Finished successfully with league {}".format(leagueid))
 
         alldf = pd.DataFrame({'teamid': allteamids,
@@ -403,43 +415,204 @@ class BudaRating(object):
                               'divname': alldivnames,
                               'divrating': alldivratings,
                               'plusminus': allplusminus})
+        if previous is not None:
+            alldf = pd.concat([previous, alldf], ignore_index=True)
 
         self.player_teams = player_teams
         self.team_players = team_players
         self.team_rating = team_rating
         self.league_teams = league_teams
         self.allteams = alldf
+        self.history = HistoryStore.from_dicts(
+            player_teams, team_players, team_rating, league_teams)
+        self.build_index()
+
+    def _fetch_leagues(self, leagueids):
+
+        """
+
+        :param leagueids: list of league ids to fetch
+        :return: generator of (league id, schedule page, team list page) in
+            the same order as leagueids
+
+        """
+
+        # fetch one batch of leagues at a time so that only a handful of
+        # pages are held in memory
+        nbatch = self.fetcher.nworkers
+        for ibatch in range(0, len(leagueids), nbatch):
+            batch = leagueids[ibatch: ibatch + nbatch]
+            urls = []
+            for leagueid in batch:
+                urls.append(league_schedule_url(leagueid))
+                urls.append(league_teams_url(leagueid))
+            with self.metrics.stage('fetch'):
+                pages = self.fetcher.fetch_all(urls)
+            for i, leagueid in enumerate(batch):
+                yield leagueid, pages[2 * i], pages[2 * i + 1]
+
+    def report(self):
+
+        """
+
+        :return: instrument.Metrics.report of the metrics recorded so far,
+            with the hit rate of the fetcher's response cache
+
+        """
+
+        return self.metrics.report(cache=self.fetcher.cache)
 
     def dump_buda(self, prefix):
-        f = open(prefix + '_player_teams.p', 'wb')
-        pickle.dump(self.player_teams, f)
-        f = open(prefix + '_team_players.p', 'wb')
-        pickle.dump(self.team_players, f)
-        f = open(prefix + '_team_rating.p', 'wb')
-        pickle.dump(self.team_rating, f)
-        f = open(prefix + '_league_teams.p', 'wb')
-        pickle.dump(self.league_teams, f)
-
-        self.allteams.to_csv(prefix + '_allteams.csv', index=False)
-
-    def load_buda(self, prefix):
-        f = open(prefix + '_player_teams.p', 'r')
-        self.player_teams = pickle.load(f)
-        f = open(prefix + '_team_players.p', 'r')
-        self.team_players = pickle.load(f)
-        f = open(prefix + '_team_rating.p', 'r')
-        self.team_rating = pickle.load(f)
-        f = open(prefix + '_league_teams.p', 'r')
-        self.league_teams = pickle.load(f)
-
-        self.allteams = pd.read_csv(prefix + '_allteams.csv')
-
-        self.self_ratings = pd.read_csv(prefix + '_selfcaptain_ratings.csv')
+
+        """
+
+        :param prefix: location to save the data to; the snapshot is written
+            to the prefix_snapshot directory
+
+        """
+
+        tables = {'allteams': self.allteams}
+        if hasattr(self, 'self_ratings'):
+            tables['self_ratings'] = self.self_ratings
+        snapshot.save_snapshot(prefix + '_snapshot', self.history, tables)
+
+    def dump_sqlite(self, path):
+
+        """
+
+        :param path: SQLite file to write an indexed copy of the data to, for
+            sqlite_store.SqliteStore
+
+        """
+
+        sqlite_store.save_sqlite(self, path)
+
+    def load_buda(self, prefix, mmap=True):
+
+        """
+
+        :param prefix: location of previously dumped data
+        :param mmap: if True, memory-map the history store rather than
+            reading it into memory
+
+        Older databases that were saved as pickles and csv files are still
+        read, but are slow to load; use snapshot.migrate_legacy to convert
+        them.
+
+        """
+
+        snapshot_path = prefix + '_snapshot'
+        if os.path.isdir(snapshot_path):
+            snap = snapshot.Snapshot(snapshot_path, mmap=mmap)
+            self.history = snap.history()
+            self.allteams = snap.table('allteams')
+            if snap.has_table('self_ratings'):
+                self.self_ratings = snap.table('self_ratings')
+            else:
+                self.self_ratings = snapshot.load_self_ratings(prefix)
+        else:
+            self.history, tables = snapshot.load_legacy(prefix)
+            self.allteams = tables['allteams']
+            self.self_ratings = tables['self_ratings']
+
+        self.player_teams = self.history.player_teams_view
+        self.team_players = self.history.team_players_view
+        self.team_rating = self.history.team_rating_view
+        self.league_teams = self.history.league_teams_view
+
+        self.self_index = self_rating_index.SelfRatingIndex(
+            self.self_ratings, self.aliases)
+
+        self.build_index()
+
+    def resolve_players(self, path=None, **kwargs):
+
+        """
+
+        Merge the spellings of each player's name into one canonical name,
+        in the rosters and in the self ratings, and rebuild the history.
+
+        :param path: csv file of the alias table to start from and to save
+            the result to, so that player ids are kept across runs
+        :param kwargs: passed on to PlayerIdentity.resolve
+        :return: PlayerIdentity with the player ids
+
+        """
+
+        if path is None:
+            identity = player_identity.PlayerIdentity()
+        else:
+            identity = player_identity.PlayerIdentity.load(path)
+
+        team_league = {}
+        for league_id, teams in self.league_teams.items():
+            for team_id in teams:
+                team_league[team_id] = league_id
+
+        # self rating names are resolved too, so they keep matching the
+        # roster names once those are canonical
+        ssr = self.self_ratings
+        self_names = ssr['last_name'].astype('str') + ', ' + \
+            ssr['first_name'].astype('str')
+        nmerged = identity.resolve(self.player_teams, team_league,
+                                   pd.unique(self_names), **kwargs)
+        self.metrics.count('player_names_merged', nmerged)
+
+        team_players = {}
+        player_teams = {}
+        for team_id, players in self.team_players.items():
+            canonical = []
+            for player in players:
+                player = identity.canonical(player)
+                if player not in canonical:
+                    canonical.append(player)
+            team_players[team_id] = canonical
+            for player in canonical:
+                player_teams.setdefault(player, []).append(team_id)
+
+        canonical = self_names.map(identity.canonical)
+        ssr = ssr.copy()
+        # a canonical name without a ', ' has no first name
+        split_names = canonical.str.split(', ', n=1)
+        ssr['last_name'] = split_names.str[0]
+        ssr['first_name'] = split_names.str[1].fillna('')
+        self.self_ratings = ssr
+
+        self.history = HistoryStore.from_dicts(
+            player_teams, team_players, dict(self.team_rating.items()),
+            dict(self.league_teams.items()))
+        self.player_teams = self.history.player_teams_view
+        self.team_players = self.history.team_players_view
+        self.team_rating = self.history.team_rating_view
+        self.league_teams = self.history.league_teams_view
+        self.self_index = self_rating_index.SelfRatingIndex(
+            self.self_ratings, self.aliases)
+        self.build_index()
+
+        # running club totals were built from the old history
+        if hasattr(self, 'club_history'):
+            del self.club_history
+
+        if path is not None:
+            identity.save(path)
+        self.identity = identity
+        return identity
+
+    def build_index(self):
+
+        """
+
+        Build the team lookup tables used by the prediction methods.  Needs
+        to be rerun whenever league_teams, allteams or team_rating change.
+
+        """
+
+        self.index = TeamIndex(self.league_teams, self.allteams,
+                               self.team_rating)
 
     def check_league_type(self, team_id):
 
-        return self.allteams.loc[self.allteams['teamid'] == team_id,
-                                 'type'].values[0]
+        return self.index.team_type(team_id)
 
     def predict_team(self, team_id):
 
@@ -455,19 +628,9 @@ class BudaRating(object):
         """
 
         # get the league_id for this team
-        for league_id in self.league_teams:
-            if team_id in self.league_teams[league_id]:
-                player_league = float(league_id)
-                league_type = self.league_meta.loc[league_id, 'type']
-
-        # get the self rating for this league
-        ssr = self.self_ratings
-        ssr = ssr[ssr['league_id'] == player_league]
-        ssr_first = ssr['first_name'].str.lower()
-        ssr_last = ssr['last_name'].str.lower()
-
-        # Assume: if self-rating is NaN, then this person is a total newbie
-        ssr['rank'] = ssr['rank'].replace('nan', 10)
+        league_id = self.index.league(team_id)
+        player_league = float(league_id)
+        league_type = self.league_meta.loc[league_id, 'type']
 
         # get the list of players for this team
         players = self.team_players[team_id]
@@ -490,57 +653,30 @@ class BudaRating(object):
 
             okplayers.append(player)
 
-            # player name is in the form of "Last, First"
-            player_names = player.split(',')
-            try:
-                player_last = player_names[0].lower()
-                player_first = player_names[1][1:].lower()
-                if player_first == 'chaniel':
-                    player_first = 'cheni'
-            except:
-                import pdb; pdb.set_trace()
-
             if league_type == 'Hat':
-                this_player = (ssr_first == player_first) & \
-                              (ssr_last == player_last) & \
-                              (ssr['rank_type'] == 1)
-                # print(player, ssr.ix[this_player, 'rank'])
-                if len(ssr.loc[this_player, 'rank'].values) == 0:
-                    # print(player)
+                rank, captain_rank = self.self_index.lookup(player_league,
+                                                            player)
+                if rank is None:
                     draft_rating.append(50)
                 else:
-                    # if len(ssr.loc[this_player, 'rank'].values) > 1:
-                        # print(player, ssr.loc[this_player, 'rank'].values)
-                    draft_rating.append(ssr.loc[this_player, 'rank'].values[0])
-
-                this_and_previous_player = (ssr_first == player_first) & \
-                                           (ssr_last == player_last)
-                captain_rank = ssr.loc[this_and_previous_player, 'captain_rank']
-                if len(captain_rank) > 0:
-                    if captain_rank.values[0] * 0 == 0:
-                        captain_rating.append(captain_rank.values[0])
-                        n_captain += 1
-                        captain_or_experience = True
-                    else:
-                        captain_rating.append(draft_rating[-1])
+                    draft_rating.append(rank)
+
+                if captain_rank is not None and captain_rank * 0 == 0:
+                    captain_rating.append(captain_rank)
+                    n_captain += 1
+                    captain_or_experience = True
                 else:
                     captain_rating.append(draft_rating[-1])
             else:
                 draft_rating.append(-1)
                 captain_rating.append(-1)
 
-            teams = self.player_teams[player]
-            teams = np.array(teams).astype('int')
-
             # list of previous teams for this player
-            previous_teams_index = teams < float(team_id)
-            previous_teams = teams[previous_teams_index]
+            previous_teams = self.history.previous_teams(player, team_id)
 
             # list of previous _club_ teams for this player
-            previous_club_teams = []
-            for previous_team in previous_teams:
-                if self.check_league_type(previous_team) == 'Club':
-                    previous_club_teams.append(previous_team)
+            previous_club_teams = previous_teams[
+                self.index.is_club(previous_teams)]
 
             # if someone has no club team record in the database, they probably
             # aren't very good, but we have to trust their self-rating
@@ -548,16 +684,17 @@ class BudaRating(object):
             if len(previous_club_teams) == 0:
                 # use captain's rating if possible
                 if captain_rating[-1] * 0 == 0:
-                    adjust_rating = self_to_experience(captain_rating[-1])
+                    adjust_rating = self.scale.to_experience(
+                        captain_rating[-1])
                 else:
-                    adjust_rating = self_to_experience(draft_rating[-1])
+                    adjust_rating = self.scale.to_experience(
+                        draft_rating[-1])
                 # if league_type == 'Hat':
                     # print(player, self_rating[-1], adjust_rating)
                 experience_rating.append(int(adjust_rating))
                 # experience_rating.append(800)
             else:
-                previous_ratings = [self.team_rating[str(team_key)] for
-                                    team_key in previous_club_teams]
+                previous_ratings = self.index.team_ratings(previous_club_teams)
 
                 # might want to refactor this line, since there are many
                 # possible ways to generate a single rating for a given player
@@ -568,9 +705,6 @@ class BudaRating(object):
             if captain_or_experience:
                 n_captainexperience += 1
 
-            if player == 'Ho, Vivian' and league_type == 'Hat':
-                import pdb; pdb.set_trace()
-
         # compute self_rating from draft_rating and captain's rating
         self_rating = 2 * np.array(draft_rating) - np.array(captain_rating)
 
@@ -582,45 +716,90 @@ class BudaRating(object):
             'experience_rating': experience_rating})
         return df_rating, n_captain, n_experience, n_captainexperience
 
-    def predicted_rating(self):
-
-        self_allteams = []
-        captain_allteams = []
-        draft_allteams = []
-        experience_allteams = []
-        ensemble_allteams = []
-        n_exp_allteams = []
-        n_cap_allteams = []
-        n_capexp_allteams = []
-        for i in tqdm(self.allteams.index):
-            team_id = self.allteams.loc[i, 'teamid']
-            league_year = self.allteams.loc[i, 'year']
-            if league_year < 2010:
-                self_allteams.append(-1)
-                captain_allteams.append(-1)
-                draft_allteams.append(-1)
-                experience_allteams.append(-1)
-                ensemble_allteams.append(-1)
-                n_exp_allteams.append(-1)
-                n_cap_allteams.append(-1)
-                n_capexp_allteams.append(-1)
-                continue
-            dfrating, n_cap, n_exp, n_capexp = self.predict_team(str(team_id))
-            self_allteams.append(dfrating['self_rating'].mean())
-            captain_allteams.append(dfrating['captain_rating'].mean())
-            draft_allteams.append(dfrating['draft_rating'].mean())
-            experience_allteams.append(dfrating['experience_rating'].mean())
-            experience_converted = experience_to_self(
-                dfrating['experience_rating'])
-            # ensemble_rating = 0.5 * (experience_converted +
-            #                          dfrating['captain_rating'])
-            ensemble_rating = experience_converted
-            ensemble_allteams.append(ensemble_rating.mean())
-            n_cap_allteams.append(n_cap / 16.)
-            n_exp_allteams.append(n_exp / 16.)
-            n_capexp_allteams.append(n_capexp / 16.)
-            if np.mean(ensemble_allteams)*0 != 0:
-                import pdb; pdb.set_trace()
+    def predicted_rating(self, batch=True, nworkers=1):
+
+        """
+
+        :param batch: if True, score every team in one vectorized pass
+            instead of calling predict_team for each team
+        :param nworkers: number of processes to score the leagues on
+
+        """
+
+        recent = (self.allteams['year'] >= 2010).values
+        team_ids = self.allteams.loc[recent, 'teamid'].values
+        self.metrics.count('teams_predicted', len(team_ids))
+
+        if batch:
+            with self.metrics.stage('predict'):
+                if nworkers > 1:
+                    club = batch_predict.club_history(self)
+                    teams = pd.DataFrame(
+                        parallel.map_leagues(self, parallel.predict_shard,
+                                             team_ids, nworkers, club),
+                        columns=batch_predict.COLUMNS)
+                else:
+                    teams, roster = batch_predict.predict_teams(
+                        self, team_ids, self.scale.to_experience,
+                        self.scale.to_self)
+                for column in batch_predict.COLUMNS:
+                    values = np.full(len(self.allteams), -1.)
+                    values[recent] = teams[column].values
+                    self.allteams[column] = values
+                unrated = ~np.isfinite(teams['ensemble_rating'].values)
+                if unrated.any():
+                    self.metrics.count('teams_unrated', int(unrated.sum()))
+                for team_id in team_ids[unrated]:
+                    self.metrics.event('unrated_team', team=team_id)
+            return
+
+        with self.metrics.stage('predict'):
+            if nworkers > 1:
+                predictions = iter(parallel.map_leagues(
+                    self, parallel.predict_team_shard, team_ids, nworkers))
+            else:
+                predictions = (self.predict_team(str(team_id))
+                               for team_id in team_ids)
+
+            self_allteams = []
+            captain_allteams = []
+            draft_allteams = []
+            experience_allteams = []
+            ensemble_allteams = []
+            n_exp_allteams = []
+            n_cap_allteams = []
+            n_capexp_allteams = []
+            for i in tqdm(self.allteams.index):
+                league_year = self.allteams.loc[i, 'year']
+                if league_year < 2010:
+                    self_allteams.append(-1)
+                    captain_allteams.append(-1)
+                    draft_allteams.append(-1)
+                    experience_allteams.append(-1)
+                    ensemble_allteams.append(-1)
+                    n_exp_allteams.append(-1)
+                    n_cap_allteams.append(-1)
+                    n_capexp_allteams.append(-1)
+                    continue
+                dfrating, n_cap, n_exp, n_capexp = next(predictions)
+                self_allteams.append(dfrating['self_rating'].mean())
+                captain_allteams.append(dfrating['captain_rating'].mean())
+                draft_allteams.append(dfrating['draft_rating'].mean())
+                experience_allteams.append(
+                    dfrating['experience_rating'].mean())
+                experience_converted = self.scale.to_self(
+                    dfrating['experience_rating'])
+                # ensemble_rating = 0.5 * (experience_converted +
+                #                          dfrating['captain_rating'])
+                ensemble_rating = experience_converted
+                ensemble_allteams.append(ensemble_rating.mean())
+                n_cap_allteams.append(n_cap / 16.)
+                n_exp_allteams.append(n_exp / 16.)
+                n_capexp_allteams.append(n_capexp / 16.)
+                if ensemble_allteams[-1] * 0 != 0:
+                    self.metrics.count('teams_unrated')
+                    self.metrics.event('unrated_team',
+                                       team=self.allteams.loc[i, 'teamid'])
 
         self.allteams['self_rating'] = self_allteams
         self.allteams['captain_rating'] = captain_allteams
@@ -631,12 +810,51 @@ class BudaRating(object):
         self.allteams['n_cap_rating'] = n_cap_allteams
         self.allteams['n_capexp_rating'] = n_capexp_allteams
 
-    def validate_rating(self):
+    def update_league(self, leagueid):
+
+        """
+
+        Scrape one new league and rate its teams from the running club
+        history of their players, without rescoring the rest of allteams.
+
+        :param leagueid: id of the league, which must be newer than every
+            league scraped so far
+
+        """
+
+        # running totals have to cover the teams from before this league only
+        if not hasattr(self, 'club_history'):
+            self.club_history = RunningClubHistory.from_buda(self)
+
+        nbefore = len(self.allteams)
+        self.scrape_buda(leagueids=[leagueid], resume=True)
+        new_teams = self.allteams.iloc[nbefore:]
+        if len(new_teams) == 0:
+            return
+
+        recent = (new_teams['year'] >= 2010).values
+        team_ids = new_teams.loc[recent, 'teamid'].values.astype('int64')
+        teams, roster = batch_predict.predict_teams(
+            self, team_ids, self.scale.to_experience, self.scale.to_self,
+            totals=self.club_history.totals)
+        for column in batch_predict.COLUMNS:
+            if column not in self.allteams:
+                self.allteams[column] = -1.
+            values = np.full(len(new_teams), -1.)
+            values[recent] = teams[column].values
+            self.allteams.loc[new_teams.index, column] = values
+
+        self.club_history.add_teams(
+            self, new_teams['teamid'].values.astype('int64'))
+
+    def validate_rating(self, nworkers=1):
 
         """
         I have captain's ratings and self ratings for spring hat league 2011 JP
         Mixed (4/3).  Can use those ratings to validate my method for estimating
         captain's ratings and self ratings.
+
+        :param nworkers: number of processes to score the leagues on
         """
 
         ok = (self.allteams['divname'] == 'JP Mixed (4/3)') & \
@@ -644,10 +862,15 @@ class BudaRating(object):
              (self.allteams['type'] == 'Hat') & \
              (self.allteams['year'] == 2011)
         sph2011 = self.allteams[ok]
-        dfratings = []
-        for i in tqdm(sph2011.index):
-            team_id = sph2011.loc[i, 'teamid']
-            dfratings.append(self.predict_team(str(team_id)))
+        if nworkers > 1:
+            dfratings = parallel.map_leagues(
+                self, parallel.predict_team_shard, sph2011['teamid'].values,
+                nworkers)
+        else:
+            dfratings = []
+            for i in tqdm(sph2011.index):
+                team_id = sph2011.loc[i, 'teamid']
+                dfratings.append(self.predict_team(str(team_id)))
         dfratings = pd.concat(dfratings)
         return dfratings
 
@@ -671,12 +894,8 @@ class BudaRating(object):
 
         # for each player, get their rating based on previous performance
         for player in players:
-            teams = self.player_teams[player]
-            teams = np.array(teams).astype('int')
-
             # list of previous teams for this player
-            previous_teams_index = teams < float(team_id)
-            previous_teams = teams[previous_teams_index]
+            previous_teams = self.history.previous_teams(player, team_id)
 
             # if someone has no records in the database, they probably aren't
             # very good
@@ -687,12 +906,10 @@ class BudaRating(object):
                 nclubseasons.append(0)
                 nhatseasons.append(0)
             else:
-                previous_ratings = [self.team_rating[str(team_key)] for
-                                    team_key in previous_teams]
+                previous_ratings = self.index.team_ratings(previous_teams)
 
                 # if there was no div rating set, then the rating will be
                 # centered on zero and should not be used in previous_ratings
-                previous_ratings = np.array(previous_ratings)
                 thresh = 500
                 okratings = previous_ratings > thresh
 
@@ -727,27 +944,81 @@ class BudaRating(object):
 
         return result
 
+    def team_details(self, team_ids, nworkers=1):
+
+        """
+
+        :param team_ids: ids of the teams for which to generate reports
+        :param nworkers: number of processes to generate them on
+        :return: list of team_detail dataframes in the order of team_ids
+
+        """
+
+        if nworkers > 1:
+            return parallel.map_leagues(self, parallel.team_detail_shard,
+                                        team_ids, nworkers)
+        return [self.team_detail(str(team_id)) for team_id in team_ids]
+
     def player_detail(self, player_name):
 
         pass
 
 
-def scrape_leagues():
+def buda_url(path, query):
+
+    """
+
+    :param path: path of the page on the BUDA site
+    :param query: list of (key, value) pairs for the query string
+    :return: full url of the page
+
+    """
 
-    r = urllib2.urlopen('http://old.buda.org/leagues/past-leagues')
-    soup = BeautifulSoup(r, "html5lib")
+    parts = ('http', BUDA_NETLOC, path, '', urlencode(query), '')
+    return urlunparse(parts)
 
-    iframe = soup.find_all('iframe')[0]
-    response = urllib2.urlopen(iframe.attrs['src'])
-    iframe_soup = BeautifulSoup(response, "html5lib")
+
+def league_schedule_url(leagueid):
+    return buda_url('/hatleagues/scores.php',
+                    [('section', 'showLeagueSchedule'),
+                     ('league', '{}'.format(leagueid)),
+                     ('byDivision', '1'),
+                     ('showGames', '1')])
+
+
+def league_teams_url(leagueid):
+    return buda_url('/hatleagues/rosters.php',
+                    [('section', 'showTeams'),
+                     ('league', '{}'.format(leagueid))])
+
+
+def team_roster_url(teamid):
+    return buda_url('/hatleagues/rosters.php',
+                    [('section', 'showTeamRoster'),
+                     ('team', '{}'.format(teamid))])
+
+
+def scrape_leagues(fetcher=None, parser=parse_buda.DEFAULT_BACKEND):
+
+    if fetcher is None:
+        fetcher = Fetcher()
+
+    # the list of past leagues grows over time, so always check it with the
+    # server unless we're offline
+    page = fetcher.fetch(buda_url('/leagues/past-leagues', []),
+                         revalidate=True)
+    src = parse_buda.iframe_src(page, backend=parser)
+    page = fetcher.fetch(src, revalidate=True)
+    # save the revalidated pages to the cache index now, rather than only
+    # after the first league is scraped
+    fetcher.checkpoint()
+    cells = parse_buda.infobody_cells(page, backend=parser)
 
     # scrape the html link to each league
-    leaguelinks = [i.a['href'] for i in iframe_soup.find_all(
-        "td", class_="infobody")]
+    leaguelinks = [href for text, href, anchor_text in cells]
 
     # scrape each league name
-    leaguenames = [i.get_text() for i in iframe_soup.find_all("td",
-                                                              class_="infobody")]
+    leaguenames = [text for text, href, anchor_text in cells]
 
     # extract each league id
     leagueids = [link[link.index('league=') + 7:] for link in leaguelinks]
@@ -766,7 +1037,9 @@ def scrape_leagues():
     leaguedict['season'] = leaguedict['name'].apply(func)
     func = lambda x: x.split(' ')[1]
     leaguedict['type'] = leaguedict['name'].apply(func)
-    func = lambda x: x.split(' ')[-1]
+    # the year is the last word of the league name; keep it a number so that
+    # it compares with the years of allteams
+    func = lambda x: int(x.split(' ')[-1])
     leaguedict['year'] = leaguedict['name'].apply(func)
 
     leaguedict = leaguedict.set_index('id')
@@ -800,6 +1073,100 @@ def define_ratings():
     return div_ratings
 
 
+def schedule_table(rows):
+
+    """
+
+    :param rows: rows of a league schedule from parse_buda.info_table_rows,
+        starting with the header row
+    :return: (schedule table with the header row as column names and missing
+        cells filled with -99, names of the divisions in the order they
+        appear)
+
+    """
+
+    # convert to dataframe and drop irrelevant columns
+    dfdata = pd.DataFrame(rows)
+    dfdata.columns = dfdata.iloc[0, :]
+    dfdata = dfdata.drop(0).reset_index()
+
+    # fill na's with -99 to facilitate division dividers
+    dfdata = dfdata.fillna(-99)
+
+    # get the list of divisions in this league
+    divnames = dfdata.loc[dfdata['Record'] == -99, 'Team'].values
+    return dfdata, divnames
+
+
+def normalize_schedule(dfdata, divnames, div_ratings, league_type):
+
+    """
+
+    :param dfdata: schedule table of a league, with the header row as column
+        names and missing cells filled with -99.  Division divider rows only
+        have a Team, team rows have a Team and the game rows underneath them
+        have an empty Team, the opponent under Record and the score under
+        Plus/Minus.
+    :param divnames: names of the divisions in the order they appear
+    :param div_ratings: dictionary of base rating for each division name
+    :param league_type: 'Hat' or 'Club'
+    :return: one row per game with Team A, Team B, the division name and
+        base rating of Team A and the score of each team
+    :raises KeyError: if the last division has no base rating
+
+    """
+
+    divnames = list(divnames)
+    if divnames[-1] not in div_ratings:
+        raise KeyError(divnames[-1])
+
+    # number the divisions by counting the dividers above each row; rows
+    # above the first divider and rows in a division without a base rating
+    # get 0 for both the rating and the name
+    divcodes = dfdata['Team'].isin(divnames).values.cumsum()
+    rated = [divname in div_ratings for divname in divnames]
+    div_lookup = np.array(
+        [0.] + [div_ratings[divname] if ok else 0.
+                for divname, ok in zip(divnames, rated)], dtype='float')
+    name_lookup = np.array(
+        [0.] + [divname if ok else 0.
+                for divname, ok in zip(divnames, rated)], dtype='object')
+
+    dfdata = dfdata.copy()
+    dfdata['div'] = div_lookup[divcodes]
+    dfdata['divname'] = name_lookup[divcodes]
+
+    # remove the division dividers from the dataframe
+    dfdata = dfdata[~dfdata['Team'].isin(divnames)]
+
+    # copy each team name down to the games listed under it, then drop the
+    # team rows themselves
+    teamindex = (dfdata['Team'] != '').values
+    teams = dfdata['Team'].where(teamindex).ffill().fillna('')
+    dfdata = dfdata[~teamindex].copy()
+    dfdata['Team'] = teams[~teamindex]
+
+    dfdata = dfdata.rename(columns={
+        'Team': 'Team A',
+        'Record': 'Team B'
+    })
+
+    # make sure the Team identifier includes (team number) if this is
+    #  a hat league team
+    if league_type == 'Hat':
+        team_a = dfdata['Team A']
+        nonumber = (team_a != '') & (team_a.str[-1] != ')')
+        dfdata.loc[nonumber, 'Team A'] = team_a[nonumber] + ' (' + \
+            team_a[nonumber].str[5:7] + ')'
+
+    # generate the average goal differential column
+    scores = dfdata['Plus/Minus'].str.split('-')
+    dfdata['Score A'] = scores.str[0].astype('int')
+    dfdata['Score B'] = scores.str[1].astype('int')
+
+    return dfdata
+
+
 def observed_rating(base_rating, plusminus):
 
     normalizer = 60.
@@ -808,20 +1175,10 @@ def observed_rating(base_rating, plusminus):
 
 
 def self_to_experience(self_rating):
-    base_self = [-1] + range(0, 110, 10)
-    base_experience = 100 * np.array([5, 5, 6, 8, 9, 10, 12, 14, 16, 18, 20,
-                                      20])
-    func = interp1d(base_self, base_experience)
-    experience_rating = func(self_rating)
 
-    return experience_rating
+    return rating_scale.DEFAULT_SCALE.to_experience(self_rating)
 
 
 def experience_to_self(experience_rating):
-    base_self = [0, 0] + range(0, 110, 10) + [100, 100]
-    base_experience = 100 * np.array([-5, 5, 5, 6, 8, 9, 10, 12, 14, 16, 18, 20,
-                                      20, 21, 29])
-    func = interp1d(base_experience, base_self)
-    self_rating = func(experience_rating)
 
-    return self_rating
+    return rating_scale.DEFAULT_SCALE.to_self(experience_rating)
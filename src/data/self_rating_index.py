@@ -0,0 +1,166 @@
+import csv
+
+import numpy as np
+import pandas as pd
+
+
+"""
+
+Hash index of the self and captain ratings in _selfcaptain_ratings.csv.
+
+predict_team needs the draft rank and captain rank of every player on a team.
+Rather than comparing every player against lowercased name columns of the
+league's slice of the self ratings, the names are normalized once and the
+ratings are stored in a dictionary keyed by (league id, last name, first
+name).
+
+Roster names don't always match the names players entered for their self
+ratings.  Known differences are kept in an alias table that maps a
+normalized roster first name to the first name used in the self ratings.
+
+"""
+
+
+# roster first name -> self rating first name
+ALIASES = {'chaniel': 'cheni'}
+
+
+def normalize_name(name):
+
+    """
+
+    :param name: first or last name
+    :return: name in lower case with surrounding and repeated whitespace
+        removed
+
+    """
+
+    return ' '.join(name.lower().split())
+
+
+def split_player_name(player, aliases=ALIASES):
+
+    """
+
+    :param player: player name in the form of "Last, First"
+    :param aliases: dictionary of first name aliases
+    :return: normalized (last name, first name)
+
+    """
+
+    player_names = player.split(',', 1)
+    player_last = normalize_name(player_names[0])
+    if len(player_names) > 1:
+        player_first = normalize_name(player_names[1])
+    else:
+        player_first = ''
+    player_first = aliases.get(player_first, player_first)
+    return player_last, player_first
+
+
+def load_aliases(path):
+
+    """
+
+    :param path: csv file with an alias and a name column, one row per alias
+    :return: dictionary of normalized alias to normalized name, including
+        the default aliases
+
+    """
+
+    aliases = dict(ALIASES)
+    with open(path, 'r') as f:
+        for row in csv.DictReader(f):
+            aliases[normalize_name(row['alias'])] = normalize_name(row['name'])
+    return aliases
+
+
+class SelfRatingIndex(object):
+
+    """
+
+    :param self_ratings: dataframe read from _selfcaptain_ratings.csv with
+        league_id, first_name, last_name, rank, rank_type and captain_rank
+        columns
+    :param aliases: dictionary of first name aliases
+
+    """
+
+    def __init__(self, self_ratings, aliases=ALIASES):
+        self.aliases = aliases
+
+        ssr = self_ratings.copy()
+
+        # Assume: if self-rating is NaN, then this person is a total newbie
+        ssr['rank'] = ssr['rank'].replace('nan', 10)
+
+        ssr['league_key'] = ssr['league_id'].astype('float')
+        ssr['last_key'] = ssr['last_name'].astype('str').apply(normalize_name)
+        ssr['first_key'] = ssr['first_name'].astype('str').apply(
+            normalize_name)
+        keys = ['league_key', 'last_key', 'first_key']
+
+        # when a player has more than one row, the first one wins: the first
+        # draft (rank_type 1) row gives the rank and the first row of any
+        # kind gives the captain rank
+        draft = ssr[ssr['rank_type'] == 1].drop_duplicates(keys)
+        captain = ssr.drop_duplicates(keys)
+
+        # kept as tables for bulk joins
+        self.draft = draft[keys + ['rank']]
+        self.captain = captain[keys + ['captain_rank']]
+
+        self.ranks = dict(zip(zip(draft['league_key'], draft['last_key'],
+                                  draft['first_key']),
+                              draft['rank']))
+        self.captain_ranks = dict(zip(zip(captain['league_key'],
+                                          captain['last_key'],
+                                          captain['first_key']),
+                                      captain['captain_rank']))
+
+    def lookup(self, league_id, player):
+
+        """
+
+        :param league_id: id of the league
+        :param player: player name in the form of "Last, First"
+        :return: (draft rank, captain rank) of the player in this league,
+            either of which is None if the player has no such rating row.
+            The captain rank may also be NaN if the player has a row but no
+            captain rank.
+
+        """
+
+        player_last, player_first = split_player_name(player, self.aliases)
+        key = (float(league_id), player_last, player_first)
+        return self.ranks.get(key), self.captain_ranks.get(key)
+
+    def lookup_many(self, league_ids, players):
+
+        """
+
+        :param league_ids: array of league ids
+        :param players: array of player names in the form of "Last, First"
+        :return: draft ranks, mask of which players have a draft rank and
+            captain ranks, with NaN for players without a rating row
+
+        """
+
+        rows = pd.DataFrame({'league_key': np.asarray(league_ids,
+                                                      dtype='float'),
+                             'player': players})
+
+        # split each distinct name once
+        names = pd.unique(rows['player'])
+        split = [split_player_name(player, self.aliases) for player in names]
+        rows['last_key'] = rows['player'].map(
+            dict(zip(names, [last for last, first in split])))
+        rows['first_key'] = rows['player'].map(
+            dict(zip(names, [first for last, first in split])))
+
+        keys = ['league_key', 'last_key', 'first_key']
+        draft = self.draft.assign(found=True)
+        rows = rows.merge(draft, how='left', on=keys)
+        rows = rows.merge(self.captain, how='left', on=keys)
+        found = rows['found'].notnull().values
+        return rows['rank'].values, found, rows['captain_rank'].values
@@ -0,0 +1,381 @@
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from history_store import ARRAYS, HistoryStore
+
+
+"""
+
+Versioned on-disk snapshot of the BudaRating database.
+
+A snapshot is a directory with a manifest, the history store arrays and one
+.npy file per table column:
+
+    prefix_snapshot/
+        manifest.json
+        history/team_ids.npy, player_offsets.npy, ...
+        tables/allteams/col0.npy, col1.npy, col1.mask.npy, ...
+        tables/self_ratings/...
+
+Numeric columns are saved as they are.  Text columns are saved as fixed width
+unicode arrays with a boolean mask marking the missing values.  The manifest
+records the format version, the name, kind and file of every column and the
+number of rows of every table, and is checked against the files when the
+snapshot is opened.  Columns are memory-mapped and only read when a table
+asks for them, so opening a snapshot costs a json parse.
+
+Older databases were saved as four pickles plus two csv files sharing a
+prefix (e.g. data20160521_player_teams.p).  migrate_legacy converts one of
+those into a snapshot.
+
+"""
+
+
+SNAPSHOT_VERSION = 1
+
+# columns that every snapshot table must have
+REQUIRED_COLUMNS = {
+    'allteams': ['teamid', 'teamname', 'season', 'type', 'year', 'divname',
+                 'divrating'],
+    'self_ratings': ['league_id', 'first_name', 'last_name', 'rank',
+                     'rank_type', 'captain_rank'],
+}
+
+# columns that the csv files read back as numbers.  The scraper builds
+# some of them from text (the year from the league name, the team id from
+# a link), so they are converted before saving and after loading to keep
+# the dtypes the csv loader gave.
+NUMERIC_COLUMNS = {
+    'allteams': ['teamid', 'year', 'divrating', 'plusminus'],
+    'self_ratings': ['user_id', 'league_id', 'rank', 'rank_type',
+                     'captain_rank'],
+}
+
+LEGACY_PICKLES = ['player_teams', 'team_players', 'team_rating',
+                  'league_teams']
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def save_column(path, series):
+
+    """
+
+    :param path: path of the column file, without extension
+    :param series: column to save
+    :return: kind of the column, 'numeric' or 'text'
+
+    """
+
+    values = series.values
+    if values.dtype.kind in 'biuf':
+        np.save(path + '.npy', values)
+        return 'numeric'
+
+    mask = pd.isnull(series).values
+    text = np.array([u'' if missing else u'{}'.format(value)
+                     for value, missing in zip(values, mask)], dtype='U')
+    np.save(path + '.npy', text)
+    np.save(path + '.mask.npy', mask)
+    return 'text'
+
+
+def restore_numeric(name, table):
+
+    """
+
+    :param name: name of the table
+    :param table: dataframe
+    :return: copy of the table with its NUMERIC_COLUMNS converted from text
+        to numbers, except for columns with values that aren't numbers,
+        which the csv loader would have left as text too
+
+    """
+
+    table = table.copy()
+    for column in NUMERIC_COLUMNS.get(name, []):
+        if column in table.columns and \
+                table[column].dtype.kind not in 'biuf':
+            try:
+                table[column] = pd.to_numeric(table[column])
+            except (ValueError, TypeError):
+                pass
+    return table
+
+
+def load_column(path, kind, mmap=True):
+    mmap_mode = 'r' if mmap else None
+    values = np.load(path + '.npy', mmap_mode=mmap_mode)
+    if kind == 'numeric':
+        return values
+
+    values = values.astype('object')
+    mask = np.load(path + '.mask.npy')
+    values[mask] = np.nan
+    return values
+
+
+def save_snapshot(path, history, tables):
+
+    """
+
+    :param path: directory to write the snapshot to; replaced if it exists
+    :param history: HistoryStore
+    :param tables: dictionary of table name to dataframe
+
+    """
+
+    # write into a temporary directory so that a failed dump doesn't leave a
+    # half-written snapshot behind
+    tmp_path = path.rstrip(os.sep) + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    history.save(os.path.join(tmp_path, 'history'))
+
+    manifest = {'version': SNAPSHOT_VERSION, 'tables': {}}
+    for name in sorted(tables):
+        table = restore_numeric(name, tables[name])
+        table_dir = os.path.join(tmp_path, 'tables', name)
+        os.makedirs(table_dir)
+        columns = []
+        for i, column in enumerate(table.columns):
+            file_name = 'col{}'.format(i)
+            kind = save_column(os.path.join(table_dir, file_name),
+                               table[column])
+            columns.append({'name': column, 'kind': kind, 'file': file_name})
+        manifest['tables'][name] = {'nrows': len(table), 'columns': columns}
+
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+
+
+class Snapshot(object):
+
+    """
+
+    :param path: directory of the snapshot
+    :param mmap: if True, memory-map the arrays instead of reading them
+
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        self.mmap = mmap
+
+        manifest_path = os.path.join(path, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            raise SnapshotError("{} is not a snapshot".format(path))
+        with open(manifest_path, 'r') as f:
+            self.manifest = json.load(f)
+        self.validate()
+
+    def validate(self):
+
+        """
+
+        Check the manifest against the files on disk.
+
+        """
+
+        version = self.manifest.get('version')
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(
+                "{} has snapshot version {}, expected {}".format(
+                    self.path, version, SNAPSHOT_VERSION))
+
+        for name in ARRAYS:
+            if not os.path.exists(self.history_file(name)):
+                raise SnapshotError("{} is missing history array {}".format(
+                    self.path, name))
+
+        for name, table in self.manifest['tables'].items():
+            names = [column['name'] for column in table['columns']]
+            for required in REQUIRED_COLUMNS.get(name, []):
+                if required not in names:
+                    raise SnapshotError("{} table {} is missing column "
+                                        "{}".format(self.path, name, required))
+            for column in table['columns']:
+                path = self.column_file(name, column) + '.npy'
+                if not os.path.exists(path):
+                    raise SnapshotError("{} is missing {}".format(self.path,
+                                                                  path))
+
+    def history_file(self, name):
+        return os.path.join(self.path, 'history', name + '.npy')
+
+    def column_file(self, table, column):
+        return os.path.join(self.path, 'tables', table, column['file'])
+
+    def history(self):
+        store = HistoryStore.load(os.path.join(self.path, 'history'),
+                                  mmap=self.mmap)
+        nteams = len(store.team_ids)
+        if len(store.roster_offsets) != nteams + 1 or \
+                len(store.player_offsets) != len(store.player_names) + 1 or \
+                len(store.league_offsets) != len(store.league_ids) + 1:
+            raise SnapshotError("{} history arrays have inconsistent "
+                                "lengths".format(self.path))
+        return store
+
+    def has_table(self, name):
+        return name in self.manifest['tables']
+
+    def columns(self, name):
+        return [column['name'] for column in
+                self.manifest['tables'][name]['columns']]
+
+    def table(self, name, columns=None):
+
+        """
+
+        :param name: name of the table
+        :param columns: list of columns to read, defaults to all of them
+        :return: dataframe with the requested columns
+
+        """
+
+        table = self.manifest['tables'][name]
+        data = []
+        names = []
+        for column in table['columns']:
+            if columns is not None and column['name'] not in columns:
+                continue
+            values = load_column(self.column_file(name, column),
+                                 column['kind'], self.mmap)
+            if len(values) != table['nrows']:
+                raise SnapshotError("{} column {} of table {} has {} rows, "
+                                    "expected {}".format(
+                                        self.path, column['name'], name,
+                                        len(values), table['nrows']))
+            data.append(values)
+            names.append(column['name'])
+        # snapshots saved before the numeric columns were converted
+        return restore_numeric(
+            name, pd.DataFrame(dict(zip(names, data)), columns=names))
+
+
+def load_pickle(path):
+
+    """
+
+    :param path: path of a pickle written by python 2
+    :return: unpickled object
+
+    """
+
+    with open(path, 'rb') as f:
+        try:
+            # python 3 needs to be told how to decode python 2 strings
+            return pickle.load(f, encoding='latin1')
+        except TypeError:
+            return pickle.load(f)
+
+
+def load_legacy(prefix):
+
+    """
+
+    :param prefix: prefix of a database saved as pickles and csv files
+    :return: HistoryStore and dictionary of tables
+
+    """
+
+    dicts = [load_pickle('{}_{}.p'.format(prefix, name))
+             for name in LEGACY_PICKLES]
+    history = HistoryStore.from_dicts(*dicts)
+
+    tables = {'allteams': pd.read_csv(prefix + '_allteams.csv'),
+              'self_ratings': load_self_ratings(prefix)}
+    return history, tables
+
+
+def load_self_ratings(prefix):
+
+    """
+
+    :param prefix: prefix of a database
+    :return: the prefix_selfcaptain_ratings.csv table, or an empty table with
+        the required columns if there is no such file
+
+    """
+
+    path = prefix + '_selfcaptain_ratings.csv'
+    if os.path.exists(path):
+        return pd.read_csv(path)
+    return pd.DataFrame(columns=REQUIRED_COLUMNS['self_ratings'])
+
+
+def check_migration(prefix, path):
+
+    """
+
+    Compare the tables of a snapshot with the ones the csv loader reads.
+
+    :param prefix: prefix of a database saved as pickles and csv files
+    :param path: snapshot written from it
+    :raises SnapshotError: if a table differs in its columns, dtypes or
+        values
+
+    """
+
+    _, tables = load_legacy(prefix)
+    snap = Snapshot(path, mmap=False)
+    for name, expected in tables.items():
+        table = snap.table(name)
+        if list(table.columns) != list(expected.columns):
+            raise SnapshotError("{} table {} has columns {}, expected "
+                                "{}".format(path, name, list(table.columns),
+                                            list(expected.columns)))
+        if len(table) != len(expected):
+            raise SnapshotError("{} table {} has {} rows, expected {}".format(
+                path, name, len(table), len(expected)))
+        if len(expected) == 0:
+            continue
+        for column in expected.columns:
+            values = table[column].values
+            expected_values = expected[column].values
+            if values.dtype.kind != expected_values.dtype.kind or \
+                    not pd.Series(values).equals(pd.Series(expected_values)):
+                raise SnapshotError("{} column {} of table {} differs from "
+                                    "the csv".format(path, column, name))
+
+
+def migrate_legacy(prefix, path=None):
+
+    """
+
+    :param prefix: prefix of a database saved as pickles and csv files, e.g.
+        data20160521
+    :param path: directory to write the snapshot to, defaults to
+        prefix_snapshot
+    :return: path of the snapshot
+
+    """
+
+    if path is None:
+        path = prefix + '_snapshot'
+    history, tables = load_legacy(prefix)
+    save_snapshot(path, history, tables)
+    check_migration(prefix, path)
+    return path
+
+
+if __name__ == '__main__':
+
+    import sys
+
+    for prefix in sys.argv[1:]:
+        print("Wrote {}".format(migrate_legacy(prefix)))
@@ -0,0 +1,522 @@
+import argparse
+import io
+import json
+import os
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from snapshot import load_column, save_column
+
+
+"""
+
+Read the buda_prod mysqldump backup without a MySQL server.
+
+The "Get SQL data" notebook loads data/raw/buda_prod_backup_2016-08-31.sql
+into a local MySQL and queries it with pymysql.  Most of the dump is the
+website (joom_* tables, sessions, logs), while the ratings only need a
+handful of tables.  load_dump reads the dump once, a line at a time, and
+passes the CREATE TABLE and INSERT statements of the needed tables to a
+writer; the INSERT lines of the other tables are skipped without being
+parsed.  mysqldump writes every INSERT on one line of at most
+net_buffer_length bytes, so memory use is bounded by that and the writer's
+batch, not by the size of the dump.
+
+Two writers are available:
+
+ - SqliteWriter: one SQLite database with a table per dumped table,
+   inserted in batches
+ - ColumnarWriter: a directory per table with one .npy file per column, in
+   the format of the snapshot tables
+
+read_tables reads either back as dataframes, and self_captain_ratings turns
+them into the rows of _selfcaptain_ratings.csv:
+
+    python sql_dump.py ../../data/raw/buda_prod_backup_2016-08-31.sql \\
+        ../../data/interim/buda_prod.sqlite \\
+        --self-ratings ../../data/interim/data20160831
+
+"""
+
+
+# tables to keep, with the columns to keep or None for all of them.  Only
+# the name columns of the users are kept: the table also has their email
+# addresses and password hashes.
+DEFAULT_TABLES = {
+    'buda_leagues': None,
+    'buda_teams': None,
+    'buda_team_league_map': None,
+    'buda_hatleague_teams': None,
+    'buda_hatleague_rosters': None,
+    'buda_hatleague_schedules': None,
+    'buda_hatleague_player_rankings': None,
+    'captain_ratings': None,
+    'buda_users_public': ['user_id', 'first_name', 'last_name'],
+}
+
+CREATE_RE = re.compile(r'CREATE TABLE `([^`]+)`')
+COLUMN_RE = re.compile(r'\s*`([^`]+)`\s+(\w+)')
+INSERT_RE = re.compile(r'INSERT INTO `([^`]+)`\s*(?:\(([^)]*)\)\s*)?VALUES\s*')
+
+# one value of a VALUES tuple and the ',' or ')' after it
+VALUE_RE = re.compile(r"""\s*(?:(?:_binary\s*)?'((?:[^'\\]|\\.|'')*)'|"""
+                      r"""(NULL)|([^,()'\s]+))\s*([,)])""", re.S)
+ESCAPE_RE = re.compile(r"\\(.)|''", re.S)
+ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t',
+           'Z': '\x1a'}
+
+
+class SqlDumpError(ValueError):
+    pass
+
+
+def unescape(text):
+
+    """
+
+    :param text: contents of a quoted MySQL string
+    :return: the string value
+
+    """
+
+    def replace(match):
+        char = match.group(1)
+        if char is None:
+            return "'"
+        return ESCAPES.get(char, char)
+
+    if '\\' not in text and "''" not in text:
+        return text
+    return ESCAPE_RE.sub(replace, text)
+
+
+def number(text):
+
+    """
+
+    :param text: unquoted value, e.g. 12, -1.5 or 0x1F
+    :return: int or float, or the text itself if it is not a number
+
+    """
+
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+
+def parse_values(text, pos=0):
+
+    """
+
+    Parse the tuples of an extended INSERT.
+
+    :param text: INSERT statement
+    :param pos: position of the first '(' after VALUES
+    :return: generator of the rows as tuples; strings are unescaped, NULL is
+        None and unquoted numbers are converted
+
+    """
+
+    length = len(text)
+    while True:
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos >= length or text[pos] != '(':
+            raise SqlDumpError("expected '(' at {}: {!r}".format(
+                pos, text[pos:pos + 40]))
+        pos += 1
+
+        row = []
+        while True:
+            match = VALUE_RE.match(text, pos)
+            if match is None:
+                raise SqlDumpError("bad value at {}: {!r}".format(
+                    pos, text[pos:pos + 40]))
+            quoted, null, bare, end = match.groups()
+            if quoted is not None:
+                row.append(unescape(quoted))
+            elif null is not None:
+                row.append(None)
+            else:
+                row.append(number(bare))
+            pos = match.end()
+            if end == ')':
+                break
+        yield tuple(row)
+
+        while pos < length and text[pos].isspace():
+            pos += 1
+        if pos >= length or text[pos] == ';':
+            return
+        if text[pos] != ',':
+            raise SqlDumpError("expected ',' at {}: {!r}".format(
+                pos, text[pos:pos + 40]))
+        pos += 1
+
+
+def parse_create_table(lines):
+
+    """
+
+    :param lines: lines of a CREATE TABLE statement
+    :return: list of (column name, MySQL type) in table order
+
+    """
+
+    columns = []
+    for line in lines[1:]:
+        match = COLUMN_RE.match(line)
+        if match is not None:
+            columns.append((match.group(1), match.group(2).lower()))
+    return columns
+
+
+def table_name(line, prefix):
+
+    """
+
+    :return: the name in backquotes after prefix, if line starts with it
+
+    """
+
+    if not line.startswith(prefix):
+        return None
+    end = line.find('`', len(prefix))
+    return line[len(prefix):end]
+
+
+def load_dump(path, writer, tables=DEFAULT_TABLES, encoding='utf-8'):
+
+    """
+
+    :param path: mysqldump file
+    :param writer: SqliteWriter or ColumnarWriter
+    :param tables: dictionary of the names of the tables to keep to the
+        list of their columns to keep, or None for all columns
+    :param encoding: character set of the dump
+    :return: dictionary of table name to number of rows written
+
+    """
+
+    nrows = dict((name, 0) for name in tables)
+    columns = {}
+    statement = None
+    with io.open(path, 'r', encoding=encoding, errors='replace') as f:
+        for line in f:
+            # the rest of a multi-line CREATE TABLE
+            if statement is not None:
+                statement.append(line)
+                if line.rstrip().endswith(';'):
+                    match = CREATE_RE.match(statement[0])
+                    columns[match.group(1)] = parse_create_table(statement)
+                    writer.create_table(match.group(1),
+                                        columns[match.group(1)],
+                                        tables[match.group(1)])
+                    statement = None
+                continue
+
+            name = table_name(line, 'INSERT INTO `')
+            if name is not None:
+                if name not in tables:
+                    continue
+                # an INSERT of a value with a raw line break, which
+                # mysqldump escapes but hand-written dumps may not
+                while not line.rstrip().endswith(';'):
+                    extra = f.readline()
+                    if extra == '':
+                        raise SqlDumpError("unterminated INSERT into "
+                                           "{}".format(name))
+                    line += extra
+                match = INSERT_RE.match(line)
+                if match is None:
+                    raise SqlDumpError("can't parse INSERT into "
+                                       "{}".format(name))
+                if match.group(2) is not None:
+                    names = [column.strip().strip('`')
+                             for column in match.group(2).split(',')]
+                    if name not in columns:
+                        columns[name] = [(column, 'text')
+                                         for column in names]
+                        writer.create_table(name, columns[name],
+                                            tables[name])
+                    elif names != [column for column, kind in
+                                   columns[name]]:
+                        raise SqlDumpError("INSERT into {} has columns that "
+                                           "differ from its CREATE "
+                                           "TABLE".format(name))
+                elif name not in columns:
+                    raise SqlDumpError("INSERT into {} before its CREATE "
+                                       "TABLE".format(name))
+                nrows[name] += writer.add_rows(
+                    name, parse_values(line, match.end()))
+                continue
+
+            name = table_name(line, 'CREATE TABLE `')
+            if name is not None and name in tables:
+                statement = [line]
+
+    writer.close()
+    return nrows
+
+
+def keep_columns(columns, keep):
+
+    """
+
+    :param columns: list of (column name, MySQL type) of a table
+    :param keep: list of the column names to keep, or None for all
+    :return: positions of the kept columns
+
+    """
+
+    return [i for i, (column, kind) in enumerate(columns)
+            if keep is None or column in keep]
+
+
+def sqlite_type(kind):
+    if 'int' in kind:
+        return 'INTEGER'
+    if kind in ('decimal', 'numeric', 'float', 'double', 'real'):
+        return 'REAL'
+    return 'TEXT'
+
+
+class SqliteWriter(object):
+
+    """
+
+    Write the dumped tables to a SQLite database.
+
+    :param path: database file; tables that are dumped again are replaced
+    :param batch_size: number of rows to insert at a time
+
+    """
+
+    def __init__(self, path, batch_size=10000):
+        self.connection = sqlite3.connect(path)
+        self.batch_size = batch_size
+        self.positions = {}
+
+    def create_table(self, name, columns, keep=None):
+        positions = keep_columns(columns, keep)
+        self.positions[name] = positions
+        definitions = ', '.join('"{}" {}'.format(columns[i][0],
+                                                 sqlite_type(columns[i][1]))
+                                for i in positions)
+        self.connection.execute('DROP TABLE IF EXISTS "{}"'.format(name))
+        self.connection.execute('CREATE TABLE "{}" ({})'.format(name,
+                                                                definitions))
+
+    def add_rows(self, name, rows):
+
+        """
+
+        :param name: table name
+        :param rows: iterable of row tuples in the order of create_table
+        :return: number of rows added
+
+        """
+
+        positions = self.positions[name]
+        sql = 'INSERT INTO "{}" VALUES ({})'.format(
+            name, ', '.join('?' * len(positions)))
+        nrows = 0
+        batch = []
+        for row in rows:
+            batch.append([row[i] for i in positions])
+            if len(batch) == self.batch_size:
+                self.connection.executemany(sql, batch)
+                nrows += len(batch)
+                batch = []
+        if len(batch) > 0:
+            self.connection.executemany(sql, batch)
+            nrows += len(batch)
+        return nrows
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+class ColumnarWriter(object):
+
+    """
+
+    Write the dumped tables as one .npy file per column.
+
+    :param path: directory to write to, with a subdirectory per table and a
+        manifest.json listing the tables and their columns
+
+    The rows of a table are kept in memory until close, so memory use grows
+    with the largest kept table rather than with the dump.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = {}
+        self.rows = {}
+
+    def create_table(self, name, columns, keep=None):
+        positions = keep_columns(columns, keep)
+        self.columns[name] = [columns[i][0] for i in positions]
+        self.rows[name] = (positions, [])
+
+    def add_rows(self, name, rows):
+        positions, table_rows = self.rows[name]
+        nrows = len(table_rows)
+        table_rows.extend(tuple(row[i] for i in positions) for row in rows)
+        return len(table_rows) - nrows
+
+    def close(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        manifest = {'tables': {}}
+        for name in sorted(self.columns):
+            table = pd.DataFrame.from_records(self.rows[name][1],
+                                              columns=self.columns[name])
+            table_dir = os.path.join(self.path, name)
+            if not os.path.exists(table_dir):
+                os.makedirs(table_dir)
+            columns = []
+            for i, column in enumerate(table.columns):
+                file_name = 'col{}'.format(i)
+                kind = save_column(os.path.join(table_dir, file_name),
+                                   table[column])
+                columns.append({'name': column, 'kind': kind,
+                                'file': file_name})
+            manifest['tables'][name] = {'nrows': len(table),
+                                        'columns': columns}
+            del self.rows[name]
+        with open(os.path.join(self.path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def read_tables(path, names=None):
+
+    """
+
+    :param path: SQLite database written by SqliteWriter or directory
+        written by ColumnarWriter
+    :param names: list of tables to read, defaults to all of them
+    :return: dictionary of table name to dataframe
+
+    """
+
+    tables = {}
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        for name, table in manifest['tables'].items():
+            if names is not None and name not in names:
+                continue
+            data = [load_column(os.path.join(path, name, column['file']),
+                                column['kind'], mmap=False)
+                    for column in table['columns']]
+            columns = [column['name'] for column in table['columns']]
+            tables[name] = pd.DataFrame(dict(zip(columns, data)),
+                                        columns=columns)
+        return tables
+
+    connection = sqlite3.connect(path)
+    try:
+        available = [row[0] for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for name in available:
+            if names is None or name in names:
+                tables[name] = pd.read_sql('SELECT * FROM "{}"'.format(name),
+                                           connection)
+    finally:
+        connection.close()
+    return tables
+
+
+def first_column(table, candidates):
+    for column in candidates:
+        if column in table.columns:
+            return column
+    return None
+
+
+def self_captain_ratings(tables):
+
+    """
+
+    Join the player rankings with the player names and the leagues, as the
+    "Get SQL data" notebook does.
+
+    :param tables: dictionary of dataframes from read_tables, with at least
+        buda_hatleague_player_rankings, buda_users_public and buda_leagues
+    :return: dataframe with the columns of _selfcaptain_ratings.csv.  The
+        captain_rank is the average rank given to the player by the
+        captains in captain_ratings, if that table was dumped, and NaN
+        otherwise.
+    :raises SqlDumpError: if captain_ratings was dumped without a player,
+        rank or league_id column
+
+    """
+
+    rankings = tables['buda_hatleague_player_rankings'].rename(
+        columns={'player_id': 'user_id'})
+    users = tables['buda_users_public'][['user_id', 'first_name',
+                                         'last_name']]
+    leagues = tables['buda_leagues'][['league_id', 'league_name', 'season']]
+    ssr = rankings.merge(users, on='user_id', how='left').merge(
+        leagues, on='league_id')
+
+    captains = tables.get('captain_ratings')
+    if captains is not None:
+        user_column = first_column(captains, ['user_id', 'player_id'])
+        rank_column = first_column(captains, ['captain_rank', 'rank',
+                                              'rating'])
+        if user_column is None or rank_column is None or \
+                'league_id' not in captains.columns:
+            raise SqlDumpError(
+                'captain_ratings has no player, rank or league_id column: '
+                '{}'.format(', '.join(captains.columns)))
+        captain_rank = captains.groupby([user_column, 'league_id'])[
+            rank_column].mean().rename('captain_rank').reset_index()
+        captain_rank = captain_rank.rename(columns={user_column: 'user_id'})
+        ssr = ssr.merge(captain_rank, on=['user_id', 'league_id'],
+                        how='left')
+    else:
+        ssr['captain_rank'] = np.nan
+
+    ssr['league_id'] = ssr['league_id'].astype('float')
+    columns = ['user_id', 'league_id', 'league_name', 'season', 'rank_type',
+               'rank', 'captain_rank', 'first_name', 'last_name']
+    return ssr[columns]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Extract the rating tables from the buda_prod backup.')
+    parser.add_argument('dump', help='mysqldump file')
+    parser.add_argument('output', help='SQLite file, or a directory for '
+                                       'the columnar files with --columnar')
+    parser.add_argument('--columnar', action='store_true',
+                        help='write .npy column files instead of SQLite')
+    parser.add_argument('--self-ratings', metavar='PREFIX',
+                        help='also write PREFIX_selfcaptain_ratings.csv')
+    args = parser.parse_args()
+
+    if args.columnar:
+        writer = ColumnarWriter(args.output)
+    else:
+        writer = SqliteWriter(args.output)
+    for name, nrows in sorted(load_dump(args.dump, writer).items()):
+        print("{}: {} rows".format(name, nrows))
+
+    if args.self_ratings is not None:
+        ssr = self_captain_ratings(read_tables(args.output))
+        path = args.self_ratings + '_selfcaptain_ratings.csv'
+        ssr.to_csv(path, index=False)
+        print("Wrote {} self ratings to {}".format(len(ssr), path))
@@ -0,0 +1,410 @@
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+import rating_scale
+from self_rating_index import SelfRatingIndex, split_player_name
+
+
+"""
+
+Indexed SQLite copy of the BudaRating data model.
+
+A BudaRating keeps its history in memory and has to load the whole snapshot,
+and scrape the league list, before it can answer a question about one team.
+save_sqlite writes the same data to one SQLite file:
+
+    teams(team_id, league_id, type, rating)
+    players(player_id, name, last_key, first_key)
+    rosters(team_id, position, player_id)        roster order of each team
+    player_teams(player_id, team_id)             teams of each player
+    leagues(league_id, type)
+    draft_ranks, captain_ranks                   the SelfRatingIndex tables
+    allteams                                     the allteams table as is
+
+with indexes on team_id, league_id and player_id.  SqliteStore opens the
+file and answers check_league_type, predict_team and team_detail with one
+indexed query per team, returning the same results as the BudaRating
+methods, so a notebook or a batch job can look up a few teams or players in
+milliseconds without reading the history into memory:
+
+    buda.dump_sqlite('buda.sqlite')
+    store = sqlite_store.SqliteStore('buda.sqlite')
+    store.predict_team('40328')
+
+The self rating names are matched on keys normalized with the first name
+aliases in use when the file was saved.
+
+"""
+
+
+SQLITE_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE teams (team_id INTEGER PRIMARY KEY, league_id TEXT, type TEXT,
+                    rating REAL, rated INTEGER);
+CREATE TABLE players (player_id INTEGER PRIMARY KEY, name TEXT,
+                      last_key TEXT, first_key TEXT);
+CREATE TABLE rosters (team_id INTEGER, position INTEGER, player_id INTEGER);
+CREATE TABLE player_teams (player_id INTEGER, team_id INTEGER);
+CREATE TABLE leagues (league_id TEXT PRIMARY KEY, type TEXT);
+CREATE TABLE draft_ranks (league_key REAL, last_key TEXT, first_key TEXT,
+                          rank REAL);
+CREATE TABLE captain_ranks (league_key REAL, last_key TEXT, first_key TEXT,
+                            captain_rank REAL);
+"""
+
+INDEXES = """
+CREATE INDEX teams_league ON teams (league_id);
+CREATE UNIQUE INDEX players_name ON players (name);
+CREATE INDEX rosters_team ON rosters (team_id, position);
+CREATE INDEX player_teams_player ON player_teams (player_id, team_id);
+CREATE UNIQUE INDEX draft_ranks_key ON draft_ranks
+    (league_key, last_key, first_key);
+CREATE UNIQUE INDEX captain_ranks_key ON captain_ranks
+    (league_key, last_key, first_key);
+CREATE INDEX allteams_teamid ON allteams (teamid);
+"""
+
+# one row per roster spot with the player's ranks in the league and the
+# number and mean rating of their previous club teams
+PREDICT_TEAM_SQL = """
+SELECT p.name, d.rank, d.league_key IS NOT NULL, c.captain_rank,
+       c.league_key IS NOT NULL, COUNT(t.team_id), COUNT(t.rating),
+       AVG(t.rating)
+FROM rosters r
+JOIN players p ON p.player_id = r.player_id
+LEFT JOIN draft_ranks d ON d.league_key = ? AND d.last_key = p.last_key
+    AND d.first_key = p.first_key
+LEFT JOIN captain_ranks c ON c.league_key = ? AND c.last_key = p.last_key
+    AND c.first_key = p.first_key
+LEFT JOIN player_teams h ON h.player_id = r.player_id
+    AND h.team_id < r.team_id
+LEFT JOIN teams t ON t.team_id = h.team_id AND t.type = 'Club'
+WHERE r.team_id = ?
+GROUP BY r.position
+ORDER BY r.position
+"""
+
+# one row per roster spot with the count and mean rating of the player's
+# previous teams above and below the club rating threshold
+TEAM_DETAIL_SQL = """
+SELECT p.name, COUNT(h.team_id), SUM(t.rating > 500),
+       AVG(CASE WHEN t.rating > 500 THEN t.rating END),
+       SUM(t.rating <= 500), AVG(CASE WHEN t.rating <= 500 THEN t.rating END)
+FROM rosters r
+JOIN players p ON p.player_id = r.player_id
+LEFT JOIN player_teams h ON h.player_id = r.player_id
+    AND h.team_id < r.team_id
+LEFT JOIN teams t ON t.team_id = h.team_id
+WHERE r.team_id = ?
+GROUP BY r.position
+ORDER BY r.position
+"""
+
+
+def nan_to_none(values):
+    return [None if value is None or value != value else value
+            for value in values]
+
+
+def save_sqlite(buda, path):
+
+    """
+
+    :param buda: BudaRating with its history, allteams, league_meta and,
+        for hat leagues, self_ratings
+    :param path: SQLite file to write; replaced if it exists
+
+    """
+
+    # write into a temporary file so that a failed dump doesn't leave a
+    # half-written database behind
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    connection.executescript(SCHEMA)
+
+    history = buda.history
+    team_league = np.empty(len(history.team_ids), dtype='object')
+    counts = np.diff(history.league_offsets)
+    team_league[history.league_teams] = np.repeat(history.league_ids, counts)
+    allteams = buda.allteams.drop_duplicates('teamid')
+    team_type = pd.Series(allteams['type'].values,
+                          index=allteams['teamid'].astype('int64').values)
+    types = team_type.reindex(history.team_ids).values
+    connection.executemany(
+        'INSERT INTO teams VALUES (?, ?, ?, ?, ?)',
+        zip(history.team_ids.tolist(),
+            [None if league is None else str(league)
+             for league in team_league],
+            nan_to_none(types), nan_to_none(history.team_ratings.tolist()),
+            history.team_rated.astype('int').tolist()))
+
+    names = [str(name) for name in history.player_names]
+    keys = [split_player_name(name, buda.aliases) for name in names]
+    connection.executemany(
+        'INSERT INTO players VALUES (?, ?, ?, ?)',
+        [(i, name, last, first)
+         for i, (name, (last, first)) in enumerate(zip(names, keys))])
+
+    # roster order of each team, numbered from the start of its row
+    counts = np.diff(history.roster_offsets)
+    rows = np.repeat(np.arange(len(history.team_ids)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(
+        history.roster_offsets[:-1], counts)
+    connection.executemany(
+        'INSERT INTO rosters VALUES (?, ?, ?)',
+        zip(history.team_ids[rows].tolist(), positions.tolist(),
+            history.roster_players.tolist()))
+
+    connection.executemany(
+        'INSERT INTO player_teams VALUES (?, ?)',
+        zip(history.player_rows().tolist(),
+            history.team_ids[history.player_teams].tolist()))
+
+    connection.executemany(
+        'INSERT INTO leagues VALUES (?, ?)',
+        zip([str(league_id) for league_id in buda.league_meta.index],
+            nan_to_none(buda.league_meta['type'].tolist())))
+
+    if hasattr(buda, 'self_ratings'):
+        index = SelfRatingIndex(buda.self_ratings, buda.aliases)
+        connection.executemany(
+            'INSERT INTO draft_ranks VALUES (?, ?, ?, ?)',
+            zip(index.draft['league_key'].tolist(),
+                index.draft['last_key'].tolist(),
+                index.draft['first_key'].tolist(),
+                nan_to_none(index.draft['rank'].astype('float').tolist())))
+        connection.executemany(
+            'INSERT INTO captain_ranks VALUES (?, ?, ?, ?)',
+            zip(index.captain['league_key'].tolist(),
+                index.captain['last_key'].tolist(),
+                index.captain['first_key'].tolist(),
+                nan_to_none(index.captain['captain_rank'].astype(
+                    'float').tolist())))
+
+    buda.allteams.to_sql('allteams', connection, index=False)
+    connection.executescript(INDEXES)
+    connection.executemany('INSERT INTO meta VALUES (?, ?)',
+                           [('version', str(SQLITE_VERSION)),
+                            ('aliases', json.dumps(buda.aliases,
+                                                   sort_keys=True))])
+    connection.commit()
+    connection.close()
+
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+class SqliteStore(object):
+
+    """
+
+    Read-only queries against a file written by save_sqlite.
+
+    :param path: SQLite file
+    :param scale: RatingScale to convert self ratings to experience ratings
+
+    """
+
+    def __init__(self, path, scale=rating_scale.DEFAULT_SCALE):
+        if not os.path.exists(path):
+            raise IOError("{} does not exist".format(path))
+        self.connection = sqlite3.connect(path)
+        self.scale = scale
+        meta = dict(self.connection.execute('SELECT key, value FROM meta'))
+        if meta.get('version') != str(SQLITE_VERSION):
+            raise ValueError("{} has version {}, expected {}".format(
+                path, meta.get('version'), SQLITE_VERSION))
+        self.aliases = json.loads(meta['aliases'])
+
+    def close(self):
+        self.connection.close()
+
+    def team_league(self, team_id):
+
+        """
+
+        :return: (league id, team type) of the team
+        :raises KeyError: if the team isn't in the store
+
+        """
+
+        row = self.connection.execute(
+            'SELECT league_id, type FROM teams WHERE team_id = ?',
+            (int(team_id),)).fetchone()
+        if row is None:
+            raise KeyError(team_id)
+        return row
+
+    def check_league_type(self, team_id):
+        return self.team_league(team_id)[1]
+
+    def league_type(self, league_id):
+        row = self.connection.execute(
+            'SELECT type FROM leagues WHERE league_id = ?',
+            (str(league_id),)).fetchone()
+        if row is None:
+            raise KeyError(league_id)
+        return row[0]
+
+    def predict_team(self, team_id):
+
+        """
+
+        :param team_id: id of the team for which to predict a rating
+        :return: the same as BudaRating.predict_team
+
+        """
+
+        league_id = self.team_league(team_id)[0]
+        if league_id is None:
+            raise KeyError(team_id)
+        league_type = self.league_type(league_id)
+        league_key = float(league_id)
+        rows = self.connection.execute(
+            PREDICT_TEAM_SQL, (league_key, league_key, int(team_id)))
+
+        experience_rating = []
+        draft_rating = []
+        captain_rating = []
+        okplayers = []
+
+        n_captain = 0
+        n_experience = 0
+        n_captainexperience = 0
+
+        for player, rank, has_rank, captain_rank, has_captain, nclub, \
+                nrated, mean_rating in rows:
+            captain_or_experience = False
+
+            if player == '':
+                continue
+
+            okplayers.append(player)
+
+            if league_type == 'Hat':
+                # a rating row without a rank is NaN, no row at all is 50
+                if not has_rank:
+                    draft_rating.append(50)
+                else:
+                    draft_rating.append(np.nan if rank is None else rank)
+
+                if has_captain and captain_rank is not None:
+                    captain_rating.append(captain_rank)
+                    n_captain += 1
+                    captain_or_experience = True
+                else:
+                    captain_rating.append(draft_rating[-1])
+            else:
+                draft_rating.append(-1)
+                captain_rating.append(-1)
+
+            if nclub == 0:
+                if captain_rating[-1] * 0 == 0:
+                    adjust_rating = self.scale.to_experience(
+                        captain_rating[-1])
+                else:
+                    adjust_rating = self.scale.to_experience(
+                        draft_rating[-1])
+                experience_rating.append(int(adjust_rating))
+            else:
+                # an unrated previous club team makes the mean NaN
+                if nrated < nclub:
+                    mean_rating = np.nan
+                experience_rating.append(mean_rating)
+                captain_or_experience = True
+                n_experience += 1
+
+            if captain_or_experience:
+                n_captainexperience += 1
+
+        self_rating = 2 * np.array(draft_rating) - np.array(captain_rating)
+
+        df_rating = pd.DataFrame({
+            'name': okplayers,
+            'draft_rating': draft_rating,
+            'captain_rating': captain_rating,
+            'self_rating': self_rating,
+            'experience_rating': experience_rating})
+        return df_rating, n_captain, n_experience, n_captainexperience
+
+    def team_detail(self, team_id):
+
+        """
+
+        :param team_id: id of the team for which to generate detailed report
+        :return: the same as BudaRating.team_detail
+
+        """
+
+        players = []
+        nclubseasons = []
+        nhatseasons = []
+        avgclubrating = []
+        avghatrating = []
+
+        rows = self.connection.execute(TEAM_DETAIL_SQL, (int(team_id),))
+        for player, nteams, nclub, club, nhat, hat in rows:
+            players.append(player)
+            if nteams == 0:
+                avgclubrating.append(800)
+                avghatrating.append(0)
+                nclubseasons.append(0)
+                nhatseasons.append(0)
+                continue
+
+            nclub = nclub or 0
+            nhat = nhat or 0
+            nclubseasons.append(nclub)
+            # unrated teams are below the threshold too, and make the mean
+            # hat rating NaN
+            nhatseasons.append(nteams - nclub)
+            avgclubrating.append(club if nclub > 0 else 800)
+            if nteams - nclub > nhat:
+                avghatrating.append(np.nan)
+            else:
+                avghatrating.append(hat if nhat > 0 else 0)
+
+        result = pd.DataFrame({'player': players,
+                               'club_rating': avgclubrating,
+                               'hat_rating': avghatrating,
+                               'nclub': nclubseasons,
+                               'nhat': nhatseasons})
+        return result
+
+    def player_teams(self, player):
+
+        """
+
+        :param player: player name
+        :return: rows of allteams for the player's teams, ordered by team id
+
+        """
+
+        return pd.read_sql(
+            'SELECT a.* FROM players p '
+            'JOIN player_teams h ON h.player_id = p.player_id '
+            'JOIN allteams a ON a.teamid = h.team_id '
+            'WHERE p.name = ? ORDER BY h.team_id',
+            self.connection, params=(player,))
+
+    def league_teams(self, league_id):
+
+        """
+
+        :return: ids of the teams in the league, as strings
+
+        """
+
+        rows = self.connection.execute(
+            'SELECT team_id FROM teams WHERE league_id = ? ORDER BY team_id',
+            (str(league_id),))
+        return [str(row[0]) for row in rows]
@@ -0,0 +1,463 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+from history_store import HistoryStore
+from scrape_buda import define_ratings, observed_rating
+
+
+"""
+
+Seeded synthetic BUDA league histories for load and scaling tests.
+
+Every player has a latent skill that drifts from year to year.  Each year a
+fraction of the players leave the league and are replaced by new ones.  Hat
+leagues draw their players at random from the active players and split them
+into teams with a snake draft on their self ratings, so the teams come out
+roughly even.  Club teams persist from season to season: each club keeps
+most of its roster, replaces the rest from the players that are still free,
+and the clubs are then ranked by skill into the divisions, which gives
+promotion and relegation.  Points are won with a logistic probability of the
+difference between the teams' average skills.
+
+generate() returns the same structures the scraper builds:
+
+ - league_meta: league ids, names, seasons, types and years
+ - league_teams, team_players, player_teams and team_rating dictionaries
+ - allteams: one row per team
+ - self_ratings: the rows of _selfcaptain_ratings.csv for the hat leagues
+ - games: one row per game
+
+write_snapshot() saves them the way dump_buda does, so load_buda can read
+them, and write_scores() writes the scores_{leagueid}.csv files the way
+scrape_buda does.  At the default settings the history is roughly the size
+of the real one since 2002; leagues_per_season and nplayers scale it up.
+
+"""
+
+
+# seasons of each year with the type of their league
+SEASONS = [('Spring', 'Hat'), ('Summer', 'Club'), ('Fall', 'Club'),
+           ('Winter', 'Hat')]
+
+DIVISIONS = {'Hat': ['JP Mixed (4/3)'],
+             'Club': ['4/3 Div 1', '4/3 Div 2', '4/3 Div 3', '5/2 Div 1',
+                      '5/2 Div 2', 'Open Div 1']}
+
+GAME_COLUMNS = ['league', 'divname', 'Team A', 'Team B', 'Score A',
+                'Score B']
+
+
+def player_name(player):
+    return 'Last{0:07d}, First{0:07d}'.format(player)
+
+
+def snake_draft(order, nteams):
+
+    """
+
+    :param order: players from the first pick to the last
+    :param nteams: number of teams
+    :return: team of each player in order, picking back and forth
+
+    """
+
+    pick = np.arange(len(order))
+    rnd = pick // nteams
+    slot = pick % nteams
+    return np.where(rnd % 2 == 0, slot, nteams - 1 - slot)
+
+
+def self_ranks(skill, random_state, noise=8.):
+
+    """
+
+    :param skill: skill of each player
+    :return: self ranks on the 0 to 100 scale of the registration form
+
+    """
+
+    ranks = 50 + 15 * skill + random_state.normal(0, noise, len(skill))
+    return np.clip(np.round(ranks), 0, 100)
+
+
+def play_division(skill, ngames, random_state, steepness=1.,
+                  points=(15, 25)):
+
+    """
+
+    :param skill: average skill of each team in the division
+    :param ngames: number of games each team plays
+    :param random_state: RandomState
+    :param steepness: how quickly the chance of winning a point rises with
+        the skill difference
+    :param points: range of the number of points in a game
+    :return: positions of team A and team B and the score of each team for
+        every game
+
+    """
+
+    nteams = len(skill)
+    ngames = min(ngames, nteams - 1)
+    if ngames < 1:
+        empty = np.zeros(0, dtype='int')
+        return empty, empty, empty, empty
+
+    # a round robin shifted by random offsets, so every team plays ngames
+    # games against different opponents
+    offsets = random_state.choice(np.arange(1, nteams), ngames, replace=False)
+    team_a = np.repeat(np.arange(nteams), ngames)
+    team_b = (team_a + np.tile(offsets, nteams)) % nteams
+    keep = team_a < team_b
+    keep |= ~np.isin(team_a * nteams + team_b, team_b * nteams + team_a)
+    team_a = team_a[keep]
+    team_b = team_b[keep]
+
+    p = 1 / (1 + np.exp(-steepness * (skill[team_a] - skill[team_b])))
+    total = random_state.randint(points[0], points[1] + 1, len(team_a))
+    score_a = random_state.binomial(total, p)
+    return team_a, team_b, score_a, total - score_a
+
+
+def generate(nplayers=8000, first_year=2002, last_year=2016, seasons=SEASONS,
+             divisions=DIVISIONS, leagues_per_season=1, teams_per_division=8,
+             roster_size=15, games_per_team=7, player_churn=0.15,
+             roster_churn=0.3, skill_drift=0.1, captain_fraction=0.45,
+             unrated_fraction=0.05, seed=0):
+
+    """
+
+    :param nplayers: number of active players in any year, split evenly
+        between the leagues_per_season communities
+    :param first_year: first year of the history
+    :param last_year: last year of the history
+    :param seasons: list of (season, league type) of each year
+    :param divisions: dictionary of league type to division names, best
+        first
+    :param leagues_per_season: number of leagues of each season and year
+    :param teams_per_division: number of teams in each division
+    :param roster_size: number of players on each team
+    :param games_per_team: number of games each team plays
+    :param player_churn: fraction of players replaced by new ones each year
+    :param roster_churn: fraction of a club's roster replaced each season
+    :param skill_drift: standard deviation of the yearly change in skill
+    :param captain_fraction: fraction of hat players with a captain rank
+    :param unrated_fraction: fraction of hat players without a self rating
+    :param seed: random seed
+    :return: dictionary with league_meta, league_teams, team_players,
+        player_teams, team_rating, allteams, self_ratings and games
+
+    """
+
+    random_state = np.random.RandomState(seed)
+    div_ratings = define_ratings()
+
+    nyears = last_year - first_year + 1
+    nnew = int(round(player_churn * nplayers))
+    capacity = nplayers + nnew * nyears
+    skill = random_state.normal(0, 1, capacity)
+    active = np.zeros(capacity, dtype='bool')
+    active[:nplayers] = True
+    nborn = nplayers
+
+    # the leagues of the same season draw from separate communities of
+    # players, every leagues_per_season-th player, so that the work per
+    # league doesn't grow with the total number of players
+    ncommunity = nplayers // leagues_per_season
+    for league_type, names in divisions.items():
+        nleague = len(names) * teams_per_division * roster_size
+        if nleague > ncommunity:
+            raise ValueError("{} players are needed for a {} league but only "
+                             "{} are active in each of its communities".format(
+                                 nleague, league_type, ncommunity))
+
+    # roster of every club from its last season, per community
+    clubs = {}
+
+    leagues = []
+    league_teams = {}
+    team_players = {}
+    player_teams = {}
+    team_rating = {}
+    teams = []
+    self_ratings = []
+    games = dict((column, []) for column in GAME_COLUMNS)
+
+    leagueid = 10000
+    teamid = 100000
+    for year in range(first_year, last_year + 1):
+
+        # players leave and new ones join, and everyone's skill drifts
+        if year > first_year:
+            leaving = np.nonzero(active)[0]
+            leaving = random_state.choice(leaving, nnew, replace=False)
+            active[leaving] = False
+            active[nborn:nborn + nnew] = True
+            nborn += nnew
+            skill[:nborn] += random_state.normal(0, skill_drift, nborn)
+
+        for season, league_type in seasons:
+            names = divisions[league_type]
+            ratings = div_ratings.get('{} {}'.format(season, league_type), {})
+            nteams = len(names) * teams_per_division
+
+            for copy in range(leagues_per_season):
+                leagueid += 1
+                leagues.append((str(leagueid), '{} {} League {}'.format(
+                    season, league_type, year), season, league_type, year))
+
+                community = slice(copy, None, leagues_per_season)
+                if league_type == 'Hat':
+                    rosters, team_names = hat_rosters(
+                        active[community], skill[community], nteams,
+                        roster_size, random_state)
+                else:
+                    rosters, team_names = club_rosters(
+                        clubs.setdefault(copy, {}), active[community],
+                        skill[community], nteams, roster_size, roster_churn,
+                        random_state)
+                rosters = [copy + leagues_per_season * roster
+                           for roster in rosters]
+
+                ids = np.arange(teamid + 1, teamid + nteams + 1)
+                teamid += nteams
+                league_teams[str(leagueid)] = [str(i) for i in ids]
+                team_skill = np.array([skill[roster].mean()
+                                       for roster in rosters])
+
+                plusminus = np.zeros(nteams)
+                ngames = np.zeros(nteams)
+                for idiv, divname in enumerate(names):
+                    div = slice(idiv * teams_per_division,
+                                (idiv + 1) * teams_per_division)
+                    team_a, team_b, score_a, score_b = play_division(
+                        team_skill[div], games_per_team, random_state)
+                    team_a += div.start
+                    team_b += div.start
+                    np.add.at(plusminus, team_a, score_a - score_b)
+                    np.add.at(plusminus, team_b, score_b - score_a)
+                    np.add.at(ngames, team_a, 1)
+                    np.add.at(ngames, team_b, 1)
+                    games['league'].append([str(leagueid)] * len(team_a))
+                    games['divname'].append([divname] * len(team_a))
+                    games['Team A'].append(team_names[team_a])
+                    games['Team B'].append(team_names[team_b])
+                    games['Score A'].append(score_a)
+                    games['Score B'].append(score_b)
+                plusminus /= np.maximum(ngames, 1)
+
+                for position, (i, name, roster) in enumerate(
+                        zip(ids, team_names, rosters)):
+                    divname = names[position // teams_per_division]
+                    divrating = ratings.get(divname, 0)
+                    roster_names = [player_name(player) for player in roster]
+                    team_players[str(i)] = roster_names
+                    for player in roster_names:
+                        player_teams.setdefault(player, []).append(str(i))
+                    team_rating[str(i)] = None
+                    if divrating > 0:
+                        team_rating[str(i)] = observed_rating(
+                            divrating, plusminus[position])
+                    teams.append((i, name, season, league_type, year,
+                                  divname, divrating, plusminus[position]))
+
+                if league_type == 'Hat':
+                    self_ratings.append(hat_self_ratings(
+                        leagueid, np.concatenate(rosters), skill,
+                        captain_fraction, unrated_fraction, random_state))
+
+    league_meta = pd.DataFrame.from_records(
+        leagues, columns=['id', 'name', 'season', 'type', 'year'])
+    allteams = pd.DataFrame.from_records(
+        teams, columns=['teamid', 'teamname', 'season', 'type', 'year',
+                        'divname', 'divrating', 'plusminus'])
+    return {'league_meta': league_meta.set_index('id'),
+            'league_teams': league_teams,
+            'team_players': team_players,
+            'player_teams': player_teams,
+            'team_rating': team_rating,
+            'allteams': allteams,
+            'self_ratings': pd.concat(self_ratings, ignore_index=True),
+            'games': pd.DataFrame(dict(
+                (column, np.concatenate(values))
+                for column, values in games.items()),
+                columns=GAME_COLUMNS)}
+
+
+def hat_rosters(active, skill, nteams, roster_size, random_state):
+
+    """
+
+    :return: list of the players of each team, drafted on noisy skill, and
+        the array of team names
+
+    """
+
+    pool = random_state.choice(np.nonzero(active)[0], nteams * roster_size,
+                               replace=False)
+    order = pool[np.argsort(-(skill[pool] +
+                              random_state.normal(0, 0.3, len(pool))))]
+    team = snake_draft(order, nteams)
+    rosters = [order[team == i] for i in range(nteams)]
+    team_names = np.array(['Team {0:02d} ({0:02d})'.format(i + 1)
+                           for i in range(nteams)], dtype='object')
+    return rosters, team_names
+
+
+def club_rosters(clubs, active, skill, nteams, roster_size, roster_churn,
+                 random_state):
+
+    """
+
+    :param clubs: dictionary of club name to its last roster, updated with
+        the new rosters and filled up to nteams clubs
+    :return: list of the players of each team, best team first, and the
+        array of team names
+
+    """
+
+    while len(clubs) < nteams:
+        clubs['Club {:05d}'.format(len(clubs) + 1)] = np.zeros(0, dtype='int')
+
+    taken = np.zeros(len(active), dtype='bool')
+    kept = {}
+    for name in sorted(clubs):
+        roster = clubs[name]
+        roster = roster[active[roster]]
+        roster = roster[random_state.uniform(size=len(roster)) >= roster_churn]
+        kept[name] = roster
+        taken[roster] = True
+
+    # open spots go to the free players, the best clubs picking first
+    free = np.nonzero(active & ~taken)[0]
+    free = free[np.argsort(-(skill[free] +
+                             random_state.normal(0, 0.5, len(free))))]
+    strength = dict((name, skill[roster].mean() if len(roster) else -np.inf)
+                    for name, roster in kept.items())
+    start = 0
+    for name in sorted(kept, key=lambda name: -strength[name]):
+        nopen = roster_size - len(kept[name])
+        kept[name] = np.concatenate([kept[name], free[start:start + nopen]])
+        start += nopen
+        clubs[name] = kept[name]
+
+    # promotion and relegation: divisions are filled from the best club down
+    team_names = sorted(kept, key=lambda name: -skill[kept[name]].mean())
+    rosters = [kept[name] for name in team_names]
+    return rosters, np.array(team_names, dtype='object')
+
+
+def hat_self_ratings(leagueid, players, skill, captain_fraction,
+                     unrated_fraction, random_state):
+
+    """
+
+    :return: self rating rows of the players of a hat league, in the format
+        of _selfcaptain_ratings.csv.  The rank of a player with a captain
+        rank is the average of their self rank and captain rank, as on the
+        registration site.
+
+    """
+
+    players = players[random_state.uniform(size=len(players)) >=
+                      unrated_fraction]
+    self_rank = self_ranks(skill[players], random_state)
+    captain_rank = self_ranks(skill[players], random_state)
+    captain_rank[random_state.uniform(size=len(players)) >=
+                 captain_fraction] = np.nan
+    rank = np.where(np.isnan(captain_rank), self_rank,
+                    np.round((self_rank + captain_rank) / 2))
+    names = [player_name(player).split(', ') for player in players]
+    return pd.DataFrame({
+        'user_id': players, 'league_id': float(leagueid), 'rank_type': 1,
+        'rank': rank, 'captain_rank': captain_rank,
+        'last_name': [last for last, first in names],
+        'first_name': [first for last, first in names]},
+        columns=['user_id', 'league_id', 'rank_type', 'rank', 'captain_rank',
+                 'first_name', 'last_name'])
+
+
+def write_snapshot(data, prefix):
+
+    """
+
+    :param data: output of generate
+    :param prefix: prefix to pass to load_buda
+
+    """
+
+    history = HistoryStore.from_dicts(data['player_teams'],
+                                      data['team_players'],
+                                      data['team_rating'],
+                                      data['league_teams'])
+    snapshot.save_snapshot(prefix + '_snapshot', history,
+                           {'allteams': data['allteams'],
+                            'self_ratings': data['self_ratings']})
+
+
+def league_scores(games):
+
+    """
+
+    :param games: games of one league from generate
+    :return: the league's schedule in the format scrape_buda writes, with
+        every game listed under both teams
+
+    """
+
+    columns = ['Team A', 'Team B', 'divname', 'Score A', 'Score B']
+    swapped = games.rename(columns={'Team A': 'Team B', 'Team B': 'Team A',
+                                    'Score A': 'Score B',
+                                    'Score B': 'Score A'})
+    scores = pd.concat([games[columns], swapped[columns]])
+    return scores.sort_values(['Team A', 'Team B'], kind='mergesort')
+
+
+def write_scores(data, scores_dir, leagueids=None):
+
+    """
+
+    :param data: output of generate
+    :param scores_dir: directory to write the scores_{leagueid}.csv files to
+    :param leagueids: leagues to write, defaults to all of them
+
+    """
+
+    if not os.path.exists(scores_dir):
+        os.makedirs(scores_dir)
+    if leagueids is None:
+        leagueids = data['league_meta'].index
+    leagueids = set(leagueids)
+    for leagueid, games in data['games'].groupby('league'):
+        if leagueid not in leagueids:
+            continue
+        path = os.path.join(scores_dir, 'scores_{}.csv'.format(leagueid))
+        league_scores(games).to_csv(path, index=False)
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Write a synthetic BUDA history for load_buda and the '
+                    'scores readers.')
+    parser.add_argument('prefix', help='prefix of the snapshot')
+    parser.add_argument('--scores-dir', help='directory for the league '
+                                             'schedules, not written by '
+                                             'default')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiplier of the players and leagues')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    data = generate(nplayers=8000 * args.scale,
+                    leagues_per_season=args.scale, seed=args.seed)
+    write_snapshot(data, args.prefix)
+    if args.scores_dir is not None:
+        write_scores(data, args.scores_dir)
+    print("Wrote {} leagues, {} teams and {} players".format(
+        len(data['league_meta']), len(data['allteams']),
+        len(data['player_teams'])))
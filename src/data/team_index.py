@@ -0,0 +1,87 @@
+import numpy as np
+
+
+"""
+
+Lookup tables for the questions that the prediction code asks about every
+previous team of every player: which league is this team in, is it a club
+team, and what is its rating.
+
+Answering those by scanning league_teams or allteams each time made a full
+predicted_rating pass quadratic in the size of the database.  The index is
+built once after the data is scraped or loaded.  Team ids are kept as a
+sorted integer array with the league type and rating of each team in arrays
+aligned to it, so a whole list of previous teams can be looked up with one
+np.searchsorted call.
+
+"""
+
+
+class TeamIndex(object):
+
+    """
+
+    :param league_teams: dictionary of league id to list of team ids
+    :param allteams: dataframe with one row per team, with teamid and type
+        columns
+    :param team_rating: dictionary of team id to team rating
+
+    """
+
+    def __init__(self, league_teams, allteams, team_rating):
+
+        # team id -> league id
+        self.team_league = {}
+        for league_id in league_teams:
+            for team_id in league_teams[league_id]:
+                self.team_league[str(team_id)] = league_id
+
+        # some teams have a rating but were dropped from allteams, so index
+        # the union of both
+        allteams = allteams.drop_duplicates('teamid')
+        allteamids = allteams['teamid'].astype('int').values
+        ids = set(allteamids) | set(int(team_id) for team_id in team_rating)
+        self.team_ids = np.array(sorted(ids), dtype='int')
+
+        # league type of each team, None if the team isn't in allteams
+        self.types = np.empty(len(self.team_ids), dtype='object')
+        self.types[self.positions(allteamids)] = allteams['type'].values
+        self.club = self.types == 'Club'
+
+        # rating of each team, NaN if the team has no rating
+        self.ratings = np.full(len(self.team_ids), np.nan)
+        for team_id in team_rating:
+            if team_rating[team_id] is not None:
+                self.ratings[self.position(team_id)] = team_rating[team_id]
+
+    def positions(self, team_ids):
+
+        """
+
+        :param team_ids: array of team ids
+        :return: position of each team in the index arrays
+
+        """
+
+        team_ids = np.asarray(team_ids).astype('int')
+        positions = np.searchsorted(self.team_ids, team_ids)
+        found = positions < len(self.team_ids)
+        found[found] = self.team_ids[positions[found]] == team_ids[found]
+        if not found.all():
+            raise KeyError(team_ids[~found][0])
+        return positions
+
+    def position(self, team_id):
+        return self.positions([team_id])[0]
+
+    def league(self, team_id):
+        return self.team_league[str(team_id)]
+
+    def team_type(self, team_id):
+        return self.types[self.position(team_id)]
+
+    def is_club(self, team_ids):
+        return self.club[self.positions(team_ids)]
+
+    def team_ratings(self, team_ids):
+        return self.ratings[self.positions(team_ids)]
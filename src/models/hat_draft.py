@@ -0,0 +1,387 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+"""
+
+Split a hat league's players into evenly matched teams.
+
+A team's predicted strength is the mean rating of its players, as in
+predicted_rating, so the draft minimizes the spread of the team means:
+
+    sum over teams of (mean rating of the team - mean rating of everyone) ** 2
+
+Players who have to play together (baggage) are drafted as one unit.
+Every team gets its share of the women, and the team sizes differ by at
+most one; both are kept fixed by only ever swapping units of the same size
+and gender mix between two teams.  Pairs of players who should be kept
+apart add a penalty for every team they share.
+
+The search is simulated annealing over such swaps.  Each team's rating sum
+is kept up to date, so the change in the objective from a swap involves
+only the two teams' sums and the swapped units' ratings, plus the apart
+partners of the two units, and costs O(1) however large the league.
+
+"""
+
+
+def find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def draft_units(nplayers, together=()):
+
+    """
+
+    :param nplayers: number of players
+    :param together: pairs of player positions that must be on the same team
+    :return: unit of each player, numbered from 0
+
+    """
+
+    parent = list(range(nplayers))
+    for i, j in together:
+        root_i = find(parent, i)
+        root_j = find(parent, j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(parent, i) for i in range(nplayers)], dtype='int')
+    return np.unique(roots, return_inverse=True)[1]
+
+
+def initial_teams(size, women, rating, nteams):
+
+    """
+
+    Deal the units out so that every team gets its share of players and
+    women, strongest units first.
+
+    :param size: number of players in each unit
+    :param women: number of women in each unit
+    :param rating: rating sum of each unit
+    :param nteams: number of teams
+    :return: team of each unit
+    :raises ValueError: if the units can't be split into teams whose sizes
+        and numbers of women differ by at most one
+
+    """
+
+    nunits = len(size)
+    team = np.full(nunits, -1, dtype='int')
+    team_size = np.zeros(nteams, dtype='int')
+    team_women = np.zeros(nteams, dtype='int')
+    team_sum = np.zeros(nteams)
+    max_size = -(-size.sum() // nteams)
+    max_women = -(-women.sum() // nteams)
+
+    # big units and units with women first, so that they still fit
+    order = np.lexsort((-rating / size, -women, -size))
+    for unit in order:
+        fits = (team_size + size[unit] <= max_size) & \
+            (team_women + women[unit] <= max_women)
+        if not fits.any():
+            raise ValueError("Unable to fit a group of {} players with {} "
+                             "women onto any team".format(size[unit],
+                                                          women[unit]))
+        # units with women go to the team with the fewest women, the others
+        # to the team with the fewest players, then the weakest team
+        candidates = np.nonzero(fits)[0]
+        if women[unit] > 0:
+            keys = (team_sum[candidates], team_size[candidates],
+                    team_women[candidates])
+        else:
+            keys = (team_sum[candidates], team_size[candidates])
+        best = candidates[np.lexsort(keys)[0]]
+        team[unit] = best
+        team_size[best] += size[unit]
+        team_women[best] += women[unit]
+        team_sum[best] += rating[unit]
+    return team
+
+
+class DraftState(object):
+
+    """
+
+    Team assignment of the units with the running sums needed to score a
+    swap in O(1).
+
+    :param unit_sum: rating sum of each unit
+    :param unit_size: number of players in each unit
+    :param team: team of each unit
+    :param nteams: number of teams
+    :param apart: dictionary of unit to the list of units it should not
+        share a team with, with repeats for several pairs
+    :param apart_penalty: objective cost of each pair sharing a team
+
+    """
+
+    def __init__(self, unit_sum, unit_size, team, nteams, apart=None,
+                 apart_penalty=1.):
+        self.unit_sum = [float(value) for value in unit_sum]
+        self.team = [int(value) for value in team]
+        self.apart = apart or {}
+        self.apart_penalty = apart_penalty
+        self.target = float(np.sum(unit_sum)) / np.sum(unit_size)
+        self.team_sum = [0.] * nteams
+        self.team_size = [0] * nteams
+        for unit, team_id in enumerate(self.team):
+            self.team_sum[team_id] += self.unit_sum[unit]
+            self.team_size[team_id] += int(unit_size[unit])
+        self.objective = self.total()
+
+    def deviation(self, team_sum, team_size):
+        return (team_sum / team_size - self.target) ** 2
+
+    def conflicts(self, unit, team_id, skip=None):
+        return sum(1 for other in self.apart.get(unit, ())
+                   if other != skip and self.team[other] == team_id)
+
+    def total(self):
+        spread = sum(self.deviation(team_sum, team_size)
+                     for team_sum, team_size in zip(self.team_sum,
+                                                    self.team_size)
+                     if team_size > 0)
+        nconflicts = sum(self.conflicts(unit, self.team[unit])
+                         for unit in self.apart) / 2.
+        return spread + self.apart_penalty * nconflicts
+
+    def swap_delta(self, u, v):
+
+        """
+
+        :return: change in the objective from swapping units u and v, which
+            are on different teams and have the same size
+
+        """
+
+        a = self.team[u]
+        b = self.team[v]
+        shift = self.unit_sum[v] - self.unit_sum[u]
+        size_a = self.team_size[a]
+        size_b = self.team_size[b]
+        delta = self.deviation(self.team_sum[a] + shift, size_a) + \
+            self.deviation(self.team_sum[b] - shift, size_b) - \
+            self.deviation(self.team_sum[a], size_a) - \
+            self.deviation(self.team_sum[b], size_b)
+        if self.apart:
+            delta += self.apart_penalty * (
+                self.conflicts(u, b, skip=v) - self.conflicts(u, a) +
+                self.conflicts(v, a, skip=u) - self.conflicts(v, b))
+        return delta
+
+    def swap(self, u, v, delta):
+        a = self.team[u]
+        b = self.team[v]
+        shift = self.unit_sum[v] - self.unit_sum[u]
+        self.team_sum[a] += shift
+        self.team_sum[b] -= shift
+        self.team[u] = b
+        self.team[v] = a
+        self.objective += delta
+
+
+def anneal(state, classes, nsteps, t_start, t_end, random_state):
+
+    """
+
+    :param state: DraftState to improve in place
+    :param classes: list of arrays of units that can be swapped with each
+        other, each with at least two units
+    :param nsteps: number of proposed swaps
+    :param t_start: starting temperature
+    :param t_end: final temperature, reached geometrically
+    :param random_state: RandomState
+    :return: best team of each unit found
+
+    """
+
+    best_team = list(state.team)
+    best = state.objective
+    if len(classes) == 0 or nsteps == 0:
+        return best_team
+
+    # classes are picked in proportion to their number of units
+    weights = np.array([len(units) for units in classes], dtype='float')
+    classes = [list(units) for units in classes]
+    cooling = (t_end / t_start) ** (1. / max(nsteps - 1, 1))
+    temperature = t_start
+
+    nchunk = 4096
+    for start in range(0, nsteps, nchunk):
+        n = min(nchunk, nsteps - start)
+        picks = random_state.choice(len(classes), n, p=weights /
+                                    weights.sum())
+        first = random_state.uniform(size=n)
+        second = random_state.uniform(size=n)
+        accept = random_state.uniform(size=n)
+        for step in range(n):
+            units = classes[picks[step]]
+            u = units[int(first[step] * len(units))]
+            v = units[int(second[step] * len(units))]
+            temperature *= cooling
+            if state.team[u] == state.team[v]:
+                continue
+            delta = state.swap_delta(u, v)
+            if delta <= 0 or accept[step] < math.exp(-delta / temperature):
+                state.swap(u, v, delta)
+                if state.objective < best - 1e-12:
+                    best = state.objective
+                    best_team = list(state.team)
+    return best_team
+
+
+def balance_teams(pool, nteams, rating='ensemble_rating', gender=None,
+                  together=(), apart=(), nsteps=200000, t_start=None,
+                  t_end=None, apart_penalty=None, seed=None):
+
+    """
+
+    :param pool: dataframe with one row per player, such as the roster table
+        of batch_predict.predict_teams or the output of league_pool
+    :param nteams: number of teams
+    :param rating: column with the rating of each player; a team's strength
+        is the mean of it.  Missing ratings are filled with the mean.
+    :param gender: optional column that is 'F' for women; every team gets an
+        equal share of them
+    :param together: pairs of row positions in pool of players who must be
+        on the same team
+    :param apart: pairs of row positions of players who should not be
+    :param nsteps: number of swaps to try
+    :param t_start: starting temperature, defaults to the objective change of
+        a typical swap
+    :param t_end: final temperature, defaults to t_start / 1e4
+    :param apart_penalty: cost of a pair sharing a team, defaults to ten
+        times the variance of the ratings, which outweighs any spread
+    :param seed: random seed
+    :return: copy of pool with the team of each player, numbered from 1
+
+    """
+
+    random_state = np.random.RandomState(seed)
+    ratings = pool[rating].values.astype('float')
+    ratings = np.where(np.isfinite(ratings), ratings,
+                       np.nanmean(ratings) if np.isfinite(ratings).any()
+                       else 0.)
+    nplayers = len(pool)
+    if gender is None:
+        is_woman = np.zeros(nplayers, dtype='int')
+    else:
+        is_woman = (pool[gender].values == 'F').astype('int')
+
+    unit = draft_units(nplayers, together)
+    nunits = unit.max() + 1 if nplayers > 0 else 0
+    unit_size = np.bincount(unit, minlength=nunits)
+    unit_women = np.bincount(unit, weights=is_woman,
+                             minlength=nunits).astype('int')
+    unit_sum = np.bincount(unit, weights=ratings, minlength=nunits)
+
+    team = initial_teams(unit_size, unit_women, unit_sum, nteams)
+
+    unit_apart = {}
+    for i, j in apart:
+        if unit[i] == unit[j]:
+            raise ValueError("Players {} and {} have to be both together and "
+                             "apart".format(i, j))
+        unit_apart.setdefault(unit[i], []).append(unit[j])
+        unit_apart.setdefault(unit[j], []).append(unit[i])
+
+    variance = ratings.var() if nplayers > 1 else 1.
+    if apart_penalty is None:
+        apart_penalty = 10 * max(variance, 1e-12)
+    state = DraftState(unit_sum, unit_size, team, nteams, unit_apart,
+                       apart_penalty)
+
+    # units can only swap with units of the same size and number of women
+    signature = unit_size * (unit_women.max() + 1 if nunits else 1) + \
+        unit_women
+    classes = [np.nonzero(signature == value)[0]
+               for value in np.unique(signature)]
+    classes = [units for units in classes if len(units) > 1]
+
+    if t_start is None:
+        # a typical swap moves a team mean by about sd / team size
+        team_size = max(nplayers // max(nteams, 1), 1)
+        t_start = 2 * variance / team_size ** 2 if variance > 0 else 1.
+    if t_end is None:
+        t_end = t_start / 1e4
+    best_team = anneal(state, classes, nsteps, t_start, t_end, random_state)
+
+    drafted = pool.copy()
+    drafted['team'] = np.array(best_team)[unit] + 1
+    return drafted
+
+
+def team_summary(drafted, rating='ensemble_rating', gender=None):
+
+    """
+
+    :param drafted: output of balance_teams
+    :return: dataframe with the size, mean rating and number of women of
+        each team
+
+    """
+
+    groups = drafted.groupby('team')
+    summary = pd.DataFrame({'players': groups.size(),
+                            'rating': groups[rating].mean()})
+    if gender is not None:
+        summary['women'] = groups[gender].apply(
+            lambda values: (values == 'F').sum())
+    return summary
+
+
+def league_pool(buda, leagueid):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param leagueid: id of a hat league
+    :return: the roster table of batch_predict.predict_teams for the
+        players of that league, with their draft, captain, self, experience
+        and ensemble ratings, one row per player; teamid is the team they
+        actually played on
+
+    """
+
+    # src/data is on the path whenever there is a BudaRating
+    import batch_predict
+
+    team_ids = np.array(buda.league_teams[leagueid], dtype='int64')
+    teams, roster = batch_predict.predict_teams(
+        buda, team_ids, buda.scale.to_experience, buda.scale.to_self)
+    roster = roster.drop('team', axis=1).drop_duplicates('name')
+    return roster.reset_index(drop=True)
+
+
+if __name__ == '__main__':
+
+    import sys
+    from timeit import default_timer
+
+    # a Spring Hat sized league of random players
+    nplayers = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    nteams = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    random_state = np.random.RandomState(0)
+    pool = pd.DataFrame({
+        'name': ['Player {}'.format(i) for i in range(nplayers)],
+        'ensemble_rating': random_state.normal(50, 12, nplayers),
+        'gender': np.where(random_state.uniform(size=nplayers) < 0.4,
+                           'F', 'M')})
+    together = [(i, i + 1) for i in range(0, 20, 2)]
+    apart = [(i, i + 1) for i in range(20, 40, 2)]
+
+    start = default_timer()
+    drafted = balance_teams(pool, nteams, gender='gender', together=together,
+                            apart=apart, seed=0)
+    seconds = default_timer() - start
+    summary = team_summary(drafted, gender='gender')
+    print(summary.to_string())
+    print("Spread of team ratings {:.3f} (sd {:.3f}) in {:.1f} seconds".format(
+        summary['rating'].max() - summary['rating'].min(),
+        summary['rating'].std(), seconds))
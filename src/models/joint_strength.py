@@ -0,0 +1,299 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from team_strength import PointModel, RATING_SCALE, design_matrix, \
+    point_counts
+
+
+"""
+
+Joint fit of player and team strengths over many leagues.
+
+The per-league fit in team_strength gives every team its own skill.  Here
+the skill of a team is the average skill of the players on its roster plus
+a team offset, so every point a player's team wins or loses, in any league,
+informs that player's skill:
+
+    skill_team = mean(skill_player for players on the team) + offset_team
+
+Player skills have a prior centred on zero and team offsets a prior centred
+on the base rating of the team's division.  Older leagues count for less:
+the points of a league are weighted by 0.5 ** (age / half_life), with the
+age in years relative to the newest league in the fit, which for the
+binomial point likelihood is the same as scaling its point counts.
+
+The design matrix is the pair design of team_strength times the sparse
+[roster average, identity] matrix, so the fit stays sparse however many
+leagues are included, and each Newton step only needs Hessian-vector
+products.  Passing the previous fit as a warm start makes refitting after
+each new league a handful of iterations.
+
+"""
+
+
+def league_pairs(buda, leagueid, game_scores):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param leagueid: id of the league
+    :param game_scores: schedule of the league as written by scrape_buda
+    :return: point counts from point_counts with the team ids of both teams,
+        for the pairs where both teams could be matched to an id
+
+    """
+
+    team_ids = np.array(buda.league_teams[leagueid], dtype='int64')
+    teams = buda.allteams[buda.allteams['teamid'].astype('int64').isin(
+        team_ids)]
+    name_to_id = dict(zip(teams['teamname'].str.strip(' '),
+                          teams['teamid'].values.astype('int64')))
+
+    counts = point_counts(game_scores)
+    ids_a = counts['Team A'].map(name_to_id)
+    ids_b = counts['Team B'].map(name_to_id)
+    matched = (ids_a.notnull() & ids_b.notnull()).values
+    counts = counts[matched].copy()
+    counts['teamid A'] = ids_a[matched].values.astype('int64')
+    counts['teamid B'] = ids_b[matched].values.astype('int64')
+    return counts
+
+
+def default_leagues(buda, scores_dir, first_year=2010, store=None):
+
+    """
+
+    :return: ids of the scraped leagues since first_year that have a
+        schedule in scores_dir, or in store if one is given, oldest first
+
+    """
+
+    meta = buda.league_meta
+    if store is not None:
+        stored = set(store.leagues())
+    leagueids = [leagueid for leagueid in meta.index
+                 if meta.loc[leagueid, 'year'] >= first_year and
+                 leagueid in buda.league_teams and
+                 (leagueid in stored if store is not None else
+                  os.path.exists(os.path.join(
+                      scores_dir, 'scores_{}.csv'.format(leagueid))))]
+    return sorted(leagueids, key=lambda leagueid: int(leagueid))
+
+
+class JointStrengthFit(object):
+
+    """
+
+    :param player_names: names of the players in the fit
+    :param team_ids: ids of the teams in the fit
+    :param player_skill: skill of each player
+    :param team_offset: offset of each team
+    :param team_skill: skill of each team, players and offset combined
+    :param center: rating of a team with zero skill
+    :param scale: rating points per unit of skill
+    :param leagueids: ids of the leagues that were fit
+    :param pairs: point counts of every pair of teams in those leagues
+
+    """
+
+    def __init__(self, player_names, team_ids, player_skill, team_offset,
+                 team_skill, center, scale, leagueids, pairs):
+        self.player_names = np.asarray(player_names)
+        self.team_ids = np.asarray(team_ids)
+        self.player_skill = player_skill
+        self.team_offset = team_offset
+        self.team_skill = team_skill
+        self.center = center
+        self.scale = scale
+        self.leagueids = list(leagueids)
+        self.pairs = pairs
+
+    def start(self, player_names, team_ids, prior_mean):
+
+        """
+
+        :param player_names: names of the players in the new fit
+        :param team_ids: ids of the teams in the new fit
+        :param prior_mean: prior means of the new fit's parameters, used
+            for the players and teams that aren't in this fit
+        :return: starting parameters for the new fit
+
+        """
+
+        start = np.array(prior_mean, dtype='float')
+        nplayers = len(player_names)
+
+        def carry(old_keys, old_values, new_keys, offset):
+            order = np.argsort(old_keys)
+            sorted_keys = old_keys[order]
+            positions = np.searchsorted(sorted_keys, new_keys)
+            positions = np.minimum(positions, len(sorted_keys) - 1)
+            found = sorted_keys[positions] == new_keys
+            start[offset + np.nonzero(found)[0]] = \
+                old_values[order][positions[found]]
+
+        if len(self.player_names) > 0:
+            carry(self.player_names, self.player_skill,
+                  np.asarray(player_names), 0)
+        if len(self.team_ids) > 0:
+            carry(self.team_ids, self.team_offset, np.asarray(team_ids),
+                  nplayers)
+        return start
+
+    def player_ratings(self):
+        return pd.DataFrame({'player': self.player_names,
+                             'skill': self.player_skill,
+                             'rating': self.center +
+                             self.scale * self.player_skill},
+                            columns=['player', 'skill', 'rating'])
+
+    def team_ratings(self):
+        return pd.DataFrame({'teamid': self.team_ids,
+                             'skill': self.team_skill,
+                             'offset': self.team_offset,
+                             'rating': self.center +
+                             self.scale * self.team_skill},
+                            columns=['teamid', 'skill', 'offset', 'rating'])
+
+
+def team_divratings(allteams, team_ids):
+
+    """
+
+    :param allteams: allteams table of a BudaRating
+    :param team_ids: array of team ids
+    :return: division rating of each team, NaN for teams that aren't in
+        allteams, e.g. the Summer Club 2016 teams dropped when scraping
+        from a prefix
+
+    """
+
+    allteams = allteams.drop_duplicates('teamid')
+    divratings = pd.Series(allteams['divrating'].values.astype('float'),
+                           index=allteams['teamid'].values.astype('int64'))
+    return divratings.reindex(np.asarray(team_ids, dtype='int64')).values
+
+
+def fit_joint(buda, leagueids=None, scores_dir=None, previous=None,
+              half_life=2., player_sd=0.5, team_sd=0.3, center=None,
+              scale=RATING_SCALE, store=None):
+
+    """
+
+    :param buda: BudaRating with the data loaded
+    :param leagueids: ids of the leagues to fit, defaults to every league
+        since 2010 with a schedule in scores_dir
+    :param scores_dir: directory of the scores_{leagueid}.csv files written
+        by scrape_buda, defaults to data/raw/game_scores
+    :param previous: JointStrengthFit to warm start from
+    :param half_life: age in years at which a league counts half as much
+        as the newest one; None for no time decay
+    :param player_sd: prior standard deviation of the player skills
+    :param team_sd: prior standard deviation of the team offsets around
+        their division rating
+    :param center: rating of a team with zero skill, defaults to the mean
+        base rating of the rated teams
+    :param scale: rating points per unit of skill
+    :param store: ScoreStore to read the schedules from instead of the csv
+        files in scores_dir
+    :return: JointStrengthFit
+
+    """
+
+    if scores_dir is None:
+        scores_dir = os.path.join(buda.base_dir, 'data', 'raw', 'game_scores')
+    if leagueids is None:
+        leagueids = default_leagues(buda, scores_dir, store=store)
+
+    # point counts of the leagues in the previous fit are reused as they are
+    pairs = []
+    known = []
+    if previous is not None:
+        known = [leagueid for leagueid in leagueids
+                 if leagueid in previous.leagueids]
+        pairs.append(previous.pairs[previous.pairs['league'].isin(known)])
+    for leagueid in leagueids:
+        if leagueid in known:
+            continue
+        if store is not None:
+            game_scores = store.league_scores(leagueid)
+        else:
+            game_scores = pd.read_csv(os.path.join(
+                scores_dir, 'scores_{}.csv'.format(leagueid)))
+        league = league_pairs(buda, leagueid, game_scores)
+        league['league'] = leagueid
+        league['year'] = buda.league_meta.loc[leagueid, 'year']
+        pairs.append(league)
+    pairs = pd.concat(pairs, ignore_index=True)
+
+    # time decay of each pair's points
+    if half_life is None:
+        weights = np.ones(len(pairs))
+    else:
+        age = pairs['year'].max() - pairs['year'].values.astype('float')
+        weights = 0.5 ** (age / half_life)
+
+    team_ids = np.unique(np.concatenate([pairs['teamid A'].values,
+                                         pairs['teamid B'].values]))
+    nteams = len(team_ids)
+    index_a = np.searchsorted(team_ids, pairs['teamid A'].values)
+    index_b = np.searchsorted(team_ids, pairs['teamid B'].values)
+    pair_design = design_matrix(index_a, index_b, nteams)
+
+    # roster average matrix, one column per player on any of the teams
+    history = buda.history
+    rows, players = history.rosters(team_ids)
+    named = history.player_names[players] != ''
+    rows = rows[named]
+    players = players[named]
+    player_positions, columns = np.unique(players, return_inverse=True)
+    player_names = history.player_names[player_positions]
+    nplayers = len(player_names)
+    roster_size = np.bincount(rows, minlength=nteams).astype('float')
+    roster = sparse.csr_matrix((1. / roster_size[rows], (rows, columns)),
+                               shape=(nteams, nplayers))
+    team_design = sparse.hstack([roster, sparse.identity(nteams)]).tocsr()
+
+    # team offsets are centred on the division rating of the team; teams
+    # without one, including any missing from allteams, are left unrated
+    divratings = team_divratings(buda.allteams, team_ids)
+    rated = divratings > 0
+    if center is None:
+        center = divratings[rated].mean() if rated.any() else 0.
+    prior_mean = np.concatenate([
+        np.zeros(nplayers),
+        np.where(rated, (divratings - center) / scale, 0.)])
+    prior_sd = np.concatenate([np.full(nplayers, player_sd),
+                               np.full(nteams, team_sd)])
+
+    model = PointModel(pair_design.dot(team_design),
+                       weights * pairs['Points A'].values,
+                       weights * pairs['Points B'].values,
+                       prior_mean, prior_sd)
+    start = None
+    if previous is not None:
+        start = previous.start(player_names, team_ids, prior_mean)
+    skill = model.fit(start)
+
+    return JointStrengthFit(player_names, team_ids, skill[:nplayers],
+                            skill[nplayers:], team_design.dot(skill),
+                            center, scale, leagueids, pairs)
+
+
+def refit(buda, previous, leagueid, scores_dir=None, **kwargs):
+
+    """
+
+    :param buda: BudaRating with the new league loaded
+    :param previous: JointStrengthFit of the leagues before this one
+    :param leagueid: id of the new league
+    :return: JointStrengthFit of the previous leagues and the new one, warm
+        started from previous
+
+    """
+
+    return fit_joint(buda, previous.leagueids + [leagueid], scores_dir,
+                     previous, **kwargs)
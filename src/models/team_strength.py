@@ -0,0 +1,332 @@
+import numpy as np
+import pandas as pd
+from scipy import optimize, sparse
+
+from win_probability import check_random_state
+
+
+"""
+
+Bayesian team strengths from point scores.
+
+Every point of a game is treated as a coin flip between the two teams, won
+by team A with probability 1 / (1 + exp(skill_B - skill_A)), and every
+team's skill has a normal prior centred on the base rating of its division.
+The points of all games between the same two teams share one probability,
+so the likelihood only needs the number of points each team scored against
+each opponent rather than one row per point.
+
+The model is fit by maximizing the posterior with the analytic gradient and
+Hessian over a sparse design matrix with one row per pair of teams.  The
+inverse of the Hessian at the maximum gives a Laplace approximation of the
+posterior covariance, and a random walk Metropolis sampler seeded with that
+covariance can draw from the exact posterior when needed.
+
+"""
+
+
+# rating points per unit of skill, i.e. per factor e in the odds of winning
+# a point; 400 rating points between divisions is about a factor 2
+RATING_SCALE = 650.
+
+
+def opponent_names(game_scores):
+
+    """
+
+    :param game_scores: schedule of one league as written by scrape_buda
+    :return: Team B names in the same form as the Team A names.  In hat
+        leagues scrape_buda adds the (xx) team number to the Team A names
+        only, so it is added to the Team B names that then match a Team A
+        name.
+
+    """
+
+    team_a = set(game_scores['Team A'])
+    team_b = game_scores['Team B'].astype('object')
+    numbered = team_b + ' (' + team_b.str[5:7] + ')'
+    renamed = ~team_b.isin(team_a) & (team_b.str[-1] != ')') & \
+        numbered.isin(team_a)
+    return team_b.where(~renamed, numbered)
+
+
+def point_counts(game_scores):
+
+    """
+
+    :param game_scores: schedule of one league as written by scrape_buda,
+        with Team A, Team B, Score A and Score B columns.  Each game is
+        listed once under each of the two teams.
+    :return: dataframe with one row per pair of teams and the total Points A
+        and Points B each scored against the other
+
+    """
+
+    games = game_scores[['Team A', 'Team B', 'Score A', 'Score B']].copy()
+    games['Team B'] = opponent_names(game_scores)
+    listed = games.groupby(['Team A', 'Team B']).agg(
+        ['sum', 'count']).reset_index()
+    listed.columns = ['Team A', 'Team B', 'Points A', 'n A', 'Points B', 'n B']
+
+    # a game shows up under both teams, so keep the listing of each pair with
+    # the most games, preferring the alphabetical order of the two teams
+    forward = listed['Team A'] < listed['Team B']
+    listed['first'] = listed['Team A'].where(forward, listed['Team B'])
+    listed['second'] = listed['Team B'].where(forward, listed['Team A'])
+    listed['forward'] = forward
+    listed = listed.sort_values(['first', 'second', 'n A', 'forward'],
+                                ascending=[True, True, False, False])
+    counts = listed.drop_duplicates(['first', 'second'])
+    return counts[['Team A', 'Team B', 'Points A', 'Points B']].reset_index(
+        drop=True)
+
+
+def design_matrix(index_a, index_b, nteams):
+
+    """
+
+    :param index_a: position of team A of each pair
+    :param index_b: position of team B of each pair
+    :param nteams: number of teams
+    :return: sparse matrix with +1 for team A and -1 for team B in each row
+
+    """
+
+    npairs = len(index_a)
+    rows = np.concatenate([np.arange(npairs), np.arange(npairs)])
+    columns = np.concatenate([index_a, index_b])
+    values = np.concatenate([np.ones(npairs), -np.ones(npairs)])
+    return sparse.csr_matrix((values, (rows, columns)),
+                             shape=(npairs, nteams))
+
+
+class PointModel(object):
+
+    """
+
+    Log posterior of the point model and its derivatives.
+
+    :param design: sparse design matrix from design_matrix
+    :param points_a: points scored by team A of each pair
+    :param points_b: points scored by team B of each pair
+    :param prior_mean: prior mean skill of each team
+    :param prior_sd: prior standard deviation of the skills, scalar or array
+
+    """
+
+    def __init__(self, design, points_a, points_b, prior_mean, prior_sd):
+        self.design = design
+        self.design_t = design.T.tocsr()
+        self.points_a = np.asarray(points_a, dtype='float')
+        self.npoints = self.points_a + np.asarray(points_b, dtype='float')
+        self.prior_mean = np.asarray(prior_mean, dtype='float')
+        self.prior_precision = np.ones(len(self.prior_mean)) / \
+            np.asarray(prior_sd, dtype='float') ** 2
+
+    def log_posterior(self, skill):
+        eta = self.design.dot(skill)
+        deviation = skill - self.prior_mean
+        return np.sum(self.points_a * eta -
+                      self.npoints * np.logaddexp(0, eta)) - \
+            0.5 * np.sum(self.prior_precision * deviation ** 2)
+
+    def gradient(self, skill):
+        eta = self.design.dot(skill)
+        residual = self.points_a - self.npoints / (1 + np.exp(-eta))
+        return self.design_t.dot(residual) - \
+            self.prior_precision * (skill - self.prior_mean)
+
+    def hessian(self, skill):
+
+        """
+
+        :return: sparse negative Hessian of the log posterior
+
+        """
+
+        eta = self.design.dot(skill)
+        p = 1 / (1 + np.exp(-eta))
+        weights = sparse.diags(self.npoints * p * (1 - p))
+        return (self.design_t.dot(weights).dot(self.design) +
+                sparse.diags(self.prior_precision)).tocsr()
+
+    def hessian_vector(self, skill, vector):
+
+        """
+
+        :return: product of the negative Hessian of the log posterior with
+            vector, without forming the Hessian
+
+        """
+
+        eta = self.design.dot(skill)
+        p = 1 / (1 + np.exp(-eta))
+        weights = self.npoints * p * (1 - p)
+        return self.design_t.dot(weights * self.design.dot(vector)) + \
+            self.prior_precision * vector
+
+    def fit(self, start=None):
+
+        """
+
+        :param start: initial skills, defaults to the prior means
+        :return: maximum a posteriori skills
+
+        """
+
+        if start is None:
+            start = self.prior_mean
+        result = optimize.minimize(
+            lambda skill: -self.log_posterior(skill), start,
+            jac=lambda skill: -self.gradient(skill),
+            hessp=self.hessian_vector,
+            method='Newton-CG')
+        return result.x
+
+
+class TeamStrengthFit(object):
+
+    """
+
+    :param teams: team names
+    :param model: PointModel the skills were fit with
+    :param skill: maximum a posteriori skill of each team
+    :param center: rating of a team with zero skill
+    :param scale: rating points per unit of skill
+
+    """
+
+    def __init__(self, teams, model, skill, center=0., scale=RATING_SCALE):
+        self.teams = np.asarray(teams)
+        self.model = model
+        self.skill = skill
+        self.center = center
+        self.scale = scale
+
+        # Laplace approximation of the posterior
+        self.cov = np.linalg.inv(model.hessian(skill).toarray())
+
+    @property
+    def sd(self):
+        return np.sqrt(np.diag(self.cov))
+
+    def ratings(self):
+
+        """
+
+        :return: dataframe of the skill, its standard deviation and the
+            equivalent rating of each team
+
+        """
+
+        return pd.DataFrame({'team': self.teams,
+                             'skill': self.skill,
+                             'skill_sd': self.sd,
+                             'rating': self.center + self.scale * self.skill,
+                             'rating_sd': self.scale * self.sd},
+                            columns=['team', 'skill', 'skill_sd', 'rating',
+                                     'rating_sd'])
+
+    def sample(self, ndraws=1000, nburn=500, random_state=None):
+
+        """
+
+        Draw skills from the posterior with a random walk Metropolis sampler
+        whose proposals follow the Laplace covariance.
+
+        :param ndraws: number of draws to keep
+        :param nburn: number of draws to discard first
+        :param random_state: seed or RandomState, see check_random_state
+        :return: array of draws, one row per draw, and the acceptance rate
+
+        """
+
+        random_state = check_random_state(random_state)
+
+        nteams = len(self.skill)
+        step = np.linalg.cholesky(self.cov) * 2.38 / np.sqrt(nteams)
+        current = self.skill.copy()
+        current_lp = self.model.log_posterior(current)
+        draws = np.empty((ndraws, nteams))
+        naccept = 0
+        for i in range(nburn + ndraws):
+            proposal = current + step.dot(random_state.standard_normal(nteams))
+            proposal_lp = self.model.log_posterior(proposal)
+            if np.log(random_state.uniform()) < proposal_lp - current_lp:
+                current = proposal
+                current_lp = proposal_lp
+                if i >= nburn:
+                    naccept += 1
+            if i >= nburn:
+                draws[i - nburn] = current
+        return draws, naccept / float(ndraws)
+
+
+def team_divisions(game_scores):
+
+    """
+
+    :param game_scores: schedule of one league as written by scrape_buda
+    :return: dictionary of team name to division name, for the teams with
+        games listed under them
+
+    """
+
+    listed = game_scores.drop_duplicates('Team A')
+    return dict(zip(listed['Team A'], listed['divname']))
+
+
+def fit_league(game_scores, div_ratings, prior_sd=0.5, center=None,
+               scale=RATING_SCALE):
+
+    """
+
+    :param game_scores: schedule of one league as written by scrape_buda
+    :param div_ratings: dictionary of base rating for each division name, as
+        returned by define_ratings for the league's season and type
+    :param prior_sd: prior standard deviation of the skills
+    :param center: rating of a team with zero skill, defaults to the mean
+        base rating of the teams
+    :param scale: rating points per unit of skill
+    :return: TeamStrengthFit
+
+    """
+
+    counts = point_counts(game_scores)
+    teams = np.unique(np.concatenate([counts['Team A'].values,
+                                      counts['Team B'].values]))
+    index_a = np.searchsorted(teams, counts['Team A'].values)
+    index_b = np.searchsorted(teams, counts['Team B'].values)
+
+    # teams in a division without a base rating get the average prior
+    divisions = team_divisions(game_scores)
+    base = np.array([div_ratings.get(divisions.get(team), np.nan)
+                     for team in teams], dtype='float')
+    if center is None:
+        center = np.nanmean(base) if np.isfinite(base).any() else 0.
+    prior_mean = np.where(np.isfinite(base), (base - center) / scale, 0.)
+
+    model = PointModel(design_matrix(index_a, index_b, len(teams)),
+                       counts['Points A'].values, counts['Points B'].values,
+                       prior_mean, prior_sd)
+    return TeamStrengthFit(teams, model, model.fit(), center, scale)
+
+
+if __name__ == '__main__':
+
+    import os
+    import sys
+
+    # add the 'src' directory as one where we can import modules
+    root_dir = os.path.join(os.getcwd(), os.pardir, os.pardir)
+    sys.path.append(os.path.join(root_dir, 'src', 'data'))
+    from scrape_buda import define_ratings
+
+    scores_dir = os.path.join(root_dir, 'data', 'raw', 'game_scores')
+
+    # summer club league 2016
+    league_id = sys.argv[1] if len(sys.argv) > 1 else '40264'
+    game_scores = pd.read_csv(os.path.join(
+        scores_dir, 'scores_{}.csv'.format(league_id)))
+    fit = fit_league(game_scores, define_ratings()['Summer Club'])
+    print(fit.ratings().sort_values('skill', ascending=False).to_string())
@@ -0,0 +1,196 @@
+import numpy as np
+from scipy import stats
+
+
+"""
+
+Win probabilities of games between two teams that score as Poisson
+processes.
+
+Each team scores at a constant rate in points per minute.  The number of
+points a team scores over the rest of a game is a sum of one Poisson draw
+per remaining minute, which is itself a single Poisson draw with the rate
+times the remaining time, so a whole grid of simulated games can be drawn
+with one call.
+
+The difference between the points of the two teams is Skellam distributed,
+so win probabilities can also be computed exactly, without any sampling
+noise.  win_probability does that for scalars or arrays and falls back on
+the simulation on request.
+
+"""
+
+
+def check_random_state(random_state):
+
+    """
+
+    :param random_state: None, an integer seed, or a numpy RandomState (or
+        Generator) to draw from
+    :return: object with a poisson method
+
+    """
+
+    if random_state is None or isinstance(random_state, (int, np.integer)):
+        return np.random.RandomState(random_state)
+    return random_state
+
+
+def score_differentials(rate_a, rate_b, duration, size,
+                        random_state=None):
+
+    """
+
+    :param rate_a: points per minute of team A
+    :param rate_b: points per minute of team B
+    :param duration: minutes played, scalar or array broadcastable to size
+    :param size: shape of the array of simulated games
+    :param random_state: seed or RandomState, see check_random_state
+    :return: array of team A points minus team B points, with shape size
+
+    """
+
+    random_state = check_random_state(random_state)
+    duration = np.asarray(duration, dtype='float')
+    points_a = random_state.poisson(rate_a * duration, size)
+    points_b = random_state.poisson(rate_b * duration, size)
+    return points_a - points_b
+
+
+def simulate_comebacks(rate_a, rate_b, thresh, total_time,
+                       elapsed_times=None, ngames=100, nsim=100,
+                       random_state=None):
+
+    """
+
+    Simulate how often team A comes back to win after trailing at an even
+    pace, so that it is down by thresh * elapsed_time / total_time points
+    after elapsed_time minutes.
+
+    :param rate_a: points per minute of team A, scalar or array
+    :param rate_b: points per minute of team B, scalar or array
+    :param thresh: points team A is down by at the end of regulation if the
+        deficit keeps growing at the same pace, scalar or array
+    :param total_time: length of a game in minutes
+    :param elapsed_times: minutes played so far, defaults to every minute of
+        the game
+    :param ngames: number of games per simulation
+    :param nsim: number of simulations
+    :param random_state: seed or RandomState, see check_random_state
+    :return: mean and standard deviation over the simulations of the number
+        of the ngames games team A wins, each with the broadcast shape of
+        rate_a, rate_b and thresh plus one axis over elapsed_times
+
+    """
+
+    random_state = check_random_state(random_state)
+    if elapsed_times is None:
+        elapsed_times = np.arange(total_time)
+    elapsed_times = np.asarray(elapsed_times, dtype='float')
+    remaining_times = total_time - elapsed_times
+
+    rate_a, rate_b, thresh = np.broadcast_arrays(
+        np.asarray(rate_a, dtype='float'), np.asarray(rate_b, dtype='float'),
+        np.asarray(thresh, dtype='float'))
+    shape = rate_a.shape
+
+    # one (nsim, ngames, ntimes) grid of games per matchup, so that memory
+    # doesn't grow with the number of matchups
+    means = np.empty((rate_a.size, len(elapsed_times)))
+    stds = np.empty((rate_a.size, len(elapsed_times)))
+    for i, (a, b, t) in enumerate(zip(rate_a.ravel(), rate_b.ravel(),
+                                      thresh.ravel())):
+        differentials = score_differentials(
+            a, b, remaining_times, (nsim, ngames, len(elapsed_times)),
+            random_state)
+        deficits = t * elapsed_times / float(total_time)
+        wins = (differentials > deficits).sum(axis=1)
+        means[i] = wins.mean(axis=0)
+        stds[i] = wins.std(axis=0)
+
+    return means.reshape(shape + (len(elapsed_times),)), \
+        stds.reshape(shape + (len(elapsed_times),))
+
+
+def differential_sf(rate_a, rate_b, duration, values):
+
+    """
+
+    :param rate_a: points per minute of team A
+    :param rate_b: points per minute of team B
+    :param duration: minutes played
+    :param values: point differentials
+    :return: probability that team A points minus team B points is larger
+        than each value, with the broadcast shape of the arguments; NaN
+        where a rate or the duration is NaN
+    :raises ValueError: if a rate or the duration is negative
+
+    """
+
+    duration = np.asarray(duration, dtype='float')
+    if (duration < 0).any():
+        raise ValueError("duration must not be negative")
+    if (np.asarray(rate_a, dtype='float') < 0).any() or \
+            (np.asarray(rate_b, dtype='float') < 0).any():
+        raise ValueError("scoring rates must not be negative")
+    mu_a, mu_b, values = np.broadcast_arrays(
+        np.asarray(rate_a, dtype='float') * duration,
+        np.asarray(rate_b, dtype='float') * duration,
+        np.floor(np.asarray(values, dtype='float')))
+
+    # scipy's skellam is undefined when either team can't score, so those
+    # cases are left to the poisson distribution of the other team
+    sf = np.full(mu_a.shape, np.nan)
+    both = (mu_a > 0) & (mu_b > 0)
+    only_a = (mu_a > 0) & (mu_b == 0)
+    only_b = (mu_a == 0) & (mu_b > 0)
+    neither = (mu_a == 0) & (mu_b == 0)
+    sf[both] = stats.skellam.sf(values[both], mu_a[both], mu_b[both])
+    sf[only_a] = stats.poisson.sf(values[only_a], mu_a[only_a])
+    sf[only_b] = stats.poisson.cdf(-values[only_b] - 1, mu_b[only_b])
+    sf[neither] = values[neither] < 0
+    return sf[()]
+
+
+def win_probability(rate_a, rate_b, elapsed, deficit, total_time=70,
+                    method='exact', ngames=10000, random_state=None):
+
+    """
+
+    :param rate_a: points per minute of team A, scalar or array
+    :param rate_b: points per minute of team B, scalar or array
+    :param elapsed: minutes played so far, scalar or array
+    :param deficit: points team A is down by after elapsed minutes, scalar
+        or array
+    :param total_time: length of a game in minutes
+    :param method: 'exact' for the Skellam distribution, 'simulate' for
+        Monte Carlo
+    :param ngames: number of games to simulate for each probability
+    :param random_state: seed or RandomState, see check_random_state
+    :return: probability that team A outscores team B by more than deficit
+        over the rest of the game, with the broadcast shape of the arguments
+    :raises ValueError: if elapsed is longer than total_time or a rate is
+        negative
+
+    """
+
+    remaining = total_time - np.asarray(elapsed, dtype='float')
+    if (remaining < 0).any():
+        raise ValueError("elapsed must not be longer than total_time "
+                         "({})".format(total_time))
+    if (np.asarray(rate_a, dtype='float') < 0).any() or \
+            (np.asarray(rate_b, dtype='float') < 0).any():
+        raise ValueError("scoring rates must not be negative")
+    if method == 'exact':
+        return differential_sf(rate_a, rate_b, remaining, deficit)
+    if method != 'simulate':
+        raise ValueError("Unknown method {}, expected 'exact' or "
+                         "'simulate'".format(method))
+
+    rate_a, rate_b, remaining, deficit = np.broadcast_arrays(
+        np.asarray(rate_a, dtype='float'), np.asarray(rate_b, dtype='float'),
+        remaining, np.asarray(deficit, dtype='float'))
+    differentials = score_differentials(
+        rate_a[..., np.newaxis], rate_b[..., np.newaxis],
+        remaining[..., np.newaxis], rate_a.shape + (ngames,), random_state)
+    return (differentials > deficit[..., np.newaxis]).mean(axis=-1)[()]
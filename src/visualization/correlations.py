@@ -97,7 +97,6 @@ def plot_ensemble(hat_league, figures_dir):
 
     plt.tight_layout()
     plt.savefig(os.path.join(figures_dir, 'EnsembleRatingComparison'))
-    import pdb; pdb.set_trace()
 
 if __name__ == '__main__':
     # add the 'src' directory as one where we can import modules
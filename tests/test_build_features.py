@@ -0,0 +1,84 @@
+import os
+import sys
+
+import numpy as np
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+
+import build_features
+
+
+def random_rosters(nteams=20, seed=0):
+
+    """
+
+    :return: (team of each roster row, rating of each roster row, list of
+        the ratings of each team), with rosters of 8 to 16 players and a few
+        unrated players
+
+    """
+
+    random_state = np.random.RandomState(seed)
+    sizes = random_state.randint(8, 17, nteams)
+    team = np.repeat(np.arange(nteams), sizes)
+    ratings = random_state.normal(1200, 300, len(team))
+    ratings[random_state.rand(len(team)) < 0.05] = np.nan
+    rosters = [ratings[team == i] for i in range(nteams)]
+    return team, ratings, [roster[np.isfinite(roster)] for roster in rosters]
+
+
+def test_block_groups_match_per_team_loop():
+    team, ratings, rosters = random_rosters()
+    matrix, counts = build_features.rating_matrix(team, ratings, len(rosters),
+                                                  width=16)
+    boundaries = build_features.block_partitions(16, 2)
+    features = build_features.block_group_mean(
+        build_features.cumulative_ratings(matrix), counts, boundaries)
+
+    for i, roster in enumerate(rosters):
+        ordered = np.sort(roster)[::-1]
+        for j, (start, cut, end) in enumerate(boundaries):
+            groups = [group for group in (ordered[:cut], ordered[cut:end])
+                      if len(group) > 0]
+            expected = np.mean([group.mean() for group in groups])
+            assert np.isclose(features[i, j], expected)
+
+
+def test_weighted_means_match_per_team_loop():
+    team, ratings, rosters = random_rosters()
+    matrix, counts = build_features.rating_matrix(team, ratings, len(rosters))
+    relu = build_features.weighted_mean(
+        matrix, build_features.relu_weights(matrix, [1000., 5000.]))
+    logistic = build_features.weighted_mean(
+        matrix, build_features.logistic_weights(matrix, [12.], [0.01]))
+
+    for i, roster in enumerate(rosters):
+        weights = np.where(roster >= 1000., roster, 0.)
+        assert np.isclose(relu[i, 0], (weights * roster).sum() / weights.sum())
+        # no rating is above the threshold, so it's the plain mean
+        assert np.isclose(relu[i, 1], roster.mean())
+        weights = 1 / (1 + np.exp(12. - 0.01 * roster))
+        assert np.isclose(logistic[i, 0],
+                          (weights * roster).sum() / weights.sum())
+
+
+def test_grid_search_finds_planted_scheme():
+    team, ratings, rosters = random_rosters(nteams=40)
+    matrix, counts = build_features.rating_matrix(team, ratings, len(rosters),
+                                                  width=16)
+    # the target is exactly the block scheme with the top 4 players in a
+    # group of their own
+    target = [0.5 * (np.sort(roster)[::-1][:4].mean() +
+                     np.sort(roster)[::-1][4:].mean()) for roster in rosters]
+
+    results = build_features.grid_search(
+        matrix, counts, target, max_groups=2, relu_thresholds=[1000.],
+        logistic_k0=[12.], logistic_k=[0.01])
+    assert results.loc[0, 'scheme'] == 'block'
+    assert results.loc[0, 'params'] == (4,)
+    assert np.isclose(results.loc[0, 'r'], 1.)
+    assert np.isclose(build_features.correlations(
+        np.array(target)[:, np.newaxis], target)[0], 1.)
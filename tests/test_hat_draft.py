@@ -0,0 +1,52 @@
+import os
+import sys
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'models'))
+
+import hat_draft
+
+
+def test_spring_hat_sized_draft():
+    # the demo of hat_draft.py: 300 random players on 20 teams
+    nplayers = 300
+    nteams = 20
+    random_state = np.random.RandomState(0)
+    pool = pd.DataFrame({
+        'name': ['Player {}'.format(i) for i in range(nplayers)],
+        'ensemble_rating': random_state.normal(50, 12, nplayers),
+        'gender': np.where(random_state.uniform(size=nplayers) < 0.4,
+                           'F', 'M')})
+    together = [(i, i + 1) for i in range(0, 20, 2)]
+    apart = [(i, i + 1) for i in range(20, 40, 2)]
+
+    start = default_timer()
+    drafted = hat_draft.balance_teams(pool, nteams, gender='gender',
+                                      together=together, apart=apart, seed=0)
+    seconds = default_timer() - start
+    summary = hat_draft.team_summary(drafted, gender='gender')
+
+    assert len(summary) == nteams
+    assert (summary['players'] == nplayers // nteams).all()
+    assert summary['women'].max() - summary['women'].min() <= 1
+    team = drafted['team'].values
+    assert all(team[i] == team[j] for i, j in together)
+    assert all(team[i] != team[j] for i, j in apart)
+
+    # random teams would have a spread of team means of about 12 points
+    assert summary['rating'].max() - summary['rating'].min() < 0.5
+    assert seconds < 20
+
+
+def test_missing_ratings_get_the_mean():
+    pool = pd.DataFrame({'ensemble_rating': [10., 20., np.nan, 30.]})
+    drafted = hat_draft.balance_teams(pool, 2, nsteps=1000, seed=0)
+    summary = hat_draft.team_summary(drafted.fillna(20.))
+    assert list(summary['players']) == [2, 2]
+    assert list(summary['rating']) == [20., 20.]
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'models'))
+
+import joint_strength
+
+
+def test_team_divratings_of_missing_teams():
+    allteams = pd.DataFrame({'teamid': ['205', '101', '150'],
+                             'divrating': [900., 1800., 0.]})
+    divratings = joint_strength.team_divratings(
+        allteams, np.array([101, 150, 205, 300, 99]))
+
+    # teams that aren't in allteams get no one else's rating
+    assert list(divratings[:3]) == [1800., 0., 900.]
+    assert np.isnan(divratings[3:]).all()
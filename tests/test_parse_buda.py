@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+
+import parse_buda
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'fixtures')
+PAGES_DIR = os.path.join(FIXTURES_DIR, 'pages')
+
+# pages of malformed tables on which lxml disagrees with html5lib, see the
+# docstring of parse_buda, with the extractors that differ
+KNOWN_DIFFERENCES_DIR = os.path.join(FIXTURES_DIR, 'known_differences')
+LXML_DIFFERENCES = [('infobody_outside_table.html', 'infobody_cells'),
+                    ('td_without_tr.html', 'info_table_rows'),
+                    ('unclosed_nested_table.html', 'info_table_rows')]
+
+BACKENDS = ['stream', 'html5lib',
+            pytest.param('lxml', marks=pytest.mark.skipif(
+                parse_buda.lxml is None, reason="lxml is not installed"))]
+
+
+def read_page(name, pages_dir=PAGES_DIR):
+    with open(os.path.join(pages_dir, name), 'rb') as f:
+        return f.read()
+
+
+def test_backends_match_html5lib():
+    pages = dict((name, read_page(name))
+                 for name in sorted(os.listdir(PAGES_DIR)))
+    assert parse_buda.compare_backends(pages) == []
+
+
+def test_known_differences():
+    pages = dict((name, read_page(name, KNOWN_DIFFERENCES_DIR))
+                 for name in sorted(os.listdir(KNOWN_DIFFERENCES_DIR)))
+    assert parse_buda.compare_backends(pages, ['stream']) == []
+    if parse_buda.lxml is not None:
+        assert parse_buda.compare_backends(pages, ['lxml']) == \
+            [(name, 'lxml', extractor)
+             for name, extractor in LXML_DIFFERENCES]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_td_without_tr(backend):
+    page = read_page('td_without_tr.html', KNOWN_DIFFERENCES_DIR)
+    rows = parse_buda.info_table_rows(page, 1, backend)
+    if backend == 'lxml':
+        assert rows == [['Huck Finn', '4-3']]
+    else:
+        assert rows == [['Discs & Dogs', '5-2'], ['Huck Finn', '4-3']]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_info_table_with_nested_table(backend):
+    rows = parse_buda.info_table_rows(read_page('schedule.html'), 1,
+                                      backend)
+    assert rows[:4] == [['Team', 'Record', 'Plus/Minus'], ['Division A'],
+                        ['Discs & Dogs', '5-2', '12'],
+                        ['Huck Finn', '4-3', '-3']]
+
+    # the row around the nested table has the text and the cells of the
+    # nested table, which are then a row of their own
+    assert rows[4][0].startswith('Layout Legends')
+    assert rows[4][0].endswith('W 13-9L 8-13')
+    assert rows[4][1:] == ['W 13-9', 'L 8-13', '3-4', '-1']
+    assert rows[5:] == [['W 13-9', 'L 8-13'], ['Division B'],
+                        [u'Caf\xe9 Cutters', '2-5', '-8']]
+
+    assert parse_buda.info_table_rows(read_page('schedule.html'), 2,
+                                      backend) is None
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_infobody_cells(backend):
+    cells = parse_buda.infobody_cells(read_page('teams.html'), backend)
+    assert cells == [
+        ('Discs & Dogs', '/hatleagues/rosters.php?team=101&which=1',
+         'Discs & Dogs'),
+        ('Huck Finn', None, None),
+        (' Layout Legends other', '/hatleagues/rosters.php?team=103&which=1',
+         'Layout Legends')]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_iframe_src(backend):
+    assert parse_buda.iframe_src(read_page('past_leagues.html'),
+                                 backend) == \
+        '/hatleagues/pastleagues.php?section=hat'
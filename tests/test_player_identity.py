@@ -0,0 +1,70 @@
+import os
+import sys
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+
+from player_identity import PlayerIdentity
+
+
+# one team per league, so that no two names are kept apart for sharing a
+# league
+PLAYER_TEAMS = {
+    'Smith, Chris': ['1'],
+    'Smith, Christopher': ['2', '3'],
+    'Smith, Christina': ['4'],
+    'Jones, Dan': ['5'],
+    'Jones, Daniel': ['6'],
+    'Jones, Danielle': ['7'],
+    'Johnson, Katherine': ['8', '9'],
+    'Jonhson, Katherine': ['10'],
+    'Lee, Anna': ['11'],
+    'Lee, Ann': ['12'],
+}
+TEAM_LEAGUE = dict((str(team), str(100 + team)) for team in range(1, 13))
+
+
+def test_nicknames_and_typos_merge_without_chaining():
+    identity = PlayerIdentity()
+    identity.resolve(PLAYER_TEAMS, TEAM_LEAGUE)
+    same = lambda a, b: identity.player_id(a) == identity.player_id(b)
+
+    assert same('Smith, Chris', 'Smith, Christopher')
+    assert not same('Smith, Christopher', 'Smith, Christina')
+    assert not same('Smith, Chris', 'Smith, Christina')
+    assert same('Jones, Dan', 'Jones, Daniel')
+    assert not same('Jones, Daniel', 'Jones, Danielle')
+    assert same('Johnson, Katherine', 'Jonhson, Katherine')
+    assert same('Lee, Anna', 'Lee, Ann')
+    assert identity.canonical('Jonhson, Katherine') == 'Johnson, Katherine'
+
+
+def test_names_on_two_teams_of_one_league_stay_apart():
+    team_league = dict(TEAM_LEAGUE)
+    team_league['10'] = team_league['8']
+    identity = PlayerIdentity()
+    identity.resolve(PLAYER_TEAMS, team_league)
+    assert identity.player_id('Johnson, Katherine') != \
+        identity.player_id('Jonhson, Katherine')
+
+
+def test_ids_are_stable(tmpdir):
+    identity = PlayerIdentity()
+    identity.resolve(PLAYER_TEAMS, TEAM_LEAGUE)
+    path = str(tmpdir.join('aliases.csv'))
+    identity.save(path)
+    before = dict((name, identity.player_id(name)) for name in PLAYER_TEAMS)
+
+    player_teams = dict(PLAYER_TEAMS)
+    player_teams['Johnson, Katherin'] = ['13']
+    team_league = dict(TEAM_LEAGUE)
+    team_league['13'] = '113'
+    reloaded = PlayerIdentity.load(path)
+    reloaded.resolve(player_teams, team_league)
+
+    assert dict((name, reloaded.player_id(name))
+                for name in PLAYER_TEAMS) == before
+    assert reloaded.player_id('Johnson, Katherin') == \
+        before['Johnson, Katherine']
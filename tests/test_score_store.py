@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'benchmarks'))
+
+import fixtures
+import score_store
+import scrape_buda
+import synthetic
+from fetch import Fetcher
+
+
+def test_league_scores_round_trip(tmpdir):
+    data = synthetic.generate(nplayers=1000, first_year=2009, last_year=2011,
+                              seed=4)
+    prefix = str(tmpdir.join('synthetic'))
+    synthetic.write_snapshot(data, prefix)
+    scores_dir = str(tmpdir.join('scores'))
+    synthetic.write_scores(data, scores_dir)
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, [])
+    buda = scrape_buda.BudaRating(
+        fetcher=Fetcher(cache=fixtures.offline_cache(cache_dir)))
+    buda.load_buda(prefix)
+
+    path = str(tmpdir.join('store'))
+    leagueids = score_store.import_scores(score_store.ScoreStore(path),
+                                          scores_dir, buda, batch_size=4)
+    assert sorted(leagueids) == sorted(data['league_meta'].index)
+
+    # reopened from disk, every league reads back as its csv file
+    store = score_store.ScoreStore(path)
+    ngames = 0
+    for leagueid in leagueids:
+        expected = pd.read_csv(os.path.join(
+            scores_dir, 'scores_{}.csv'.format(leagueid)))
+        expected = expected[score_store.CSV_COLUMNS]
+        for name in ['Team A', 'Team B', 'divname']:
+            expected[name] = expected[name].astype('str')
+        pd.testing.assert_frame_equal(store.league_scores(leagueid),
+                                      expected, check_dtype=False)
+        ngames += len(expected)
+
+    games = store.read(['league', 'teamid A', 'teamid B'])
+    assert len(games) == ngames
+    assert (games['teamid A'] >= 0).all() and (games['teamid B'] >= 0).all()
@@ -0,0 +1,278 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'benchmarks'))
+
+import fixtures
+import parse_buda
+import scrape_buda
+import self_rating_index
+import synthetic
+from fetch import Fetcher
+from http_cache import ResponseCache
+
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'fixtures', 'pages')
+
+
+def legacy_normalize(dfdata, divnames, div_ratings, league_type):
+
+    """
+
+    The row by row normalization that scrape_buda did before
+    normalize_schedule, with .ix replaced by .loc on the integer index.
+
+    """
+
+    dfdata = dfdata.copy()
+    dfdata['div'] = np.zeros(len(dfdata))
+    # object from the start, as the pandas of the time upcast it on the
+    # first division name
+    dfdata['divname'] = np.zeros(len(dfdata)).astype('object')
+    for i in range(len(divnames)-1):
+        divstart = np.where(dfdata['Team'] == divnames[i])[0][0]
+        divend = np.where(dfdata['Team'] == divnames[i + 1])[0][0]
+        if divnames[i] not in div_ratings:
+            continue
+        dfdata.loc[divstart + 1: divend, 'div'] = div_ratings[divnames[i]]
+        dfdata.loc[divstart + 1: divend, 'divname'] = divnames[i]
+    dfdata.loc[divend + 1:, 'div'] = div_ratings[divnames[-1]]
+    dfdata.loc[divend + 1:, 'divname'] = divnames[-1]
+
+    for i in range(len(divnames)):
+        dfdata = dfdata.drop(dfdata.index[dfdata['Team'] == divnames[i]])
+
+    teamindex = dfdata['Team'] != ''
+    teamindices = dfdata.index[teamindex]
+    for s_index, e_index in zip(teamindices[:-1], teamindices[1:]):
+        team_name = dfdata.loc[s_index, 'Team']
+        dfdata.loc[s_index + 1:e_index - 1, 'Team'] = team_name
+    team_name = dfdata.loc[e_index, 'Team']
+    dfdata.loc[e_index + 1:dfdata.index[-1], 'Team'] = team_name
+    dfdata = dfdata.drop(teamindices)
+
+    dfdata = dfdata.rename(columns={'Team': 'Team A', 'Record': 'Team B'})
+
+    def reformat(team_string):
+        if team_string != '':
+            if team_string[-1] != ')':
+                team_string += ' ({})'.format(team_string[5:7])
+        return team_string
+
+    if league_type == 'Hat':
+        dfdata['Team A'] = dfdata['Team A'].apply(reformat)
+
+    dfdata['Score A'] = dfdata['Plus/Minus'].apply(
+        lambda x: int(x.split('-')[0]))
+    dfdata['Score B'] = dfdata['Plus/Minus'].apply(
+        lambda x: int(x.split('-')[1]))
+    return dfdata
+
+
+def schedule_fixture(name):
+    with open(os.path.join(PAGES_DIR, name), 'rb') as f:
+        rows = parse_buda.info_table_rows(f.read(), 1)
+    return scrape_buda.schedule_table(rows)
+
+
+class CachedSession(object):
+
+    """
+
+    Stand-in for the requests.Session of a Fetcher that answers every
+    request with the page saved in an offline cache.
+
+    """
+
+    class Response(object):
+
+        def __init__(self, content):
+            self.status_code = 200
+            self.content = content
+            self.headers = {}
+
+        def raise_for_status(self):
+            pass
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.urls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.urls.append(url)
+        return self.Response(self.cache.get(url))
+
+    def close(self):
+        pass
+
+
+def small_history():
+
+    """
+
+    :return: synthetic.generate output with a dozen small leagues from 2009
+        to 2011, so that some of them are rated by predicted_rating
+
+    """
+
+    return synthetic.generate(nplayers=400, first_year=2009, last_year=2011,
+                              teams_per_division=2, roster_size=10, seed=1)
+
+
+def offline_buda(data, cache_dir, base_dir):
+
+    """
+
+    :param data: output of synthetic.generate
+    :param cache_dir: ResponseCache directory holding the pages of data
+    :param base_dir: directory to write the scraped scores to
+    :return: BudaRating that scrapes the cached pages, with the self
+        ratings of data
+
+    """
+
+    os.makedirs(os.path.join(base_dir, 'data', 'raw', 'game_scores'))
+    buda = scrape_buda.BudaRating(
+        fetcher=Fetcher(cache=fixtures.offline_cache(cache_dir)))
+    buda.base_dir = base_dir
+    buda.self_ratings = data['self_ratings']
+    buda.self_index = self_rating_index.SelfRatingIndex(buda.self_ratings,
+                                                        buda.aliases)
+    return buda
+
+
+def loaded_buda(data, tmpdir):
+
+    """
+
+    :param data: output of synthetic.generate
+    :param tmpdir: directory for the snapshot and the league list page
+    :return: BudaRating with data loaded from a snapshot
+
+    """
+
+    prefix = str(tmpdir.join('synthetic'))
+    synthetic.write_snapshot(data, prefix)
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, [])
+    buda = scrape_buda.BudaRating(
+        fetcher=Fetcher(cache=fixtures.offline_cache(cache_dir)))
+    buda.load_buda(prefix)
+    return buda
+
+
+def test_scraped_years_are_numbers(tmpdir):
+    data = small_history()
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, [])
+
+    buda = offline_buda(data, cache_dir, str(tmpdir.join('buda')))
+    assert buda.league_meta['year'].dtype.kind == 'i'
+    assert list(buda.league_meta['year']) == list(data['league_meta']['year'])
+
+
+def test_league_list_is_saved_to_the_cache(tmpdir):
+    data = small_history()
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, [])
+
+    online_dir = str(tmpdir.join('online'))
+    fetcher = Fetcher(cache=ResponseCache(online_dir), min_interval=0)
+    fetcher.session = CachedSession(fixtures.offline_cache(cache_dir))
+    buda = scrape_buda.BudaRating(fetcher=fetcher)
+    assert len(fetcher.session.urls) == 2
+
+    # the pages are in the saved index without scraping any league
+    saved = ResponseCache(online_dir, offline=True)
+    for url in fetcher.session.urls:
+        assert saved.get(url) == fetcher.session.cache.get(url)
+    assert len(buda.league_meta) == len(data['league_meta'])
+
+
+def test_report_has_cache_hit_rate(tmpdir):
+    data = small_history()
+    leagueids = list(data['league_meta'].index[:2])
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, leagueids)
+
+    buda = offline_buda(data, cache_dir, str(tmpdir.join('buda')))
+    buda.scrape_buda(leagueids=leagueids)
+    report = buda.report()
+    assert report['counters']['leagues_scraped'] == 2
+    assert report['cache']['hit_rate'] == 1.
+
+
+def test_update_league_matches_full_prediction(tmpdir):
+    data = small_history()
+    leagueids = list(data['league_meta'].index)
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, leagueids)
+
+    buda = offline_buda(data, cache_dir, str(tmpdir.join('incremental')))
+    buda.scrape_buda(leagueids=leagueids[:-1])
+    buda.predicted_rating()
+    buda.update_league(leagueids[-1])
+
+    full = offline_buda(data, cache_dir, str(tmpdir.join('full')))
+    full.scrape_buda(leagueids=leagueids)
+    full.predicted_rating()
+
+    assert (full.allteams['year'] >= 2010).any()
+    pd.testing.assert_frame_equal(buda.allteams, full.allteams)
+
+
+@pytest.mark.parametrize('league_type', ['Hat', 'Club'])
+def test_normalize_schedule_matches_row_loop(league_type):
+    dfdata, divnames = schedule_fixture('hat_schedule.html')
+    assert len(divnames) == 3
+
+    # the middle division has no base rating
+    div_ratings = {'JP Mixed (4/3)': 1000, "Women's (7)": 800}
+    expected = legacy_normalize(dfdata, divnames, div_ratings, league_type)
+    result = scrape_buda.normalize_schedule(dfdata, divnames, div_ratings,
+                                            league_type)
+    pd.testing.assert_frame_equal(result, expected)
+    if league_type == 'Hat':
+        assert result['Team A'].str.endswith(')').all()
+
+
+def test_normalize_schedule_unrated_last_division():
+    dfdata, divnames = schedule_fixture('hat_schedule.html')
+    with pytest.raises(KeyError):
+        scrape_buda.normalize_schedule(dfdata, divnames,
+                                       {'JP Mixed (4/3)': 1000}, 'Hat')
+
+
+@pytest.mark.parametrize('nworkers', [1, 2])
+def test_batch_prediction_matches_per_team(tmpdir, nworkers):
+    # a club division without a base rating leaves some club teams unrated,
+    # which makes the ensemble rating of later teams of their players NaN
+    divisions = dict(synthetic.DIVISIONS)
+    divisions['Club'] = divisions['Club'] + ['Unrated Div']
+    data = synthetic.generate(nplayers=600, first_year=2007, last_year=2011,
+                              divisions=divisions, teams_per_division=3,
+                              roster_size=12, seed=2)
+    buda = loaded_buda(data, tmpdir)
+
+    buda.predicted_rating(batch=False, nworkers=nworkers)
+    per_team = buda.allteams.copy()
+    buda.predicted_rating(batch=True, nworkers=nworkers)
+    batch = buda.allteams
+
+    assert per_team['ensemble_rating'].isnull().any()
+    for column in ['self_rating', 'captain_rating', 'draft_rating',
+                   'experience_rating', 'ensemble_rating', 'n_exp_rating',
+                   'n_cap_rating', 'n_capexp_rating']:
+        expected = per_team[column].values.astype('float')
+        result = batch[column].values.astype('float')
+        assert (np.isnan(result) == np.isnan(expected)).all(), column
+        assert np.allclose(result, expected, equal_nan=True), column
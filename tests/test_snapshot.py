@@ -0,0 +1,98 @@
+import os
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+
+import snapshot
+from history_store import HistoryStore
+
+
+PLAYER_TEAMS = {'Doe, Jane': ['101', '201'], 'Roe, Rich': ['102', '201']}
+TEAM_PLAYERS = {'101': ['Doe, Jane'], '102': ['Roe, Rich'],
+                '201': ['Doe, Jane', 'Roe, Rich']}
+TEAM_RATING = {'101': 1200., '102': None, '201': 900.}
+LEAGUE_TEAMS = {'1001': ['101', '102'], '1002': ['201']}
+
+
+def scraped_allteams():
+
+    """
+
+    :return: allteams as scrape_buda builds it, with the team ids and years
+        as text
+
+    """
+
+    return pd.DataFrame({'teamid': ['101', '102', '201'],
+                         'teamname': ['Alpha', 'Beta', 'Gamma'],
+                         'season': ['Summer', 'Summer', 'Fall'],
+                         'type': ['Club', 'Club', 'Hat'],
+                         'year': ['2011', '2011', '2012'],
+                         'divname': ['4/3 Div 1', '4/3 Div 2', 0.],
+                         'divrating': [1200., 900., 0.],
+                         'plusminus': [np.nan, np.nan, np.nan]},
+                        columns=['teamid', 'teamname', 'season', 'type',
+                                 'year', 'divname', 'divrating',
+                                 'plusminus'])
+
+
+def write_legacy(prefix, self_ratings=True):
+    for name, value in zip(snapshot.LEGACY_PICKLES,
+                           [PLAYER_TEAMS, TEAM_PLAYERS, TEAM_RATING,
+                            LEAGUE_TEAMS]):
+        with open('{}_{}.p'.format(prefix, name), 'wb') as f:
+            pickle.dump(value, f, protocol=2)
+    scraped_allteams().to_csv(prefix + '_allteams.csv', index=False)
+    if self_ratings:
+        pd.DataFrame({'league_id': [1002., 1002.],
+                      'first_name': ['Jane', 'Rich'],
+                      'last_name': ['Doe', 'Roe'],
+                      'rank': [40., np.nan], 'rank_type': [1, 1],
+                      'captain_rank': [np.nan, 55.]}).to_csv(
+            prefix + '_selfcaptain_ratings.csv', index=False)
+
+
+def test_migration_matches_csv_loader(tmpdir):
+    prefix = str(tmpdir.join('data'))
+    write_legacy(prefix)
+    path = snapshot.migrate_legacy(prefix)
+
+    _, tables = snapshot.load_legacy(prefix)
+    snap = snapshot.Snapshot(path)
+    for name in ['allteams', 'self_ratings']:
+        pd.testing.assert_frame_equal(snap.table(name), tables[name])
+
+
+def test_scraped_text_columns_load_as_numbers(tmpdir):
+    path = str(tmpdir.join('data_snapshot'))
+    history = HistoryStore.from_dicts(PLAYER_TEAMS, TEAM_PLAYERS,
+                                      TEAM_RATING, LEAGUE_TEAMS)
+    snapshot.save_snapshot(path, history, {'allteams': scraped_allteams()})
+
+    allteams = snapshot.Snapshot(path).table('allteams')
+    assert allteams['teamid'].dtype.kind == 'i'
+    assert allteams['year'].dtype.kind == 'i'
+    assert list(allteams['year'] >= 2012) == [False, False, True]
+    assert allteams['divname'].dtype.kind not in 'biuf'
+
+
+def test_missing_self_ratings(tmpdir):
+    prefix = str(tmpdir.join('data'))
+    write_legacy(prefix, self_ratings=False)
+
+    _, tables = snapshot.load_legacy(prefix)
+    self_ratings = snapshot.load_self_ratings(prefix)
+    assert len(tables['self_ratings']) == 0
+    assert list(tables['self_ratings'].columns) == \
+        snapshot.REQUIRED_COLUMNS['self_ratings']
+    assert list(self_ratings.columns) == list(tables['self_ratings'].columns)
+
+    path = snapshot.migrate_legacy(prefix)
+    assert len(snapshot.Snapshot(path).table('self_ratings')) == 0
@@ -0,0 +1,106 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+
+import sql_dump
+
+
+DUMP = r"""-- MySQL dump 10.13
+/*!40101 SET NAMES utf8 */;
+DROP TABLE IF EXISTS `buda_users_public`;
+CREATE TABLE `buda_users_public` (
+  `user_id` int(11) NOT NULL AUTO_INCREMENT,
+  `first_name` varchar(64) DEFAULT NULL,
+  `last_name` varchar(64) DEFAULT NULL,
+  `email` varchar(128) DEFAULT NULL,
+  PRIMARY KEY (`user_id`),
+  KEY `last_name` (`last_name`)
+) ENGINE=MyISAM DEFAULT CHARSET=utf8;
+INSERT INTO `buda_users_public` VALUES (1,'Jo\'n','O''Brien','a@b.org'),(2,'Ann\\Marie',NULL,'c@d.org'),(3,'Li','Wei, Jr.\nII','e@f.org');
+CREATE TABLE `joom_session` (
+  `id` int(11),
+  `data` text
+);
+INSERT INTO `joom_session` VALUES (1,'not (parsed'),(2,'at all');
+CREATE TABLE `buda_leagues` (
+  `league_id` int(11),
+  `league_name` varchar(32),
+  `season` varchar(16)
+);
+INSERT INTO `buda_leagues` VALUES (30919,'Fall Hat League','Fall'),(30924,'Winter Hat League','Winter');
+CREATE TABLE `buda_hatleague_player_rankings` (
+  `player_id` int(11),
+  `league_id` int(11),
+  `rank_type` tinyint(4),
+  `rank` double DEFAULT NULL
+);
+INSERT INTO `buda_hatleague_player_rankings` VALUES (1,30919,1,40.5),(2,30919,2,NULL),(3,30924,1,-1e2);
+CREATE TABLE `captain_ratings` (
+  `user_id` int(11),
+  `league_id` int(11),
+  `rank` int(11)
+);
+INSERT INTO `captain_ratings` (`user_id`, `league_id`, `rank`) VALUES (1,30919,50),(1,30919,60),(3,30924,70);
+"""
+
+
+def write_dump(tmpdir, text=DUMP):
+    path = str(tmpdir.join('dump.sql'))
+    with open(path, 'wb') as f:
+        f.write(text.encode('utf-8'))
+    return path
+
+
+@pytest.mark.parametrize('writer', [sql_dump.SqliteWriter,
+                                    sql_dump.ColumnarWriter])
+def test_dump_round_trip(tmpdir, writer):
+    output = str(tmpdir.join('output'))
+    counts = sql_dump.load_dump(write_dump(tmpdir), writer(output))
+    assert 'joom_session' not in counts
+    assert counts['buda_users_public'] == 3
+
+    tables = sql_dump.read_tables(output)
+    users = tables['buda_users_public']
+    assert list(users.columns) == ['user_id', 'first_name', 'last_name']
+    assert list(users['first_name']) == ["Jo'n", 'Ann\\Marie', 'Li']
+    assert users['last_name'][0] == "O'Brien"
+    assert users['last_name'][2] == 'Wei, Jr.\nII'
+    assert users['last_name'].isnull()[1]
+
+    rankings = tables['buda_hatleague_player_rankings']
+    assert np.allclose(rankings['rank'], [40.5, np.nan, -100.],
+                       equal_nan=True)
+
+
+def test_self_captain_ratings(tmpdir):
+    output = str(tmpdir.join('output.sqlite'))
+    sql_dump.load_dump(write_dump(tmpdir), sql_dump.SqliteWriter(output))
+    ssr = sql_dump.self_captain_ratings(sql_dump.read_tables(output))
+
+    assert list(ssr['last_name'])[::2] == ["O'Brien", 'Wei, Jr.\nII']
+    assert list(ssr['league_id']) == [30919., 30919., 30924.]
+    # the average of the ranks each player got from the captains
+    assert np.allclose(ssr['captain_rank'], [55., np.nan, 70.],
+                       equal_nan=True)
+
+
+def test_self_captain_ratings_unknown_columns(tmpdir):
+    dump = DUMP.replace('`rank` int(11)', '`score` int(11)').replace(
+        '`league_id`, `rank`', '`league_id`, `score`')
+    output = str(tmpdir.join('output.sqlite'))
+    sql_dump.load_dump(write_dump(tmpdir, dump), sql_dump.SqliteWriter(output))
+    tables = sql_dump.read_tables(output)
+    with pytest.raises(sql_dump.SqlDumpError):
+        sql_dump.self_captain_ratings(tables)
+
+    # without the captain_ratings table, captain_rank is left NaN
+    del tables['captain_ratings']
+    ssr = sql_dump.self_captain_ratings(tables)
+    assert ssr['captain_rank'].isnull().all()
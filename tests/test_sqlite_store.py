@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'benchmarks'))
+
+import fixtures
+import scrape_buda
+import sqlite_store
+import synthetic
+from fetch import Fetcher
+
+
+def test_store_matches_buda_rating(tmpdir):
+    data = synthetic.generate(nplayers=2000, first_year=2008, last_year=2011,
+                              seed=3)
+    prefix = str(tmpdir.join('synthetic'))
+    synthetic.write_snapshot(data, prefix)
+    cache_dir = str(tmpdir.join('cache'))
+    fixtures.write_pages(data, cache_dir, [])
+    buda = scrape_buda.BudaRating(
+        fetcher=Fetcher(cache=fixtures.offline_cache(cache_dir)))
+    buda.load_buda(prefix)
+
+    path = str(tmpdir.join('buda.sqlite'))
+    buda.dump_sqlite(path)
+    store = sqlite_store.SqliteStore(path)
+
+    random_state = np.random.RandomState(0)
+    team_ids = random_state.choice(buda.allteams['teamid'].values, 200,
+                                   replace=False)
+    for team_id in team_ids:
+        team_id = str(team_id)
+        assert store.check_league_type(team_id) == \
+            buda.check_league_type(team_id)
+
+        expected = buda.predict_team(team_id)
+        result = store.predict_team(team_id)
+        pd.testing.assert_frame_equal(result[0], expected[0],
+                                      check_dtype=False)
+        assert result[1:] == expected[1:]
+
+        pd.testing.assert_frame_equal(store.team_detail(team_id),
+                                      buda.team_detail(team_id),
+                                      check_dtype=False)
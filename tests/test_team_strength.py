@@ -0,0 +1,70 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'data'))
+sys.path.append(os.path.join(src_dir, 'models'))
+
+import joint_strength
+import parse_buda
+import scrape_buda
+import team_strength
+
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'fixtures', 'pages')
+
+DIV_RATINGS = {'JP Mixed (4/3)': 1000, "Women's (7)": 800}
+
+
+class League(object):
+
+    """
+
+    The parts of a BudaRating that league_pairs reads, for one league with
+    the team names of its teams page.
+
+    """
+
+    def __init__(self, leagueid, teamnames):
+        team_ids = [str(1000 + i) for i in range(len(teamnames))]
+        self.league_teams = {leagueid: team_ids}
+        self.allteams = pd.DataFrame({'teamid': team_ids,
+                                      'teamname': teamnames})
+
+
+def hat_scores():
+    with open(os.path.join(PAGES_DIR, 'hat_schedule.html'), 'rb') as f:
+        rows = parse_buda.info_table_rows(f.read(), 1)
+    dfdata, divnames = scrape_buda.schedule_table(rows)
+    return scrape_buda.normalize_schedule(dfdata, divnames, DIV_RATINGS,
+                                          'Hat')
+
+
+def test_hat_league_pairs_have_both_team_ids():
+    game_scores = hat_scores()
+    teamnames = sorted(set(game_scores['Team A']))
+    # the Team B names of the schedule don't have the team number
+    assert not game_scores['Team B'].isin(teamnames).all()
+
+    pairs = joint_strength.league_pairs(League('40000', teamnames), '40000',
+                                        game_scores)
+
+    # every game is listed under both teams, so each pair once holds all the
+    # points of the games between them
+    assert len(pairs) == 5
+    assert pairs['Points A'].sum() + pairs['Points B'].sum() == \
+        (game_scores['Score A'].sum() + game_scores['Score B'].sum()) / 2
+    assert (pairs['teamid A'] != pairs['teamid B']).all()
+
+
+def test_hat_league_fit_has_one_skill_per_team():
+    game_scores = hat_scores()
+    fit = team_strength.fit_league(game_scores, DIV_RATINGS)
+    assert sorted(fit.teams) == sorted(set(game_scores['Team A']))
+    assert np.isfinite(fit.skill).all()
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# add the 'src' directories as ones where we can import modules
+src_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                       'src')
+sys.path.append(os.path.join(src_dir, 'models'))
+
+from win_probability import differential_sf, win_probability
+
+
+def test_exact_matches_simulation():
+    rate_a = np.array([[0.12], [0.1], [0.]])
+    rate_b = np.array([[0.1], [0.1], [0.13]])
+    elapsed = np.array([0, 35, 60, 70])
+    deficit = np.array([0, 2, -1, 0])
+
+    exact = win_probability(rate_a, rate_b, elapsed, deficit)
+    simulated = win_probability(rate_a, rate_b, elapsed, deficit,
+                                method='simulate', ngames=200000,
+                                random_state=0)
+    assert exact.shape == (3, 4)
+    assert np.abs(exact - simulated).max() < 0.005
+
+
+def test_teams_that_cannot_score():
+    # only team B scores, and team A needs more than deficit points
+    assert differential_sf(0., 0.1, 10, -1) == pytest.approx(np.exp(-1.))
+    assert differential_sf(0., 0., 10, [-1, 0]).tolist() == [1., 0.]
+
+
+def test_negative_remaining_time_or_rate():
+    with pytest.raises(ValueError):
+        win_probability(0.1, 0.1, 80, 0, total_time=70)
+    with pytest.raises(ValueError):
+        win_probability(-0.1, 0.1, 10, 0)
+    with pytest.raises(ValueError):
+        differential_sf(0.1, 0.1, -5, 0)
+    assert np.isnan(win_probability(np.nan, 0.1, 10, 0))